@@ -0,0 +1,26 @@
+# ai_bridge/__init__.py
+"""
+Biblioteca cliente del servidor de IA
+    
+    from ai_bridge import connect, ClientPool
+    
+    with connect("192.168.1.10") as client:
+        print(client.ask("Hola"))
+    
+    pool = ClientPool("192.168.1.10", size=4)   # conexiones TLS reutilizadas entre hilos
+    print(pool.info())
+
+Para asyncio: AsyncClient, AsyncClientPool y connect_async. El protocolo
+(saludo, HELLO, RESUME, comandos y turnos IA) vive una sola vez, sin E/S,
+en ai_bridge/connection.py; client.py y aio.py solo ponen el transporte.
+"""
+from ai_bridge.connection import BridgeSession, BridgeError, RequestTimeout
+from ai_bridge.client import Client, connect, open_connection, read_reply
+from ai_bridge.pool import ClientPool, PoolExhausted
+from ai_bridge.aio import AsyncClient, AsyncClientPool, connect_async
+
+__all__ = [
+    "Client", "ClientPool", "AsyncClient", "AsyncClientPool",
+    "connect", "connect_async", "open_connection", "read_reply",
+    "BridgeSession", "BridgeError", "RequestTimeout", "PoolExhausted",
+]
@@ -0,0 +1,365 @@
+# ai_bridge/aio.py
+"""
+Variante asyncio del cliente y del pool
+
+Misma interfaz que Client / ClientPool pero con corrutinas:
+    
+    async with AsyncClientPool("192.168.1.10", size=4) as pool:
+        reply = await pool.ask("Explica qué es un socket TCP")
+        async for piece in pool.ask_stream("Y un socket UDP?"):
+            print(piece, end="")
+
+Los timeouts se aplican con asyncio.wait_for sobre cada lectura; como en
+el cliente síncrono, un pedido vencido descarta la conexión.
+"""
+import time
+import socket
+import asyncio
+from collections import deque
+from functools import partial
+from contextlib import asynccontextmanager
+from core.security import get_client_context
+from core.protocol import AsyncFramedStream, ProtocolError
+from ai_bridge.connection import (BridgeSession, BridgeError, RequestTimeout, Emit, RECV, backoff_delay,
+                                  check_welcome, negotiate_compression, ping, IP_SERVER, PORT_SERVER,
+                                  USE_TLS, CONNECT_TIMEOUT, REQUEST_TIMEOUT, RECONNECT_ATTEMPTS)
+from ai_bridge.pool import PoolExhausted, POOL_SIZE, POOL_ACQUIRE_TIMEOUT, HEALTH_CHECK_AFTER, MAX_IDLE
+
+async def perform_async(stream, action, timeout):
+    """Ejecuta una acción Send/Recv sobre un AsyncFramedStream (timeout por lectura)"""
+    if action is RECV:
+        return await asyncio.wait_for(stream.recv(), timeout)
+    return await stream.send(action.frame_type, action.payload, stream.next_request_id(), action.flags)
+
+async def drive_async(stream, operation, timeout):
+    """Ejecuta una operación sin E/S (ai_bridge/connection.py) hasta el final; retorna su resultado
+    
+    Los generadores async no pueden retornar un valor, así que a diferencia
+    de drive_stream() los textos entregados con Emit se descartan: ask_stream
+    usa su propio bucle.
+    """
+    result = None
+    while True:
+        try:
+            action = operation.send(result)
+        except StopIteration as done:
+            return done.value
+        result = None if isinstance(action, Emit) else await perform_async(stream, action, timeout)
+
+async def open_connection_async(host=IP_SERVER, port=PORT_SERVER, use_tls=USE_TLS, timeout=CONNECT_TIMEOUT,
+                                keepalive=False, compression=False):
+    """Abre la conexión y lee el saludo; retorna (stream, welcome)
+    
+    Con `compression` negocia la compresión (HELLO) si el servidor la ofrece.
+    """
+    ssl_context = get_client_context() if use_tls else None
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(host, port, ssl=ssl_context, server_hostname=host if use_tls else None),
+        timeout
+    )
+    if keepalive:
+        writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    stream = AsyncFramedStream(reader, writer)
+    try:
+        welcome = check_welcome(await asyncio.wait_for(stream.recv(), timeout))
+        if compression:
+            stream.codec = await drive_async(stream, negotiate_compression(welcome.flags), timeout)
+    except BaseException:
+        await stream.close()
+        raise
+    return stream, welcome
+
+class AsyncClient:
+    """Una conexión asyncio al servidor (ver Client)"""
+    
+    def __init__(self, host=IP_SERVER, port=PORT_SERVER, use_tls=USE_TLS, timeout=REQUEST_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, compression=True, keepalive=True,
+                 reconnect_attempts=RECONNECT_ATTEMPTS, token=None, resume=True):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.compression = compression
+        self.keepalive = keepalive
+        self.reconnect_attempts = reconnect_attempts
+        self.session = BridgeSession(token, resume)
+        self.stream = None
+        self.last_used = 0.0
+    
+    async def __aenter__(self):
+        return await self.connect()
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    @property
+    def connected(self):
+        return self.stream is not None
+    
+    @property
+    def client_id(self):
+        return self.session.client_id
+    
+    @property
+    def token(self):
+        return self.session.token
+    
+    @property
+    def resumed(self):
+        return self.session.resumed
+    
+    @property
+    def ia_mode(self):
+        return self.session.ia_mode
+    
+    async def connect(self):
+        """Abre la conexión si no está abierta, reintentando con backoff"""
+        if self.stream is not None:
+            return self
+        
+        attempt = 0
+        while True:
+            try:
+                stream, welcome = await open_connection_async(
+                    self.host, self.port, self.use_tls, self.connect_timeout, self.keepalive, self.compression
+                )
+                break
+            except (ConnectionError, ProtocolError, OSError, asyncio.TimeoutError):
+                attempt += 1
+                if attempt > self.reconnect_attempts:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+        
+        self.stream = stream
+        self.last_used = time.monotonic()
+        token = self.session.start(welcome)
+        if token:
+            await self._run(self.session.resume(token))
+        return self
+    
+    async def close(self):
+        if self.stream is not None:
+            stream, self.stream = self.stream, None
+            await stream.close()
+        self.session.disconnected()
+    
+    async def _perform(self, action, timeout):
+        """Una acción de la operación en curso; un timeout o un error de E/S cierran la conexión"""
+        try:
+            return await perform_async(self.stream, action, timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise RequestTimeout(f"Sin respuesta en {timeout}s")
+        except (ProtocolError, OSError):
+            await self.close()
+            raise
+    
+    async def _stream(self, operation, timeout=None):
+        """Ejecuta una operación sin E/S; genera lo que entregue con Emit
+        
+        Una conexión caída o una respuesta abandonada a mitad de camino
+        cierran la conexión: quedaría desfasada.
+        """
+        await self.connect()
+        timeout = timeout or self.timeout
+        complete = False
+        result = None
+        try:
+            while True:
+                try:
+                    action = operation.send(result)
+                except StopIteration:
+                    complete = True
+                    break
+                except BridgeError:
+                    complete = True
+                    raise
+                if isinstance(action, Emit):
+                    result = None
+                    yield action.text
+                else:
+                    result = await self._perform(action, timeout)
+        finally:
+            if not complete:
+                await self.close()
+        self.last_used = time.monotonic()
+    
+    async def _run(self, operation, timeout=None):
+        """Ejecuta una operación sin E/S hasta el final; retorna su resultado"""
+        await self.connect()
+        timeout = timeout or self.timeout
+        try:
+            result = await drive_async(self.stream, operation, timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise RequestTimeout(f"Sin respuesta en {timeout}s")
+        except BridgeError:
+            raise
+        except BaseException:
+            await self.close()
+            raise
+        self.last_used = time.monotonic()
+        return result
+    
+    async def _command(self, operation, timeout=None, retry=True):
+        """Comando; si la conexión estaba caída se reintenta una vez (reconectando)"""
+        try:
+            return await self._run(operation(), timeout)
+        except (ConnectionError, ProtocolError, OSError):
+            if not retry:
+                raise
+            return await self._run(operation(), timeout)
+    
+    async def ping(self, timeout=5):
+        """Chequeo de vida (sirve también en modo IA); False si la conexión no responde"""
+        if self.stream is None:
+            return False
+        try:
+            ok = await self._run(ping(), timeout)
+        except (BridgeError, ProtocolError, OSError):
+            # _run ya cerró la conexión
+            return False
+        if not ok:
+            await self.close()
+        return ok
+    
+    async def info(self, timeout=None):
+        return await self._command(self.session.info, timeout)
+    
+    async def list_models(self, timeout=None):
+        """Modelos disponibles; retorna (modelos, modelo actual)"""
+        return await self._command(self.session.list_models, timeout)
+    
+    async def change_model(self, model, timeout=None):
+        """Elige `model` en el menú de CHANGE-MODEL; BridgeError si no está en el menú"""
+        return await self._command(partial(self.session.change_model, model), timeout)
+    
+    async def search(self, terms, timeout=None):
+        return await self._command(partial(self.session.search, terms), timeout)
+    
+    async def enter_ia(self, timeout=None):
+        await self._command(self.session.enter_ia, timeout)
+    
+    async def leave_ia(self, timeout=None):
+        await self._run(self.session.leave_ia(), timeout)
+    
+    async def ask(self, prompt, timeout=None, on_status=None):
+        """Un turno IA; retorna la respuesta completa"""
+        return "".join([piece async for piece in self.ask_stream(prompt, timeout, on_status)])
+    
+    async def ask_stream(self, prompt, timeout=None, on_status=None):
+        """Un turno IA; genera los fragmentos según llegan (timeout por lectura)"""
+        await self.enter_ia(timeout)
+        async for piece in self._stream(self.session.ask(prompt, on_status), timeout):
+            yield piece
+
+async def connect_async(host=IP_SERVER, port=PORT_SERVER, **options):
+    """Abre un AsyncClient ya conectado"""
+    return await AsyncClient(host, port, **options).connect()
+
+class AsyncClientPool:
+    """Conexiones AsyncClient compartidas entre tareas (ver ClientPool)"""
+    
+    def __init__(self, host=IP_SERVER, port=PORT_SERVER, size=POOL_SIZE, acquire_timeout=POOL_ACQUIRE_TIMEOUT,
+                 health_check_after=HEALTH_CHECK_AFTER, max_idle=MAX_IDLE, **options):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+        self.options = options
+        self._idle = deque()
+        self._slots = asyncio.Semaphore(size)
+        self._closed = False
+        self.stats = {"created": 0, "reused": 0, "health_checks": 0, "reconnected": 0, "discarded": 0}
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def _take_idle(self):
+        while self._idle:
+            client = self._idle.pop()
+            idle_for = time.monotonic() - client.last_used
+            if idle_for > self.max_idle:
+                await client.close()
+                self.stats["discarded"] += 1
+                continue
+            if idle_for > self.health_check_after:
+                self.stats["health_checks"] += 1
+                if not await client.ping():
+                    # Se reconecta en acquire() y retoma su sesión con RESUME
+                    self.stats["reconnected"] += 1
+                    return client
+            self.stats["reused"] += 1
+            return client
+        return None
+    
+    async def acquire(self, timeout=None):
+        if self._closed:
+            raise BridgeError("Pool cerrado")
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout or self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise PoolExhausted(f"Sin conexiones libres tras {timeout or self.acquire_timeout}s")
+        try:
+            client = await self._take_idle()
+            if client is None:
+                client = AsyncClient(self.host, self.port, **self.options)
+                self.stats["created"] += 1
+            return await client.connect()
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    async def release(self, client):
+        try:
+            if self._closed or not client.connected:
+                await client.close()
+            else:
+                self._idle.append(client)
+        finally:
+            self._slots.release()
+    
+    @asynccontextmanager
+    async def client(self, timeout=None):
+        client = await self.acquire(timeout)
+        try:
+            yield client
+        finally:
+            await self.release(client)
+    
+    async def info(self, **kwargs):
+        async with self.client() as client:
+            return await client.info(**kwargs)
+    
+    async def list_models(self, **kwargs):
+        async with self.client() as client:
+            return await client.list_models(**kwargs)
+    
+    async def change_model(self, model, **kwargs):
+        async with self.client() as client:
+            return await client.change_model(model, **kwargs)
+    
+    async def search(self, terms, **kwargs):
+        async with self.client() as client:
+            return await client.search(terms, **kwargs)
+    
+    async def ask(self, prompt, **kwargs):
+        async with self.client() as client:
+            return await client.ask(prompt, **kwargs)
+    
+    async def ask_stream(self, prompt, **kwargs):
+        async with self.client() as client:
+            async for piece in client.ask_stream(prompt, **kwargs):
+                yield piece
+    
+    async def close(self):
+        self._closed = True
+        idle, self._idle = list(self._idle), deque()
+        for client in idle:
+            await client.close()
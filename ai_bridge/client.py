@@ -0,0 +1,292 @@
+# ai_bridge/client.py
+"""
+Cliente síncrono del servidor de IA
+
+Encapsula el socket, TLS, la compresión y el protocolo de frames para que
+las integraciones no copien el código de client.py:
+    
+    with Client("192.168.1.10") as client:
+        print(client.info())
+        client.change_model("gemini-2.5-flash")
+        print(client.ask("Explica qué es un socket TCP"))
+        for piece in client.ask_stream("Y un socket UDP?"):
+            print(piece, end="")
+
+La conexión se abre al primer uso y se vuelve a abrir (con backoff) si se
+perdió entre pedidos; al reconectar se envía RESUME con el token del saludo
+y el servidor devuelve la misma sesión (en caliente si todavía la conserva).
+Un pedido que excede su timeout cierra la conexión: la respuesta puede
+seguir llegando y ya no se podría emparejar.
+"""
+import time
+import socket
+from functools import partial
+from core.security import wrap_client_socket, save_client_session
+from core.protocol import FramedSocket, ProtocolError, FRAME_END, FRAME_ERROR
+from ai_bridge.connection import (BridgeSession, BridgeError, RequestTimeout, Emit, RECV, backoff_delay,
+                                  check_welcome, negotiate_compression, reply, ping, IP_SERVER, PORT_SERVER,
+                                  USE_TLS, CONNECT_TIMEOUT, REQUEST_TIMEOUT, RECONNECT_ATTEMPTS)
+
+def perform(conn, action):
+    """Ejecuta una acción Send/Recv sobre un FramedSocket"""
+    if action is RECV:
+        return conn.recv()
+    return conn.send(action.frame_type, action.payload, conn.next_request_id(), action.flags)
+
+def drive(conn, operation):
+    """Ejecuta una operación sin E/S (ai_bridge/connection.py) hasta el final; retorna su resultado"""
+    result = None
+    while True:
+        try:
+            action = operation.send(result)
+        except StopIteration as done:
+            return done.value
+        result = None if isinstance(action, Emit) else perform(conn, action)
+
+def drive_stream(conn, operation):
+    """Como drive(), pero genera los textos que la operación entrega con Emit"""
+    result = None
+    while True:
+        try:
+            action = operation.send(result)
+        except StopIteration as done:
+            return done.value
+        if isinstance(action, Emit):
+            yield action.text
+            result = None
+        else:
+            result = perform(conn, action)
+
+def open_connection(host=IP_SERVER, port=PORT_SERVER, use_tls=USE_TLS, timeout=CONNECT_TIMEOUT, keepalive=False,
+                    compression=False, source_address=None):
+    """Abre la conexión (TLS si está configurado) y lee el saludo; retorna (conn, welcome)
+    
+    Con `compression` negocia la compresión (HELLO) si el servidor la ofrece;
+    `source_address` fija la IP de origen (pruebas de carga).
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    if keepalive:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    try:
+        if source_address:
+            sock.bind((source_address, 0))
+        if use_tls:
+            sock = wrap_client_socket(sock, host)
+        sock.connect((host, port))
+        conn = FramedSocket(sock)
+        welcome = check_welcome(conn.recv())
+        if use_tls:
+            save_client_session(sock)
+        if compression:
+            conn.codec = drive(conn, negotiate_compression(welcome.flags))
+    except BaseException:
+        sock.close()
+        raise
+    return conn, welcome
+
+def read_reply(conn, request_id, on_status=None, sent=None):
+    """Lee la respuesta completa de un request_id; retorna (texto, es_error, ttft)
+    
+    Las respuestas llegan en el orden de los pedidos, así que con varios
+    pedidos en vuelo la siguiente respuesta es siempre la del más viejo.
+    `sent` (perf_counter del envío) es desde cuándo se mide el ttft.
+    """
+    started = sent or time.perf_counter()
+    ttft = None
+    parts = []
+    pieces = drive_stream(conn, reply(request_id, on_status, stream=True))
+    while True:
+        try:
+            piece = next(pieces)
+        except StopIteration as done:
+            frame = done.value
+            break
+        if ttft is None:
+            ttft = time.perf_counter() - started
+        parts.append(piece)
+    if ttft is None:
+        ttft = time.perf_counter() - started
+    if frame.type != FRAME_END:
+        parts.append(frame.text)
+    return "".join(parts), frame.type == FRAME_ERROR, ttft
+
+class Client:
+    """Una conexión al servidor con sus comandos como métodos
+    
+    No es thread-safe: para compartir conexiones entre hilos usar ClientPool.
+    El servidor atiende los prompts en modo IA, así que `ask` entra en ese
+    modo y se queda en él; un comando posterior sale antes de enviarse.
+    `token` (p. ej. guardado de una ejecución anterior) retoma esa sesión
+    en la primera conexión; `resume=False` abre siempre una sesión nueva.
+    """
+    
+    def __init__(self, host=IP_SERVER, port=PORT_SERVER, use_tls=USE_TLS, timeout=REQUEST_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT, compression=True, keepalive=True,
+                 reconnect_attempts=RECONNECT_ATTEMPTS, token=None, resume=True):
+        self.host = host
+        self.port = port
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.compression = compression
+        self.keepalive = keepalive
+        self.reconnect_attempts = reconnect_attempts
+        self.session = BridgeSession(token, resume)
+        self.conn = None
+        self.last_used = 0.0
+    
+    def __enter__(self):
+        self.connect()
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    @property
+    def connected(self):
+        return self.conn is not None
+    
+    @property
+    def client_id(self):
+        return self.session.client_id
+    
+    @property
+    def token(self):
+        return self.session.token
+    
+    @property
+    def resumed(self):
+        """"warm" / "cold" si la última conexión retomó una sesión"""
+        return self.session.resumed
+    
+    @property
+    def ia_mode(self):
+        return self.session.ia_mode
+    
+    def connect(self):
+        """Abre la conexión si no está abierta, reintentando con backoff"""
+        if self.conn is not None:
+            return self
+        
+        attempt = 0
+        while True:
+            try:
+                conn, welcome = open_connection(self.host, self.port, self.use_tls, self.connect_timeout,
+                                                self.keepalive, self.compression)
+                break
+            except (ConnectionError, ProtocolError, OSError):
+                attempt += 1
+                if attempt > self.reconnect_attempts:
+                    raise
+                time.sleep(backoff_delay(attempt))
+        
+        self.conn = conn
+        self.last_used = time.monotonic()
+        token = self.session.start(welcome)
+        if token:
+            self._run(self.session.resume(token))
+        return self
+    
+    def close(self):
+        """Cierra la conexión (sin salir del modo IA: el servidor lo cierra al desconectar)"""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+        self.conn = None
+        self.session.disconnected()
+    
+    def _stream(self, operation, timeout=None):
+        """Ejecuta una operación sin E/S en la conexión; genera lo que entregue con Emit
+        
+        Un timeout, una conexión caída o una respuesta abandonada a mitad de
+        camino cierran la conexión: quedaría desfasada.
+        """
+        self.connect()
+        timeout = timeout or self.timeout
+        self.conn.sock.settimeout(timeout)
+        complete = False
+        try:
+            result = yield from drive_stream(self.conn, operation)
+            complete = True
+        except socket.timeout:
+            raise RequestTimeout(f"Sin respuesta en {timeout}s")
+        except BridgeError:
+            complete = True
+            raise
+        finally:
+            if not complete:
+                self.close()
+        self.last_used = time.monotonic()
+        return result
+    
+    def _run(self, operation, timeout=None):
+        """Ejecuta una operación sin E/S hasta el final; retorna su resultado"""
+        pieces = self._stream(operation, timeout)
+        while True:
+            try:
+                next(pieces)
+            except StopIteration as done:
+                return done.value
+    
+    def _command(self, operation, timeout=None, retry=True):
+        """Comando; si la conexión estaba caída se reintenta una vez (reconectando)"""
+        try:
+            return self._run(operation(), timeout)
+        except (ConnectionError, ProtocolError, OSError):
+            if not retry:
+                raise
+            return self._run(operation(), timeout)
+    
+    def ping(self, timeout=5):
+        """Chequeo de vida (sirve también en modo IA); False si la conexión no responde"""
+        if self.conn is None:
+            return False
+        try:
+            ok = self._run(ping(), timeout)
+        except (BridgeError, ProtocolError, OSError):
+            # _stream ya cerró la conexión
+            return False
+        if not ok:
+            self.close()
+        return ok
+    
+    def info(self, timeout=None):
+        return self._command(self.session.info, timeout)
+    
+    def list_models(self, timeout=None):
+        """Modelos disponibles; retorna (modelos, modelo actual)"""
+        return self._command(self.session.list_models, timeout)
+    
+    def change_model(self, model, timeout=None):
+        """Elige `model` en el menú de CHANGE-MODEL; BridgeError si no está en el menú"""
+        return self._command(partial(self.session.change_model, model), timeout)
+    
+    def search(self, terms, timeout=None):
+        return self._command(partial(self.session.search, terms), timeout)
+    
+    def enter_ia(self, timeout=None):
+        self._command(self.session.enter_ia, timeout)
+    
+    def leave_ia(self, timeout=None):
+        """Sale del modo IA (el servidor guarda el resumen de la sesión)"""
+        self._run(self.session.leave_ia(), timeout)
+    
+    def ask(self, prompt, timeout=None, on_status=None):
+        """Un turno IA; retorna la respuesta completa"""
+        return "".join(self.ask_stream(prompt, timeout, on_status))
+    
+    def ask_stream(self, prompt, timeout=None, on_status=None):
+        """Un turno IA; genera los fragmentos de la respuesta según llegan
+        
+        `timeout` se aplica a cada lectura (no al turno completo). Cortar la
+        iteración antes del final cierra la conexión.
+        """
+        self.enter_ia(timeout)
+        yield from self._stream(self.session.ask(prompt, on_status), timeout)
+
+def connect(host=IP_SERVER, port=PORT_SERVER, **options):
+    """Abre un Client ya conectado (ver Client para las opciones)"""
+    return Client(host, port, **options).connect()
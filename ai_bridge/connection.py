@@ -0,0 +1,239 @@
+# ai_bridge/connection.py
+"""
+Lógica del cliente sin E/S (sans-IO), compartida por Client y AsyncClient
+
+Saludo, HELLO, RESUME, comandos, el menú de CHANGE-MODEL y los turnos IA se
+escriben una sola vez como generadores que no tocan el socket: piden la E/S
+con acciones y reciben su resultado en el siguiente send():
+    
+    request_id = yield Send(FRAME_COMMAND, "INFO")   # envía un frame nuevo
+    frame = yield RECV                               # siguiente frame (None = cerrada)
+    yield Emit(texto)                                # fragmento para ask_stream
+
+client.py (sockets bloqueantes) y aio.py (asyncio) solo ejecutan esas
+acciones con su transporte, sus timeouts y su reconexión.
+"""
+import os
+import re
+import random
+from collections import namedtuple
+from core.protocol import (FRAME_COMMAND, FRAME_PROMPT, FRAME_ERROR, FRAME_CHUNK, FRAME_END,
+                           FRAME_STATUS, FRAME_HELLO, FRAME_PING)
+from core.compression import CODEC_FLAGS, FLAG_DICT, Codec, available_codecs, hello_payload
+
+IP_SERVER = os.getenv("IP_SERVER", "localhost")
+PORT_SERVER = int(os.getenv("PORT_SERVER", 65432))
+USE_TLS = os.getenv("USE_TLS", "true").lower() == "true"
+
+CONNECT_TIMEOUT = 10     # segundos para conectar y recibir el saludo
+REQUEST_TIMEOUT = 120    # segundos por pedido (un turno IA puede esperar en cola)
+RECONNECT_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10.0
+
+MODEL_LINE_RE = re.compile(r"^\s*(\d+)\.\s+(\S+)\s*$")
+CURRENT_MODEL_PREFIX = "📌 Modelo actual:"
+ID_PREFIX = "ID:"
+TOKEN_PREFIX = "TOKEN:"
+RESUMED_PREFIX = "RESUMED:"
+
+class BridgeError(Exception):
+    """Error reportado por el servidor (frame ERROR o menú rechazado)"""
+
+class RequestTimeout(BridgeError):
+    """El pedido no terminó dentro de su timeout (la conexión se descarta)"""
+
+# Acciones que una operación pide a su transporte
+Send = namedtuple("Send", "frame_type payload flags", defaults=(b"", 0))
+Recv = namedtuple("Recv", "")
+Emit = namedtuple("Emit", "text")
+RECV = Recv()
+
+def backoff_delay(attempt, base=BACKOFF_BASE, maximum=BACKOFF_MAX):
+    """Espera exponencial con jitter antes del reintento `attempt` (desde 1)"""
+    return random.uniform(0, min(maximum, base * 2 ** (attempt - 1)))
+
+def check_welcome(frame):
+    """Valida el saludo del servidor (ConnectionError si cerró o rechazó la conexión)"""
+    if frame is None:
+        raise ConnectionError("El servidor cerró la conexión")
+    if frame.type == FRAME_ERROR:
+        raise ConnectionError(frame.text)
+    return frame
+
+def parse_welcome(text):
+    """Saludo (o respuesta de RESUME) → (ID de sesión, token de reanudación)"""
+    client_id = token = None
+    for line in text.splitlines():
+        if line.startswith(ID_PREFIX):
+            client_id = line[len(ID_PREFIX):].strip()
+        elif line.startswith(TOKEN_PREFIX):
+            token = line[len(TOKEN_PREFIX):].strip()
+    return client_id, token
+
+def parse_models(text):
+    """Texto de LIST-MODELS → (modelos, modelo actual)"""
+    models = []
+    current = None
+    for line in text.splitlines():
+        match = MODEL_LINE_RE.match(line)
+        if match:
+            models.append(match.group(2))
+        elif line.startswith(CURRENT_MODEL_PREFIX):
+            current = line[len(CURRENT_MODEL_PREFIX):].strip()
+    return models, current
+
+def parse_menu(text):
+    """Menú de CHANGE-MODEL → {modelo: opción}"""
+    options = {}
+    for line in text.splitlines():
+        match = MODEL_LINE_RE.match(line)
+        if match and match.group(1) != "0":
+            options[match.group(2)] = match.group(1)
+    return options
+
+def negotiate_compression(welcome_flags):
+    """HELLO: pide compresión si el WELCOME la anunció; retorna el Codec acordado o None"""
+    offered = welcome_flags & available_codecs()
+    if not offered:
+        return None
+    request_id = yield Send(FRAME_HELLO, hello_payload(), offered)
+    frame = yield RECV
+    if frame is None:
+        raise ConnectionError("El servidor cerró la conexión")
+    if frame.type != FRAME_HELLO or frame.request_id != request_id or not frame.flags & CODEC_FLAGS:
+        return None
+    return Codec(frame.flags & CODEC_FLAGS, bool(frame.flags & FLAG_DICT))
+
+def exchange(text, on_status=None, stream=False):
+    """Envía un COMMAND y lee su respuesta; retorna el último frame"""
+    request_id = yield Send(FRAME_COMMAND, text)
+    return (yield from reply(request_id, on_status, stream))
+
+def reply(request_id, on_status=None, stream=False):
+    """Lee la respuesta a request_id (sin los STATUS); retorna el último frame
+    
+    Con `stream` cada fragmento se entrega con Emit a medida que llega;
+    si no, los fragmentos se descartan y queda solo el frame final.
+    """
+    while True:
+        frame = yield RECV
+        if frame is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        if frame.request_id != request_id:
+            raise ConnectionError(f"Respuesta fuera de orden: {frame.request_id} != {request_id}")
+        if frame.type == FRAME_STATUS:
+            if on_status:
+                on_status(frame.text)
+            continue
+        # Respuesta simple, error o fin del streaming
+        if frame.type != FRAME_CHUNK:
+            return frame
+        if stream:
+            yield Emit(frame.text)
+
+def ping():
+    """PING; retorna True si el servidor respondió con el mismo request_id"""
+    request_id = yield Send(FRAME_PING)
+    frame = yield RECV
+    return frame is not None and frame.type == FRAME_PING and frame.request_id == request_id
+
+class BridgeSession:
+    """Estado de la sesión del cliente y sus operaciones (generadores sin E/S)
+    
+    El transporte llama a start() con cada saludo nuevo y, si retorna un
+    token, ejecuta resume(token). El modo IA se lleva aquí: `ask` entra en
+    él y un comando posterior sale antes de enviarse, con `ia-pause` (sin
+    resumir: el servidor resume la sesión al desconectar).
+    """
+    
+    def __init__(self, token=None, resume=True):
+        self.token = token
+        self.resume_enabled = resume
+        self.client_id = None
+        self.resumed = None     # "warm" / "cold" si la última conexión retomó una sesión
+        self.ia_mode = False
+    
+    def start(self, welcome):
+        """Conexión nueva; retorna el token de la sesión a retomar (o None)"""
+        previous_token = self.token
+        self.client_id, self.token = parse_welcome(welcome.text)
+        self.resumed = None
+        self.ia_mode = False
+        return previous_token if self.resume_enabled else None
+    
+    def disconnected(self):
+        # El servidor cierra el modo IA al desconectar
+        self.ia_mode = False
+    
+    def call(self, text, on_status=None):
+        """Pedido de respuesta única; retorna el último frame (BridgeError si es ERROR)"""
+        frame = yield from exchange(text, on_status)
+        if frame.type == FRAME_ERROR:
+            raise BridgeError(frame.text)
+        return frame
+    
+    def resume(self, token):
+        """Retoma la sesión del token; si ya no es válido se sigue con la nueva"""
+        frame = yield from self.call(f"RESUME {token}")
+        if frame.text.startswith(RESUMED_PREFIX):
+            self.resumed = frame.text.split("\n", 1)[0][len(RESUMED_PREFIX):]
+            self.client_id, self.token = parse_welcome(frame.text)
+    
+    def command(self, text):
+        """Comando fuera del modo IA"""
+        yield from self.leave_ia(summarize=False)
+        return (yield from self.call(text))
+    
+    def info(self):
+        return (yield from self.command("INFO")).text
+    
+    def list_models(self):
+        return parse_models((yield from self.command("LIST-MODELS")).text)
+    
+    def search(self, terms):
+        return (yield from self.command(f"SEARCH {terms}")).text
+    
+    def change_model(self, model):
+        """Elige `model` en el menú de CHANGE-MODEL; BridgeError si no está en el menú"""
+        frame = yield from self.command("CHANGE-MODEL")
+        if frame.type != FRAME_PROMPT:
+            raise BridgeError(frame.text)
+        
+        # Si el modelo no está, se responde "0" para cerrar el menú igual
+        choice = parse_menu(frame.text).get(model)
+        reply = yield from self.call(choice or "0")
+        if choice is None:
+            raise BridgeError(f"Modelo no disponible en el menú: {model}")
+        if not reply.text.startswith("✅"):
+            raise BridgeError(reply.text)
+        return reply.text
+    
+    def enter_ia(self):
+        if self.ia_mode:
+            return
+        frame = yield from self.command("IA")
+        if frame.text != "ia-activate":
+            raise BridgeError(f"No se pudo activar el modo IA: {frame.text}")
+        self.ia_mode = True
+    
+    def leave_ia(self, summarize=True):
+        """Sale del modo IA; con summarize el servidor guarda el resumen de la sesión
+        
+        Sin resumir (ia-pause) no se gasta una llamada al modelo: el historial
+        sigue en memoria en el servidor hasta el próximo IA o la desconexión.
+        """
+        if not self.ia_mode:
+            return
+        self.ia_mode = False
+        yield from self.call("ia-deactivate" if summarize else "ia-pause")
+    
+    def ask(self, prompt, on_status=None):
+        """Un turno IA; entrega los fragmentos con Emit"""
+        yield from self.enter_ia()
+        frame = yield from exchange(prompt, on_status, stream=True)
+        if frame.type == FRAME_ERROR:
+            raise BridgeError(frame.text)
+        if frame.type != FRAME_END:
+            # Servidor sin streaming: la respuesta llega en un solo frame
+            yield Emit(frame.text)
@@ -0,0 +1,159 @@
+# ai_bridge/pool.py
+"""
+Pool de conexiones para servicios que hacen muchos pedidos
+
+En lugar de un handshake TLS por pedido, el pool conserva hasta `size`
+conexiones abiertas y las presta por hilo:
+    
+    pool = ClientPool("192.168.1.10", size=4)
+    reply = pool.ask("Resume este texto: ...")
+    with pool.client() as client:       # varias operaciones en la misma conexión
+        client.change_model("gemini-2.5-flash")
+        reply = client.ask("...")
+    
+    - Se reutiliza la última conexión devuelta (la más "caliente")
+    - Una conexión ociosa más de `health_check_after` segundos se verifica
+      con PING antes de prestarla; si no responde se reconecta y retoma su
+      sesión con RESUME
+    - Las ociosas más de `max_idle` segundos se cierran
+    - Las conexiones usan SO_KEEPALIVE y se reabren con backoff si se cayeron
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from ai_bridge.client import Client
+from ai_bridge.connection import BridgeError, IP_SERVER, PORT_SERVER
+
+POOL_SIZE = 4
+POOL_ACQUIRE_TIMEOUT = 30  # segundos esperando una conexión libre
+HEALTH_CHECK_AFTER = 30    # segundos ociosa antes de verificarla con PING
+MAX_IDLE = 300             # segundos ociosa antes de cerrarla
+
+class PoolExhausted(BridgeError):
+    """No se liberó ninguna conexión dentro de acquire_timeout"""
+
+class ClientPool:
+    """Conexiones Client compartidas entre hilos"""
+    
+    def __init__(self, host=IP_SERVER, port=PORT_SERVER, size=POOL_SIZE, acquire_timeout=POOL_ACQUIRE_TIMEOUT,
+                 health_check_after=HEALTH_CHECK_AFTER, max_idle=MAX_IDLE, **options):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_idle = max_idle
+        self.options = options  # Se pasan a cada Client (timeout, use_tls, compression...)
+        self._lock = threading.Lock()
+        self._idle = deque()    # Conexiones libres; la de la derecha es la más reciente
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+        self.stats = {"created": 0, "reused": 0, "health_checks": 0, "reconnected": 0, "discarded": 0}
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def _count(self, field):
+        with self._lock:
+            self.stats[field] += 1
+    
+    def _take_idle(self):
+        """Conexión libre en buen estado o None (cierra las vencidas en el camino)"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                client = self._idle.pop()
+                # Las más viejas están a la izquierda: se cierran si pasaron max_idle
+                expired = []
+                while self._idle and time.monotonic() - self._idle[0].last_used > self.max_idle:
+                    expired.append(self._idle.popleft())
+            for stale in expired:
+                stale.close()
+                self._count("discarded")
+            
+            idle_for = time.monotonic() - client.last_used
+            if idle_for > self.max_idle:
+                client.close()
+                self._count("discarded")
+                continue
+            if idle_for > self.health_check_after:
+                self._count("health_checks")
+                if not client.ping():
+                    # Se reconecta en acquire() y retoma su sesión con RESUME
+                    self._count("reconnected")
+                    return client
+            self._count("reused")
+            return client
+    
+    def acquire(self, timeout=None):
+        """Presta una conexión (abierta); devolverla con release()"""
+        if self._closed:
+            raise BridgeError("Pool cerrado")
+        if not self._slots.acquire(timeout=timeout or self.acquire_timeout):
+            raise PoolExhausted(f"Sin conexiones libres tras {timeout or self.acquire_timeout}s")
+        try:
+            client = self._take_idle()
+            if client is None:
+                client = Client(self.host, self.port, **self.options)
+                self._count("created")
+            return client.connect()
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    def release(self, client):
+        """Devuelve una conexión; las caídas (o si el pool se cerró) se descartan"""
+        try:
+            if self._closed or not client.connected:
+                client.close()
+                return
+            with self._lock:
+                self._idle.append(client)
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def client(self, timeout=None):
+        client = self.acquire(timeout)
+        try:
+            yield client
+        finally:
+            self.release(client)
+    
+    def info(self, **kwargs):
+        with self.client() as client:
+            return client.info(**kwargs)
+    
+    def list_models(self, **kwargs):
+        with self.client() as client:
+            return client.list_models(**kwargs)
+    
+    def change_model(self, model, **kwargs):
+        with self.client() as client:
+            return client.change_model(model, **kwargs)
+    
+    def search(self, terms, **kwargs):
+        with self.client() as client:
+            return client.search(terms, **kwargs)
+    
+    def ask(self, prompt, **kwargs):
+        with self.client() as client:
+            return client.ask(prompt, **kwargs)
+    
+    def ask_stream(self, prompt, **kwargs):
+        """Genera los fragmentos; la conexión vuelve al pool al terminar la iteración"""
+        with self.client() as client:
+            yield from client.ask_stream(prompt, **kwargs)
+    
+    def close(self):
+        """Cierra las conexiones libres; las prestadas se cierran al devolverse"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for client in idle:
+            client.close()
@@ -1,16 +1,27 @@
 # client.py - ACTUALIZADO
 import socket
 import ssl
+import sys
 import time
 import os
+import json
+import queue
+import argparse
+import threading
+from collections import deque
 from dotenv import load_dotenv
-from core.security import wrap_client_socket
+from core.protocol import ProtocolError, FRAME_COMMAND, FRAME_PROMPT, FRAME_ERROR, FRAME_CHUNK, FRAME_END, FRAME_STATUS
+from core.compression import FLAG_ZSTD
+from helpers.load_test import percentile
+from ai_bridge import open_connection, read_reply
+from ai_bridge.connection import parse_welcome, TOKEN_PREFIX, RESUMED_PREFIX
 
 load_dotenv()
 
 IP_SERVER = os.getenv("IP_SERVER", "localhost")
 PORT_SERVER = int(os.getenv("PORT_SERVER", 65432))
 USE_TLS = os.getenv("USE_TLS", "true").lower() == "true"
+SESSION_TOKEN_FILE = os.getenv("SESSION_TOKEN_FILE", ".session_token")  # vacío = no retomar sesiones
 
 def typewriter_print(text, delay=0.001):
     """Imprime con efecto máquina de escribir"""
@@ -19,25 +30,93 @@ def typewriter_print(text, delay=0.001):
         time.sleep(delay)
     print()
 
-def main():
+def load_session_token():
+    """Token de la sesión anterior (para RESUME) o None"""
+    if not SESSION_TOKEN_FILE:
+        return None
     try:
-        print(f"[CLIENT] Conectando a {IP_SERVER}:{PORT_SERVER}...")
+        with open(SESSION_TOKEN_FILE) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def save_session_token(token):
+    if not SESSION_TOKEN_FILE or not token:
+        return
+    try:
+        fd = os.open(SESSION_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(token)
+    except OSError as e:
+        print(f"[CLIENT] No se pudo guardar el token de sesión: {e}")
+
+def without_token(text):
+    """El token no se muestra en pantalla"""
+    return "\n".join(line for line in text.splitlines() if not line.startswith(TOKEN_PREFIX))
+
+def print_status(text):
+    print(f"[SERVER] {text}", flush=True)
+
+def send_command(conn, text, on_status=print_status):
+    """Envía un comando con un request_id nuevo y espera su respuesta"""
+    request_id = conn.send(FRAME_COMMAND, text, conn.next_request_id())
+    while True:
+        frame = conn.recv()
+        if frame is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        if frame.request_id != request_id:
+            raise ConnectionError(f"Respuesta fuera de orden: {frame.request_id} != {request_id}")
+        if frame.type != FRAME_STATUS:
+            return frame
+        if on_status:
+            on_status(frame.text)
+
+def stream_command(conn, text, on_status=print_status):
+    """Envía un prompt y genera los fragmentos de la respuesta según llegan"""
+    request_id = conn.send(FRAME_COMMAND, text, conn.next_request_id())
+    while True:
+        frame = conn.recv()
+        if frame is None:
+            raise ConnectionError("El servidor cerró la conexión")
+        if frame.request_id != request_id:
+            raise ConnectionError(f"Respuesta fuera de orden: {frame.request_id} != {request_id}")
+        
+        # Avisos de cola: se muestran pero no son parte de la respuesta
+        if frame.type == FRAME_STATUS:
+            if on_status:
+                on_status(frame.text)
+            continue
         
-        # Crear socket
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(30)
+        if frame.type == FRAME_END:
+            return
         
-        # Aplicar TLS si está configurado
+        yield frame.text
+        
+        # Respuesta no fragmentada (servidor sin streaming)
+        if frame.type != FRAME_CHUNK:
+            return
+
+def main():
+    try:
+        print(f"[CLIENT] Conectando a {IP_SERVER}:{PORT_SERVER}...")
+        # Compresión de respuestas grandes (si el servidor la ofrece)
+        conn, welcome = open_connection(IP_SERVER, PORT_SERVER, USE_TLS, timeout=30, compression=True)
         if USE_TLS:
-            sock = wrap_client_socket(sock, IP_SERVER)
             print("[CLIENT] Conexión TLS establecida")
+        typewriter_print(f"[SERVER] {without_token(welcome.text)}", 0.01)
+        if conn.codec:
+            print(f"[CLIENT] Compresión activada ({'zstd' if conn.codec.codec == FLAG_ZSTD else 'zlib'})")
         
-        # Conectar
-        sock.connect((IP_SERVER, PORT_SERVER))
-        
-        # Recibir ID
-        welcome = sock.recv(1024).decode()
-        typewriter_print(f"[SERVER] {welcome}", 0.01)
+        # Retomar la sesión de la ejecución anterior (si el token sigue vigente)
+        _, token = parse_welcome(welcome.text)
+        previous_token = load_session_token()
+        if previous_token:
+            frame = send_command(conn, f"RESUME {previous_token}")
+            if frame.text.startswith(RESUMED_PREFIX):
+                session_id, token = parse_welcome(frame.text)
+                warm = frame.text.startswith(f"{RESUMED_PREFIX}warm")
+                print(f"[CLIENT] Sesión {session_id} retomada ({'en memoria' if warm else 'desde el último resumen'})")
+        save_session_token(token)
         print("-" * 40)
         
         # Bucle principal
@@ -51,11 +130,20 @@ def main():
                 print("[CLIENT] Desconectando...")
                 break
             
-            # Enviar comando
-            sock.sendall(cmd.encode())
+            # Enviar comando y recibir respuesta
+            frame = send_command(conn, cmd)
             
-            # Recibir respuesta
-            response = sock.recv(4096).decode()
+            # Menús interactivos (CHANGE-MODEL)
+            while frame.type == FRAME_PROMPT:
+                choice = input(frame.text).strip()
+                frame = send_command(conn, choice)
+            
+            response = frame.text
+            if response.startswith(RESUMED_PREFIX):
+                save_session_token(parse_welcome(response)[1])
+                response = without_token(response)
+            if frame.type == FRAME_ERROR:
+                response = f"[ERROR] {response}"
             
             # Modo IA
             if response == "ia-activate":
@@ -65,22 +153,22 @@ def main():
                     user_input = input("IA > ").strip()
                     
                     if user_input.lower() in ['back', 'salir']:
-                        sock.sendall(b"ia-deactivate")
+                        send_command(conn, "ia-deactivate")
                         typewriter_print("[SERVER] Saliendo del modo IA...", 0.01)
                         break
                     
-                    sock.sendall(user_input.encode())
-                    ai_response = sock.recv(8192).decode()
-                    
+                    # Mostrar cada fragmento apenas llega, sin retardos
                     print("\n" + "=" * 60)
-                    typewriter_print(ai_response, 0.001)
+                    for piece in stream_command(conn, user_input):
+                        print(piece, end='', flush=True)
+                    print()
                     print("=" * 60 + "\n")
             else:
                 # Respuesta normal
                 print("\n" + "=" * 60)
                 typewriter_print(response, 0.01)
                 print("=" * 60)
-                
+    
     except ConnectionRefusedError:
         print("[ERROR] No se pudo conectar. Verifica que el servidor esté ejecutándose.")
     except socket.timeout:
@@ -92,5 +180,223 @@ def main():
     
     print("[CLIENT] Conexión cerrada")
 
+# ---------------------------------------------------------------------------
+# Modo batch: prompts desde archivo o stdin, resultados en JSONL
+# ---------------------------------------------------------------------------
+
+class BatchItem:
+    """Un prompt de la entrada (index = línea de origen)"""
+    __slots__ = ("index", "id", "prompt", "error")
+    
+    def __init__(self, index, id, prompt, error=None):
+        self.index = index
+        self.id = id
+        self.prompt = prompt
+        self.error = error
+
+def parse_batch_line(index, line, input_format):
+    """Una línea de texto plano o un objeto JSON {"prompt": ..., "id": ...}"""
+    line = line.rstrip("\r\n")
+    if not line.strip():
+        return None
+    if input_format == "text" or (input_format == "auto" and not line.lstrip().startswith("{")):
+        return BatchItem(index, index, line)
+    try:
+        data = json.loads(line)
+        prompt = data.get("prompt") if isinstance(data, dict) else None
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError("falta el campo 'prompt'")
+        return BatchItem(index, data.get("id", index), prompt)
+    except ValueError as e:
+        return BatchItem(index, index, None, f"Línea inválida: {e}")
+
+class BatchResults:
+    """Escribe un registro JSONL por pedido y acumula latencias (compartido entre hilos)"""
+    
+    def __init__(self, output):
+        self._lock = threading.Lock()
+        self.output = output
+        self.latencies = []
+        self.errors = 0
+    
+    def write(self, item, response=None, error=None, latency=None, ttft=None, connection=None):
+        record = {"id": item.id, "index": item.index, "prompt": item.prompt}
+        if error is None:
+            record["response"] = response
+        else:
+            record["error"] = error
+        if latency is not None:
+            record["latency_ms"] = round(latency * 1000, 2)
+        if ttft is not None:
+            record["ttft_ms"] = round(ttft * 1000, 2)
+        record["connection"] = connection
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self.output.write(line + "\n")
+            if error is None:
+                self.latencies.append(latency * 1000)
+            else:
+                self.errors += 1
+    
+    def flush(self):
+        with self._lock:
+            self.output.flush()
+
+class BatchRun:
+    """Reparte los prompts entre un pool de conexiones con pipelining
+    
+    Un hilo lee la entrada y llena una cola acotada (stdin se procesa a
+    medida que llega, sin cargarlo entero); cada conexión toma prompts de la
+    cola y mantiene hasta `depth` pedidos en vuelo. Si una conexión se
+    pierde, sus pedidos en vuelo se reportan como error y el resto de la
+    cola lo atienden las demás; si no queda ninguna, se descarta con error.
+    """
+    
+    def __init__(self, args, results):
+        self.args = args
+        self.results = results
+        self.items = queue.Queue(maxsize=max(1, args.connections * args.depth * 2))
+        self._lock = threading.Lock()
+        self._alive = args.connections
+    
+    def feed(self, source):
+        for index, line in enumerate(source, 1):
+            item = parse_batch_line(index, line, self.args.format)
+            if item is not None:
+                self.items.put(item)
+        for _ in range(self.args.connections):
+            self.items.put(None)
+    
+    def next_item(self):
+        """Siguiente prompt válido (los inválidos se reportan al pasar), None al terminar"""
+        while True:
+            item = self.items.get()
+            if item is None or item.error is None:
+                return item
+            self.results.write(item, error=item.error)
+    
+    def worker(self, index):
+        args = self.args
+        pending = deque()  # (item, request_id, enviado)
+        conn = None
+        try:
+            conn, _ = open_connection(args.host, args.port, args.tls, args.timeout, compression=args.compression)
+            if args.mode == "ia":
+                reply = send_command(conn, "IA", on_status=None)
+                if reply.text != "ia-activate":
+                    raise ConnectionError(f"No se pudo activar el modo IA: {reply.text}")
+            
+            finished = False
+            while pending or not finished:
+                # Llenar la tubería hasta `depth` pedidos sin esperar respuestas
+                while not finished and len(pending) < args.depth:
+                    item = self.next_item()
+                    if item is None:
+                        finished = True
+                        break
+                    request_id = conn.send(FRAME_COMMAND, item.prompt, conn.next_request_id())
+                    pending.append((item, request_id, time.perf_counter()))
+                
+                if pending:
+                    item, request_id, sent = pending[0]
+                    text, is_error, ttft = read_reply(conn, request_id, sent=sent)
+                    pending.popleft()
+                    latency = time.perf_counter() - sent
+                    if is_error:
+                        self.results.write(item, error=text, latency=latency, connection=index)
+                    else:
+                        self.results.write(item, text, latency=latency, ttft=ttft, connection=index)
+        except (ConnectionError, ProtocolError, OSError) as e:
+            print(f"[BATCH] Conexión {index} perdida: {e}", file=sys.stderr)
+            for item, _, _ in pending:
+                self.results.write(item, error=f"Conexión perdida: {e}", connection=index)
+            self._worker_lost()
+            if conn is not None:
+                conn.close()
+            return
+        
+        # Todas las respuestas ya están escritas: un fallo al salir solo se avisa
+        try:
+            if args.mode == "ia":
+                send_command(conn, "ia-deactivate", on_status=None)
+        except (ConnectionError, ProtocolError, OSError) as e:
+            print(f"[BATCH] Conexión {index}: no se pudo salir del modo IA ({e})", file=sys.stderr)
+        finally:
+            conn.close()
+    
+    def _worker_lost(self):
+        with self._lock:
+            self._alive -= 1
+            last = self._alive == 0
+        # Sin conexiones vivas nadie más consume la cola: se vacía con error
+        if last:
+            while self._feeder.is_alive() or not self.items.empty():
+                try:
+                    item = self.items.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is not None:
+                    self.results.write(item, error=item.error or "Sin conexiones disponibles")
+    
+    def run(self, source):
+        self._feeder = threading.Thread(target=self.feed, args=(source,), daemon=True)
+        self._feeder.start()
+        workers = [threading.Thread(target=self.worker, args=(i,), daemon=True) for i in range(self.args.connections)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+def run_batch(args):
+    """Modo no interactivo: sin menús ni efecto máquina de escribir"""
+    source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    results = BatchResults(output)
+    
+    started = time.perf_counter()
+    try:
+        BatchRun(args, results).run(source)
+    except KeyboardInterrupt:
+        print("\n[BATCH] Interrumpido por usuario", file=sys.stderr)
+    finally:
+        results.flush()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - started
+    
+    latencies = sorted(results.latencies)
+    done = len(latencies)
+    print(f"[BATCH] {done} respuestas, {results.errors} errores en {elapsed:.1f}s "
+          f"({done / elapsed if elapsed else 0:.1f}/s) p50={percentile(latencies, 50):.1f}ms "
+          f"p95={percentile(latencies, 95):.1f}ms", file=sys.stderr)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cliente del servidor de IA (interactivo o batch)")
+    parser.add_argument("--batch", metavar="ARCHIVO", help="Prompts a enviar sin interacción ('-' = stdin)")
+    parser.add_argument("--format", choices=["auto", "text", "jsonl"], default="auto",
+                        help="Entrada: una línea por prompt o JSONL con 'prompt' (e 'id' opcional)")
+    parser.add_argument("--output", default="-", help="Resultados JSONL ('-' = stdout)")
+    parser.add_argument("--mode", choices=["ia", "command"], default="ia",
+                        help="ia: cada línea es un prompt del modo IA; command: un comando (INFO, SEARCH ...)")
+    parser.add_argument("--depth", type=int, default=4, help="Pedidos en vuelo por conexión (pipelining)")
+    parser.add_argument("--connections", type=int, default=1, help="Conexiones en paralelo")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout de socket (segundos)")
+    parser.add_argument("--host", default=IP_SERVER)
+    parser.add_argument("--port", type=int, default=PORT_SERVER)
+    parser.add_argument("--tls", action="store_true", default=USE_TLS)
+    parser.add_argument("--no-tls", dest="tls", action="store_false")
+    parser.add_argument("--compression", action="store_true", default=True)
+    parser.add_argument("--no-compression", dest="compression", action="store_false")
+    args = parser.parse_args()
+    args.depth = max(1, args.depth)
+    args.connections = max(1, args.connections)
+    return args
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = parse_args()
+    if args.batch:
+        run_batch(args)
+    else:
+        main()
@@ -0,0 +1,147 @@
+# core/backends.py
+"""
+Backends de modelos intercambiables
+
+El servidor solo usa esta parte de la interfaz de genai.Client, que es la
+que debe implementar cualquier backend:
+    
+    backend.chats.create(model=..., history=[...])  -> chat
+        chat.send_message(texto)                    -> respuesta con .text
+        chat.send_message_stream(texto)             -> iterable de respuestas con .text
+    backend.models.list()                           -> modelos con .name (y límites de tokens)
+    backend.models.generate_content(model=..., contents=texto) -> respuesta con .text
+
+MODEL_BACKEND=gemini usa la API real; MODEL_BACKEND=fake usa un modelo local
+determinista para pruebas de carga sin gastar cuota.
+"""
+import os
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini").lower()  # gemini | fake
+
+# Parámetros del backend falso
+FAKE_LATENCY_MS = float(os.getenv("FAKE_LATENCY_MS", 200))     # Hasta el primer fragmento
+FAKE_CHUNK_DELAY_MS = float(os.getenv("FAKE_CHUNK_DELAY_MS", 20))
+FAKE_CHUNK_SIZE = int(os.getenv("FAKE_CHUNK_SIZE", 40))         # Caracteres por fragmento
+FAKE_REPLY_SIZE = int(os.getenv("FAKE_REPLY_SIZE", 600))        # Caracteres por respuesta
+FAKE_ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", 0))        # 0.0 - 1.0
+FAKE_SEED = int(os.getenv("FAKE_SEED", 42))
+FAKE_MODELS = os.getenv("FAKE_MODELS", "gemini-2.0-flash,gemini-2.5-flash,gemma-3-27b-it")
+FAKE_INPUT_TOKEN_LIMIT = int(os.getenv("FAKE_INPUT_TOKEN_LIMIT", 1048576))
+
+FAKE_WORDS = (
+    "el servidor procesa la solicitud y responde con datos del modelo usando "
+    "sockets TCP memoria contexto sesión resumen latencia conexión cliente"
+).split()
+
+class FakeAPIError(Exception):
+    """Error simulado con el mismo atributo `code` que los errores de la API"""
+    
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+class FakeBackend:
+    """Modelo local determinista con latencia, fragmentos y errores configurables"""
+    
+    def __init__(self, latency_ms=FAKE_LATENCY_MS, chunk_delay_ms=FAKE_CHUNK_DELAY_MS,
+                 chunk_size=FAKE_CHUNK_SIZE, reply_size=FAKE_REPLY_SIZE,
+                 error_rate=FAKE_ERROR_RATE, seed=FAKE_SEED, models=FAKE_MODELS):
+        self.latency = latency_ms / 1000
+        self.chunk_delay = chunk_delay_ms / 1000
+        self.chunk_size = max(1, chunk_size)
+        self.reply_size = reply_size
+        self.error_rate = error_rate
+        self.model_names = [name.strip() for name in models.split(",") if name.strip()]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.chats = FakeChats(self)
+        self.models = FakeModels(self)
+    
+    def maybe_fail(self):
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED (simulado)")
+    
+    def reply_for(self, prompt, turn):
+        """Texto determinista según el prompt y el número de turno"""
+        digest = hashlib.sha256(f"{turn}:{prompt}".encode()).digest()
+        words = []
+        size = 0
+        i = 0
+        while size < self.reply_size:
+            word = FAKE_WORDS[digest[i % len(digest)] % len(FAKE_WORDS)]
+            words.append(word)
+            size += len(word) + 1
+            i += 1
+        return " ".join(words)[:self.reply_size]
+    
+    def stream(self, text):
+        time.sleep(self.latency)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                time.sleep(self.chunk_delay)
+            yield SimpleNamespace(text=text[start:start + self.chunk_size])
+
+class FakeChat:
+    def __init__(self, backend, model, history):
+        self.backend = backend
+        self.model = model
+        self.history = list(history or [])
+    
+    def get_history(self):
+        return list(self.history)
+    
+    def _turn(self, message):
+        self.backend.maybe_fail()
+        return self.backend.reply_for(message, len(self.history))
+    
+    def send_message(self, message):
+        text = self._turn(message)
+        time.sleep(self.backend.latency + self.backend.chunk_delay * (len(text) // self.backend.chunk_size))
+        self.history.extend([message, text])
+        return SimpleNamespace(text=text)
+    
+    def send_message_stream(self, message):
+        text = self._turn(message)
+        yield from self.backend.stream(text)
+        self.history.extend([message, text])
+
+class FakeChats:
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def create(self, model, history=None, **kwargs):
+        return FakeChat(self.backend, model, history)
+
+class FakeModels:
+    def __init__(self, backend):
+        self.backend = backend
+    
+    def list(self, **kwargs):
+        return [
+            SimpleNamespace(name=f"models/{name}", input_token_limit=FAKE_INPUT_TOKEN_LIMIT, output_token_limit=8192)
+            for name in self.backend.model_names
+        ]
+    
+    def generate_content(self, model, contents, **kwargs):
+        self.backend.maybe_fail()
+        time.sleep(self.backend.latency)
+        return SimpleNamespace(text=f"[RESUMEN SIMULADO] {self.backend.reply_for(str(contents), 0)[:200]}")
+
+def create_backend():
+    """Crea el backend de modelos según MODEL_BACKEND (None si no está configurado)"""
+    if MODEL_BACKEND == "fake":
+        return FakeBackend()
+    
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    
+    from google import genai
+    return genai.Client(api_key=api_key)
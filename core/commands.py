@@ -2,11 +2,20 @@
 """
 Comandos disponibles para clientes
 """
-import hashlib
+import os
+import asyncio
+import secrets
+from core.protocol import FRAME_PROMPT
+from database.sessions import save_selected_model
+from database.search import search_history
 
-def create_client_id(ip_address):
-    """Genera ID único para cliente"""
-    return hashlib.sha256(ip_address.encode()).hexdigest()
+def create_client_id():
+    """Genera un ID de sesión aleatorio por conexión (64 hex)
+    
+    No se deriva de la IP: clientes detrás de un mismo NAT compartían sesión.
+    Entre conexiones, la identidad la lleva el token de reanudación.
+    """
+    return secrets.token_hex(32)
 
 def get_connection_info(client_id, clients_connected):
     """Retorna información de conexión"""
@@ -14,7 +23,41 @@ def get_connection_info(client_id, clients_connected):
     if not client:
         return "Cliente no encontrado"
     
-    return f"ID: {client_id[:12]} | IP: {client['ip']} | Puerto: {client['port']} | Conectado: {client['connectedAt'].strftime('%H:%M:%S')}"
+    return (f"ID: {client_id[:12]} | IP: {client['ip']} | Puerto: {client['port']} | "
+            f"Conectado: {client['connectedAt'].strftime('%H:%M:%S')} | Worker: {os.getpid()}")
+
+def build_model_menu(model_manager):
+    """Construye el menú de modelos; retorna (menu, opciones) o (None, None)"""
+    available_models = model_manager.get_available_models() if model_manager else []
+    
+    if not available_models:
+        return None, None
+    
+    menu = "\n--- CAMBIO DE MODELO ---\n"
+    menu += "Seleccione modelo:\n"
+    
+    options = {}
+    for i, model_name in enumerate(available_models[:15], 1):
+        options[str(i)] = model_name
+        menu += f"{i}. {model_name}\n"
+    
+    menu += "\n0. Cancelar\n> "
+    return menu, options
+
+def apply_model_choice(client_id, clients_connected, chat_sessions, options, choice):
+    """Aplica la opción elegida en el menú de modelos"""
+    if choice == "0":
+        return "Operación cancelada"
+    
+    selected = options.get(choice)
+    if selected:
+        clients_connected[client_id]['selected_model'] = selected
+        save_selected_model(client_id, selected)
+        if client_id in chat_sessions:
+            chat_sessions[client_id].reset()
+        return f"✅ Modelo cambiado a: {selected}"
+    else:
+        return "❌ Opción inválida"
 
 def change_model_command(client_id, clients_connected, chat_sessions, model_manager):
     """Maneja cambio de modelo"""
@@ -23,43 +66,55 @@ def change_model_command(client_id, clients_connected, chat_sessions, model_mana
         return "Error: Cliente no encontrado"
     
     conn = client['conn']
-    available_models = model_manager.get_available_models(use_cache=False)
+    menu, options = build_model_menu(model_manager)
     
-    if not available_models:
+    if not menu:
         return "Error: No se pudieron cargar modelos"
     
     # Enviar menú
-    menu = "\n--- CAMBIO DE MODELO ---\n"
-    menu += "Seleccione modelo:\n"
+    conn.send(FRAME_PROMPT, menu)
     
-    options = {}
-    for i, model_name in enumerate(available_models[:15], 1):
-        options[str(i)] = model_name
-        menu += f"{i}. {model_name}\n"
+    try:
+        frame = conn.recv()
+        if frame is None:
+            return "Error: Conexión cerrada"
+        
+        return apply_model_choice(client_id, clients_connected, chat_sessions, options, frame.text.strip())
     
-    menu += "\n0. Cancelar\n> "
-    conn.sendall(menu.encode())
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+async def change_model_command_async(client_id, clients_connected, chat_sessions, model_manager):
+    """Cambio de modelo para el servidor asyncio (el catálogo se carga en el executor)"""
+    client = clients_connected.get(client_id)
+    if not client:
+        return "Error: Cliente no encontrado"
+    
+    stream = client['conn']
+    loop = asyncio.get_running_loop()
+    menu, options = await loop.run_in_executor(None, build_model_menu, model_manager)
+    
+    if not menu:
+        return "Error: No se pudieron cargar modelos"
+    
+    await stream.send(FRAME_PROMPT, menu)
     
     try:
-        choice = conn.recv(1024).decode().strip()
-        if choice == "0":
-            return "Operación cancelada"
+        frame = await stream.recv()
+        if frame is None:
+            return "Error: Conexión cerrada"
         
-        selected = options.get(choice)
-        if selected:
-            clients_connected[client_id]['selected_model'] = selected
-            if client_id in chat_sessions:
-                chat_sessions[client_id]['messages'] = []
-            return f"✅ Modelo cambiado a: {selected}"
-        else:
-            return "❌ Opción inválida"
-            
+        # Espera la confirmación en la DB: fuera del loop
+        return await loop.run_in_executor(
+            None, apply_model_choice, client_id, clients_connected, chat_sessions, options, frame.text.strip()
+        )
+    
     except Exception as e:
         return f"Error: {str(e)}"
 
 def list_models_command(client_id, clients_connected, model_manager):
     """Lista modelos disponibles"""
-    available_models = model_manager.get_available_models(use_cache=False)
+    available_models = model_manager.get_available_models()
     
     if not available_models:
         return "No hay modelos disponibles"
@@ -71,4 +126,19 @@ def list_models_command(client_id, clients_connected, model_manager):
     current = clients_connected[client_id].get('selected_model', 'gemini-2.0-flash')
     response += f"\n📌 Modelo actual: {current}\n"
     
-    return response
\ No newline at end of file
+    return response
+
+def search_command(client_id, terms):
+    """Busca en los mensajes y resúmenes del cliente (SEARCH <términos>)"""
+    if not terms:
+        return "Uso: SEARCH <términos>"
+    
+    results = search_history(client_id, terms)
+    if not results:
+        return f"Sin resultados para: {terms}"
+    
+    labels = {"user": "Tú", "model": "IA", "summary": "Resumen"}
+    response = f"\n=== RESULTADOS ({len(results)}) ===\n"
+    for kind, role, snippet, timestamp in results:
+        response += f"[{str(timestamp)[:16]}] {labels.get(role, role)}: {snippet}\n"
+    return response
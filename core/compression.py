@@ -0,0 +1,270 @@
+# core/compression.py
+"""
+Compresión opcional de payloads, negociada por conexión
+
+El servidor anuncia en las flags del WELCOME los códecs que soporta. Un
+cliente que quiere compresión responde con un frame HELLO (flags = códecs
+que acepta, payload = id del diccionario que tiene) y el servidor contesta
+con otro HELLO cuyas flags indican el códec elegido. Desde ahí, cualquier
+frame cuyo payload supere COMPRESSION_MIN_BYTES viaja comprimido y lo marca
+con FLAG_COMPRESSED; el otro extremo lo descomprime al leerlo. Un
+cliente que no envía HELLO nunca recibe frames comprimidos.
+    
+    zlib   siempre disponible
+    zstd   si está instalado el paquete `zstandard` (opcional)
+
+Ambos usan un diccionario compartido (texto típico de respuestas y menús):
+los mensajes cortos se comprimen mucho mejor cuando el compresor ya
+"conoce" las palabras frecuentes. Se puede entrenar uno propio con
+`python -m helpers.train_dictionary` y apuntar COMPRESSION_DICT a él en
+ambos extremos (si los ids no coinciden se comprime sin diccionario).
+"""
+import os
+import time
+import zlib
+import struct
+import threading
+from collections import Counter
+from core.log import get_logger
+from core.metrics import metrics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION = os.getenv("COMPRESSION", "auto").lower()  # off | zlib | zstd | auto (zstd si está instalado)
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 512))  # Payloads más chicos van sin comprimir
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", 6))            # zlib 1-9 (zstd usa 3)
+COMPRESSION_DICT = os.getenv("COMPRESSION_DICT", "")                  # Diccionario entrenado (vacío = incorporado)
+ZSTD_LEVEL = 3
+MAX_DICTIONARY_SIZE = 32768  # Ventana de zlib: lo que exceda no se aprovecha
+
+# Bits de las flags del frame
+FLAG_ZLIB = 0x0001
+FLAG_ZSTD = 0x0002
+FLAG_DICT = 0x0004  # Comprimido con el diccionario compartido
+FLAG_COMPRESSED = 0x0008  # El payload de este frame está comprimido (con el códec de las otras flags)
+CODEC_FLAGS = FLAG_ZLIB | FLAG_ZSTD
+DICT_ID = struct.Struct("!I")
+
+log = get_logger("SYSTEM")
+
+# Texto típico de respuestas, menús y markdown; lo más frecuente va al final
+# (zlib aprovecha mejor el final del diccionario)
+BUILTIN_DICTIONARY = (
+    "Resumen Conclusión Ejemplo Nota Importante Paso Ventajas Desventajas "
+    "Explicación Código Configuración Implementación Recomendación "
+    "```python\ndef \n    return \nimport \nfrom \nclass \n```\n"
+    "```bash\n```json\n```sql\nSELECT * FROM WHERE ORDER BY \n"
+    "=== MODELOS DISPONIBLES ===\n📌 Modelo actual: \n--- CAMBIO DE MODELO ---\n"
+    "Seleccione modelo:\n0. Cancelar\n✅ Modelo cambiado a: ❌ Opción inválida"
+    "gemini-2.5-flash gemini-2.5-pro gemini-2.0-flash-lite gemini-2.0-flash gemma-3 "
+    "the and of to in is that for with on as are this be by it can you "
+    "de la que el en y a los del se las por un para con una su al lo como más "
+    "pero sus le ya o este sí porque esta entre cuando muy sin sobre también "
+    "es son puede pueden debe hay ser está están tiene tienen hacer usar "
+    "por ejemplo, es decir, además, sin embargo, en este caso, de esta forma "
+    "\n\n## \n### \n**\n- **\n* \n1. \n2. \n3. \n| --- | --- |\n"
+).encode()
+
+def load_dictionary(path=COMPRESSION_DICT):
+    """Bytes del diccionario compartido (archivo entrenado o el incorporado)"""
+    if path:
+        try:
+            with open(path, "rb") as f:
+                return f.read()[-MAX_DICTIONARY_SIZE:]
+        except OSError as e:
+            log.error("No se pudo leer el diccionario de compresión", path=path, error=e)
+    return BUILTIN_DICTIONARY
+
+DICTIONARY = load_dictionary()
+DICTIONARY_ID = zlib.crc32(DICTIONARY)
+
+def available_codecs():
+    """Flags de los códecs que este proceso puede usar según COMPRESSION"""
+    if COMPRESSION == "off":
+        return 0
+    codecs = FLAG_ZLIB
+    if zstandard is not None and COMPRESSION in ("zstd", "auto"):
+        codecs |= FLAG_ZSTD
+    if COMPRESSION == "zlib":
+        codecs = FLAG_ZLIB
+    return codecs
+
+def choose_codec(offered):
+    """Códec preferido entre los ofrecidos (zstd antes que zlib), 0 si ninguno"""
+    common = offered & available_codecs()
+    if common & FLAG_ZSTD:
+        return FLAG_ZSTD
+    return common & FLAG_ZLIB
+
+class CompressionStats:
+    """Frames y bytes antes/después de comprimir (para ajustar el umbral)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0          # Debajo del umbral
+        self.incompressible = 0   # No achicaba: se envió tal cual
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.decompressed = 0
+    
+    def record(self, raw, wire):
+        with self._lock:
+            self.frames += 1
+            self.raw_bytes += raw
+            self.wire_bytes += wire
+    
+    def count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+    
+    def snapshot(self):
+        with self._lock:
+            ratio = self.raw_bytes / self.wire_bytes if self.wire_bytes else 0.0
+            return {
+                "frames": self.frames,
+                "skipped": self.skipped,
+                "incompressible": self.incompressible,
+                "decompressed": self.decompressed,
+                "raw_bytes": self.raw_bytes,
+                "wire_bytes": self.wire_bytes,
+                "ratio": round(ratio, 2),
+            }
+
+compression_stats = CompressionStats()
+
+# Los objetos de zstd no son thread-safe: uno por hilo, compartido entre conexiones
+_local = threading.local()
+
+def _zstd_dict():
+    shared = getattr(_local, "zstd_dict", None)
+    if shared is None:
+        shared = _local.zstd_dict = zstandard.ZstdCompressionDict(DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+    return shared
+
+def _zstd_compressor(use_dict):
+    key = "zstd_c_dict" if use_dict else "zstd_c"
+    compressor = getattr(_local, key, None)
+    if compressor is None:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dict() if use_dict else None)
+        setattr(_local, key, compressor)
+    return compressor
+
+def _zstd_decompressor(use_dict):
+    key = "zstd_d_dict" if use_dict else "zstd_d"
+    decompressor = getattr(_local, key, None)
+    if decompressor is None:
+        decompressor = zstandard.ZstdDecompressor(dict_data=_zstd_dict() if use_dict else None)
+        setattr(_local, key, decompressor)
+    return decompressor
+
+class Codec:
+    """Compresión de los frames salientes de una conexión"""
+    
+    def __init__(self, codec, use_dict, min_bytes=COMPRESSION_MIN_BYTES):
+        self.codec = codec
+        self.use_dict = use_dict
+        self.min_bytes = min_bytes
+        self.flags = codec | (FLAG_DICT if use_dict else 0)  # Lo que se anuncia en el HELLO de respuesta
+    
+    def compress(self, payload):
+        """Retorna (payload, flags): sin cambios si es chico o no achica"""
+        if len(payload) < self.min_bytes:
+            compression_stats.count("skipped")
+            return payload, 0
+        
+        started = time.perf_counter()
+        if self.codec == FLAG_ZSTD:
+            data = _zstd_compressor(self.use_dict).compress(payload)
+        else:
+            compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=DICTIONARY) if self.use_dict else zlib.compressobj(COMPRESSION_LEVEL)
+            data = compressor.compress(payload) + compressor.flush()
+        metrics.observe("compress", time.perf_counter() - started)
+        
+        if len(data) >= len(payload):
+            compression_stats.count("incompressible")
+            return payload, 0
+        compression_stats.record(len(payload), len(data))
+        return data, self.flags | FLAG_COMPRESSED
+
+def _read_bounded(reader, max_size):
+    """Lee a lo sumo max_size bytes descomprimidos; ValueError si queda más"""
+    chunks = []
+    remaining = max_size + 1
+    while remaining > 0:
+        chunk = reader.read(remaining)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    if remaining <= 0:
+        raise ValueError(f"Payload descomprimido supera {max_size} bytes")
+    return b"".join(chunks)
+
+def decompress(payload, flags, max_size):
+    """Descomprime un payload según sus flags (ValueError si es inválido o excede max_size)"""
+    started = time.perf_counter()
+    use_dict = bool(flags & FLAG_DICT)
+    try:
+        if flags & FLAG_ZSTD:
+            if zstandard is None:
+                raise ValueError("zstd no disponible")
+            # max_output_size no se respeta si la cabecera declara el tamaño: se acota la lectura
+            declared = zstandard.frame_content_size(payload)
+            if declared > max_size:
+                raise ValueError(f"Payload descomprimido supera {max_size} bytes")
+            data = _read_bounded(_zstd_decompressor(use_dict).stream_reader(payload), max_size)
+        else:
+            decompressor = zlib.decompressobj(zdict=DICTIONARY) if use_dict else zlib.decompressobj()
+            data = decompressor.decompress(payload, max_size)
+            if decompressor.unconsumed_tail:
+                raise ValueError(f"Payload descomprimido supera {max_size} bytes")
+    except (zlib.error, getattr(zstandard, "ZstdError", zlib.error)) as e:
+        raise ValueError(f"Payload comprimido inválido: {e}")
+    metrics.observe("decompress", time.perf_counter() - started)
+    compression_stats.count("decompressed")
+    return data
+
+def hello_payload():
+    """Payload del HELLO del cliente: el id de su diccionario"""
+    return DICT_ID.pack(DICTIONARY_ID)
+
+def negotiate(offered, payload):
+    """Lado servidor: retorna el Codec acordado (o None) para un HELLO del cliente"""
+    codec = choose_codec(offered)
+    if not codec:
+        return None
+    use_dict = len(payload) == DICT_ID.size and DICT_ID.unpack(payload)[0] == DICTIONARY_ID
+    return Codec(codec, use_dict)
+
+def train_dictionary(samples, size=MAX_DICTIONARY_SIZE):
+    """Arma un diccionario con los fragmentos más repetidos de respuestas típicas
+    
+    Cuenta líneas y frases de 2-4 palabras; las más frecuentes quedan al
+    final (donde zlib las aprovecha mejor) hasta llenar `size` bytes.
+    """
+    counts = Counter()
+    for sample in samples:
+        for line in sample.splitlines():
+            line = line.strip()
+            if 3 < len(line) < 200:
+                counts[line] += 1
+            words = line.split()
+            for n in (2, 3, 4):
+                for i in range(len(words) - n + 1):
+                    counts[" ".join(words[i:i + n])] += 1
+    
+    pieces = []
+    used = 0
+    for text, count in counts.most_common():
+        if count < 2:
+            break
+        piece = (text + "\n").encode()
+        if used + len(piece) > size:
+            continue
+        pieces.append(piece)
+        used += len(piece)
+    return b"".join(reversed(pieces))
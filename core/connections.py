@@ -0,0 +1,170 @@
+# core/connections.py
+"""
+Ciclo de vida de las conexiones del servidor
+    
+    - Límites de conexiones abiertas: global (MAX_CONNECTIONS) y por IP
+      (MAX_CONNECTIONS_PER_IP); la conexión que los excede se rechaza apenas
+      se acepta, sin crear hilo ni sesión. En modo prefork cada worker
+      aplica su parte (worker_limits)
+    - Ajustes TCP de cada socket aceptado: TCP_NODELAY (los fragmentos del
+      streaming no esperan a Nagle) y keepalive con tiempos propios, para
+      detectar en minutos un cliente que desapareció sin cerrar
+    - Drenado al apagar: se dejan de aceptar conexiones, las ociosas se cortan
+      y las que están en medio de un turno terminan antes de cerrarse
+
+Los timeouts de lectura (IDLE_TIMEOUT / READ_TIMEOUT) los aplica
+FramedSocket / AsyncFramedStream; aquí solo se definen.
+"""
+import os
+import math
+import socket
+import threading
+from collections import Counter
+from core.log import get_logger
+
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", 10000))
+MAX_CONNECTIONS_PER_IP = int(os.getenv("MAX_CONNECTIONS_PER_IP", 100))  # 0 = sin límite
+IDLE_TIMEOUT = float(os.getenv("IDLE_TIMEOUT", 900))   # segundos sin frames antes de cerrar (0 = nunca)
+READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", 30))    # segundos para completar un frame empezado
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", 30))  # espera de turnos en curso al apagar
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", 30))  # espera de resúmenes y de escrituras al apagar (cada una)
+TCP_NODELAY = os.getenv("TCP_NODELAY", "true").lower() == "true"
+TCP_KEEPALIVE = os.getenv("TCP_KEEPALIVE", "true").lower() == "true"
+TCP_KEEPIDLE = int(os.getenv("TCP_KEEPIDLE", 60))      # segundos de silencio antes del primer sondeo
+TCP_KEEPINTVL = int(os.getenv("TCP_KEEPINTVL", 10))    # segundos entre sondeos
+TCP_KEEPCNT = int(os.getenv("TCP_KEEPCNT", 5))         # sondeos sin respuesta antes de cortar
+
+REJECT_MESSAGES = {
+    "total": "Servidor lleno, intente más tarde",
+    "per_ip": "Demasiadas conexiones desde su IP, intente más tarde",
+    "draining": "Servidor deteniéndose, intente más tarde",
+}
+
+log = get_logger("SYSTEM")
+
+def tune_socket(sock):
+    """Aplica TCP_NODELAY y keepalive a un socket aceptado (o al de un transporte asyncio)"""
+    try:
+        if TCP_NODELAY:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if TCP_KEEPALIVE:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            # Las opciones finas no existen en todas las plataformas
+            for option, value in (("TCP_KEEPIDLE", TCP_KEEPIDLE), ("TCP_KEEPINTVL", TCP_KEEPINTVL), ("TCP_KEEPCNT", TCP_KEEPCNT)):
+                if hasattr(socket, option):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+    except OSError as e:
+        log.warning("No se pudieron ajustar las opciones TCP", error=e)
+
+def worker_limits(workers, max_total=MAX_CONNECTIONS, max_per_ip=MAX_CONNECTIONS_PER_IP):
+    """Límites de un worker prefork: la parte de cada uno, redondeada hacia arriba
+    
+    Cada worker lleva su propio registro; con SO_REUSEPORT el kernel reparte
+    las conexiones (también las de una misma IP) entre todos, así que los
+    límites configurados valen para el servidor completo. 0 sigue siendo
+    "sin límite" por IP.
+    """
+    share = lambda limit: math.ceil(limit / workers) if limit else 0
+    return share(max_total), share(max_per_ip)
+
+class ConnectionTracker:
+    """Conexiones abiertas del proceso: admisión, turnos en curso y drenado
+    
+    Cada conexión pasa por admit(ip) → attach(conn) → [busy/idle]* → release.
+    `idle(conn)` se llama antes de esperar el siguiente frame y retorna False
+    si el servidor se está deteniendo: el handler debe cerrar la conexión.
+    """
+    
+    def __init__(self, max_total=MAX_CONNECTIONS, max_per_ip=MAX_CONNECTIONS_PER_IP):
+        self.max_total = max_total
+        self.max_per_ip = max_per_ip
+        self.draining = False
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._total = 0
+        self._per_ip = Counter()
+        self._busy = {}  # conexión -> True si está en medio de un pedido
+        self.stats = {"accepted": 0, "rejected_total": 0, "rejected_per_ip": 0, "rejected_draining": 0}
+    
+    def admit(self, ip):
+        """Reserva un lugar para una conexión de `ip`; retorna None o el motivo del rechazo"""
+        with self._lock:
+            if self.draining:
+                reason = "draining"
+            elif self._total >= self.max_total:
+                reason = "total"
+            elif self.max_per_ip and self._per_ip[ip] >= self.max_per_ip:
+                reason = "per_ip"
+            else:
+                self._total += 1
+                self._per_ip[ip] += 1
+                self.stats["accepted"] += 1
+                return None
+            self.stats[f"rejected_{reason}"] += 1
+            return reason
+    
+    def attach(self, conn):
+        """Asocia la conexión ya establecida (TLS incluido); False si el servidor se detiene"""
+        with self._lock:
+            if self.draining:
+                return False
+            self._busy[conn] = True
+            return True
+    
+    def busy(self, conn):
+        with self._lock:
+            if conn in self._busy:
+                self._busy[conn] = True
+    
+    def idle(self, conn):
+        """Marca la conexión esperando un frame; False si debe cerrarse por el drenado"""
+        with self._lock:
+            if conn in self._busy:
+                self._busy[conn] = False
+            return not self.draining
+    
+    def release(self, ip, conn=None):
+        with self._lock:
+            self._busy.pop(conn, None)
+            self._total -= 1
+            self._per_ip[ip] -= 1
+            if self._per_ip[ip] <= 0:
+                del self._per_ip[ip]
+            self._drained.notify_all()
+    
+    def active(self):
+        with self._lock:
+            return self._total
+    
+    def begin_drain(self):
+        """Deja de admitir conexiones y corta las ociosas; retorna cuántas siguen en un pedido"""
+        with self._lock:
+            self.draining = True
+            idle = [conn for conn, busy in self._busy.items() if not busy]
+            in_flight = len(self._busy) - len(idle)
+        for conn in idle:
+            conn.abort()
+        return in_flight
+    
+    def abort_all(self):
+        """Corta las conexiones que siguen abiertas (vencido el drenado)"""
+        with self._lock:
+            remaining = list(self._busy)
+        for conn in remaining:
+            conn.abort()
+        return len(remaining)
+    
+    def wait_drained(self, timeout):
+        """Espera (bloqueando) a que se liberen todas las conexiones; False si venció"""
+        with self._lock:
+            return self._drained.wait_for(lambda: self._total <= 0, timeout)
+    
+    def snapshot(self):
+        with self._lock:
+            return dict(
+                self.stats,
+                active=self._total,
+                busy=sum(self._busy.values()),
+                ips=len(self._per_ip),
+                draining=int(self.draining),
+            )
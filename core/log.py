@@ -0,0 +1,87 @@
+# core/log.py
+"""
+Logs estructurados del servidor
+
+Cada evento lleva un componente (SYSTEM, SECURITY, DB, IA, MODELS...) y
+campos clave=valor. LOG_FORMAT=text mantiene el formato de siempre con los
+campos al final:
+    
+    2025-01-01 12:00:00 [SYSTEM] Cliente conectado client=a3f8b2e1 addr=192.168.1.20:51234
+    2025-01-01 12:00:05 [ERROR-DB] No se pudo guardar el mensaje error=...
+
+LOG_FORMAT=json emite una línea JSON por evento para procesarla con otras
+herramientas.
+"""
+import os
+import sys
+import json
+import logging
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        component = getattr(record, "component", "SYSTEM")
+        if record.levelno >= logging.WARNING:
+            tag = record.levelname if component == "SYSTEM" else f"{record.levelname}-{component}"
+        else:
+            tag = component
+        fields = getattr(record, "fields", {})
+        line = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} [{tag}] {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={_text_value(value)}" for key, value in fields.items())
+        return line
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        event = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "component": getattr(record, "component", "SYSTEM"),
+            "msg": record.getMessage(),
+        }
+        event.update(getattr(record, "fields", {}))
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+def _text_value(value):
+    text = str(value)
+    return f'"{text}"' if " " in text or not text else text
+
+class StructuredLogger:
+    """Logger de un componente: log.info("mensaje", campo=valor, ...)"""
+    
+    def __init__(self, component):
+        self.component = component
+        self._logger = logging.getLogger(f"ai_bridge.{component.lower()}")
+    
+    def _log(self, level, message, fields):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, message, extra={"component": self.component, "fields": fields})
+    
+    def debug(self, message, **fields):
+        self._log(logging.DEBUG, message, fields)
+    
+    def info(self, message, **fields):
+        self._log(logging.INFO, message, fields)
+    
+    def warning(self, message, **fields):
+        self._log(logging.WARNING, message, fields)
+    
+    def error(self, message, **fields):
+        self._log(logging.ERROR, message, fields)
+
+def _configure():
+    root = logging.getLogger("ai_bridge")
+    if root.handlers:
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+
+_configure()
+
+def get_logger(component):
+    return StructuredLogger(component)
@@ -0,0 +1,271 @@
+# core/metrics.py
+"""
+Métricas del servidor: contadores, gauges e histogramas de latencia por etapa
+
+Las etapas instrumentadas son:
+    recv        lectura y decodificación de un frame (sin contar la espera del cliente)
+    history     carga del contexto previo y armado del chat con su historial
+    queue       espera en el scheduler de Gemini hasta tener turno
+    gemini      llamada al modelo (hasta el último fragmento)
+    save        save_message (encolado en el escritor de la DB)
+    summarize   ai_self_summarize (resumen en segundo plano)
+    send        sendall / drain de un frame
+
+Todo se guarda en memoria con costo O(1) por observación. Se consulta con el
+comando STATS o, si METRICS_PORT > 0, en formato de texto de Prometheus en
+http://METRICS_HOST:METRICS_PORT/metrics
+"""
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # 0 = deshabilitado
+METRICS_PREFIX = "ai_bridge"
+
+# Límites superiores de los buckets (segundos)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+STAGES = ("recv", "history", "queue", "gemini", "save", "summarize", "send")
+
+class Histogram:
+    """Histograma de buckets fijos: observar es O(1) y no guarda muestras"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # El último es +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+    
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.count, self.sum, self.max
+    
+    def percentile(self, pct, counts=None, count=None, max_value=None):
+        """Estimación interpolando dentro del bucket (como histogram_quantile)"""
+        if counts is None:
+            counts, count, _, max_value = self.snapshot()
+        if not count:
+            return 0.0
+        target = pct / 100 * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= target:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = min(self.buckets[index], max_value) if index < len(self.buckets) else max_value
+                return lower + (upper - lower) * (target - seen) / bucket_count
+            seen += bucket_count
+        return max_value
+
+class Metrics:
+    """Registro de métricas del proceso"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (nombre, etiquetas) -> valor
+        self._gauges = {}
+        self._histograms = {}  # etapa -> Histogram
+        self._collectors = {}  # nombre -> función que retorna un dict de valores
+        self.started_at = time.time()
+        for stage in STAGES:
+            self._histograms[stage] = Histogram()
+    
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def gauge_add(self, name, value):
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + value
+    
+    def observe(self, stage, seconds):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, Histogram())
+        histogram.observe(seconds)
+    
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+    
+    def register_collector(self, name, collect):
+        """Agrega estadísticas de otro componente (TLS, pool, modelos...) a STATS"""
+        self._collectors[name] = collect
+    
+    def snapshot(self):
+        """Copia de todas las métricas como dicts simples"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = dict(self._histograms)
+        
+        stages = {}
+        for stage, histogram in histograms.items():
+            counts, count, total, max_value = histogram.snapshot()
+            stages[stage] = {
+                "count": count,
+                "sum": total,
+                "max": max_value,
+                "buckets": counts,
+                "p50": histogram.percentile(50, counts, count, max_value),
+                "p95": histogram.percentile(95, counts, count, max_value),
+                "p99": histogram.percentile(99, counts, count, max_value),
+            }
+        
+        collected = {}
+        for name, collect in list(self._collectors.items()):
+            try:
+                collected[name] = collect()
+            except Exception as e:
+                collected[name] = {"error": str(e)}
+        
+        return {
+            "uptime": time.time() - self.started_at,
+            "counters": counters,
+            "gauges": gauges,
+            "stages": stages,
+            "components": collected,
+        }
+    
+    def render_text(self):
+        """Resumen legible para el comando STATS"""
+        snap = self.snapshot()
+        counters = snap["counters"]
+        
+        def counter(name):
+            return sum(value for (key, _), value in counters.items() if key == name)
+        
+        lines = [
+            "=== ESTADÍSTICAS DEL SERVIDOR ===",
+            f"Uptime: {snap['uptime']:.0f}s | Conexiones activas: {snap['gauges'].get('connections_active', 0)} "
+            f"| Conexiones totales: {counter('connections')}",
+            f"Turnos IA: {counter('turns')} | Comandos: {counter('commands')} "
+            f"| Bytes in/out: {counter('bytes_in')}/{counter('bytes_out')}",
+            "",
+            f"{'Etapa':<10} {'n':>8} {'media':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'máx':>9}",
+        ]
+        for stage, data in snap["stages"].items():
+            mean = data["sum"] / data["count"] if data["count"] else 0.0
+            lines.append(
+                f"{stage:<10} {data['count']:>8} {mean * 1000:>7.1f}ms {data['p50'] * 1000:>7.1f}ms "
+                f"{data['p95'] * 1000:>7.1f}ms {data['p99'] * 1000:>7.1f}ms {data['max'] * 1000:>7.1f}ms"
+            )
+        
+        # Contadores con etiquetas (comandos, errores, cache...) agrupados por nombre
+        labelled = {}
+        for (name, labels), value in sorted(counters.items()):
+            if labels:
+                label = "/".join(str(label_value) for _, label_value in labels)
+                labelled.setdefault(name, []).append(f"{label}={value}")
+        if labelled:
+            lines.append("")
+        for name, values in labelled.items():
+            lines.append(f"{name}: {', '.join(values)}")
+        
+        if snap["components"]:
+            lines.append("")
+        for name, values in snap["components"].items():
+            if isinstance(values, dict):
+                fields = ", ".join(f"{key}={_format_value(value)}" for key, value in values.items())
+            else:
+                fields = _format_value(values)
+            lines.append(f"{name}: {fields}")
+        
+        return "\n".join(lines)
+    
+    def render_prometheus(self):
+        """Formato de texto de Prometheus (exposition format 0.0.4)"""
+        snap = self.snapshot()
+        lines = []
+        
+        seen = set()
+        for (name, labels), value in sorted(snap["counters"].items()):
+            metric = f"{METRICS_PREFIX}_{name}_total"
+            if metric not in seen:
+                lines.append(f"# TYPE {metric} counter")
+                seen.add(metric)
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+        
+        for name, value in sorted(snap["gauges"].items()):
+            metric = f"{METRICS_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value}")
+        
+        metric = f"{METRICS_PREFIX}_stage_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        for stage, data in snap["stages"].items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), data["buckets"]):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {data["sum"]}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {data["count"]}')
+        
+        for component, values in snap["components"].items():
+            if not isinstance(values, dict):
+                values = {"value": values}
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if isinstance(value, (int, float)):
+                    metric = f"{METRICS_PREFIX}_{component}_{key}"
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric} {value}")
+        
+        lines.append(f"# TYPE {METRICS_PREFIX}_uptime_seconds gauge")
+        lines.append(f"{METRICS_PREFIX}_uptime_seconds {snap['uptime']:.3f}")
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def _format_value(value):
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
+
+metrics = Metrics()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # Sin una línea de log por cada scrape
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Sirve /metrics en un hilo propio; retorna el servidor o None si está deshabilitado"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
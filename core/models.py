@@ -2,28 +2,80 @@
 """
 Gestión de modelos de Gemini API
 """
+import os
+import json
 import time
+import threading
+from core.log import get_logger
+
+MODELS_CACHE_PATH = os.getenv("MODELS_CACHE_PATH", "models_cache.json")
+MODELS_REFRESH_TIMEOUT = float(os.getenv("MODELS_REFRESH_TIMEOUT", 30))
+DEFAULT_INPUT_TOKEN_LIMIT = int(os.getenv("DEFAULT_INPUT_TOKEN_LIMIT", 32768))  # Si el catálogo no informa el límite
+
+log = get_logger("MODELS")
 
 class ModelManager:
-    """Gestiona modelos disponibles con cache"""
+    """Gestiona modelos disponibles con cache
+    
+    - Single-flight: refrescos simultáneos comparten una sola llamada a models.list()
+    - Stale-while-revalidate: un cache vencido se sirve mientras se refresca en segundo plano
+    - El catálogo se guarda en disco para que un reinicio liste modelos sin esperar a la API
+    """
     
-    def __init__(self, gemini_client):
+    def __init__(self, gemini_client, cache_path=MODELS_CACHE_PATH):
         self.client = gemini_client
         self.cache = None
+        self.limits = {}  # modelo -> input_token_limit informado por la API
         self.cache_timestamp = 0
         self.CACHE_DURATION = 300  # 5 minutos
-        
+        self.cache_path = cache_path
+        self.stats = {"refreshes": 0, "coalesced": 0, "stale_served": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._refresh_done = None  # Event del refresco en curso
+        self._load_from_disk()
+    
     def get_available_models(self, use_cache=True):
         """Obtiene lista de modelos para chat"""
         if not self.client:
             return []
         
-        if use_cache and self.cache and (time.time() - self.cache_timestamp < self.CACHE_DURATION):
+        if use_cache and self.cache:
+            if time.time() - self.cache_timestamp >= self.CACHE_DURATION:
+                self.stats["stale_served"] += 1
+                self._refresh_in_background()
             return self.cache
         
+        # Sin cache (o refresco forzado): esperar al refresco en curso o lanzarlo
+        done, owner = self._begin_refresh()
+        if owner:
+            self._fetch(done)
+        else:
+            done.wait(MODELS_REFRESH_TIMEOUT)
+        return self.cache or []
+    
+    def input_token_limit(self, model):
+        """Límite de tokens de entrada del modelo (de la metadata del catálogo)"""
+        return self.limits.get(model) or DEFAULT_INPUT_TOKEN_LIMIT
+    
+    def _begin_refresh(self):
+        """Retorna (evento, dueño); solo el dueño hace la llamada a la API"""
+        with self._lock:
+            if self._refresh_done is not None:
+                self.stats["coalesced"] += 1
+                return self._refresh_done, False
+            self._refresh_done = threading.Event()
+            return self._refresh_done, True
+    
+    def _refresh_in_background(self):
+        done, owner = self._begin_refresh()
+        if owner:
+            threading.Thread(target=self._fetch, args=(done,), name="models-refresh", daemon=True).start()
+    
+    def _fetch(self, done):
         try:
             all_models = list(self.client.models.list())
             chat_models = []
+            limits = {}
             
             for model in all_models:
                 model_name = model.name.replace("models/", "")
@@ -35,14 +87,48 @@ class ModelManager:
                 
                 if any(keyword in model_name.lower() for keyword in ['gemini', 'gemma', 'chat', 'text']):
                     chat_models.append(model_name)
+                    if getattr(model, "input_token_limit", None):
+                        limits[model_name] = model.input_token_limit
             
             chat_models.sort()
+            self.limits = limits
             self.cache = chat_models
             self.cache_timestamp = time.time()
+            self.stats["refreshes"] += 1
+            self._save_to_disk()
             
-            print(f"[MODELS]: {len(chat_models)} modelos disponibles")
-            return chat_models
-            
+            log.info("Modelos disponibles", count=len(chat_models))
+        
+        except Exception as e:
+            self.stats["errors"] += 1
+            log.error("Falló el refresco del catálogo", error=e)
+        finally:
+            with self._lock:
+                self._refresh_done = None
+            done.set()
+    
+    def _load_from_disk(self):
+        """Carga el último catálogo guardado (se sirve como vencido si es viejo)"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.cache = data.get("models") or None
+            self.limits = data.get("limits") or {}
+            self.cache_timestamp = data.get("timestamp", 0)
+            if self.cache:
+                log.info("Modelos cargados desde disco", count=len(self.cache), path=self.cache_path)
+        except Exception as e:
+            log.error("No se pudo leer el catálogo", path=self.cache_path, error=e)
+    
+    def _save_to_disk(self):
+        if not self.cache_path:
+            return
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"timestamp": self.cache_timestamp, "models": self.cache, "limits": self.limits}, f)
+            os.replace(tmp_path, self.cache_path)
         except Exception as e:
-            print(f"[ERROR-MODELS]: {e}")
-            return self.cache or []
\ No newline at end of file
+            log.error("No se pudo guardar el catálogo", path=self.cache_path, error=e)
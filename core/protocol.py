@@ -0,0 +1,277 @@
+# core/protocol.py
+"""
+Protocolo binario con prefijo de longitud (framing)
+
+Cada frame es una cabecera fija de 12 bytes seguida del payload:
+    
+    versión (1B) | tipo (1B) | flags (2B) | request_id (4B) | longitud (4B)
+
+El request_id lo asigna el cliente y el servidor lo repite en la respuesta,
+lo que permite enviar varias peticiones seguidas por la misma conexión
+(pipelining) y emparejar cada respuesta con su petición.
+
+Las flags indican si el payload viaja comprimido (ver core/compression.py);
+la compresión solo se usa si el cliente la pidió con un frame HELLO.
+"""
+import asyncio
+import os
+import time
+import socket
+import struct
+from collections import namedtuple
+from core.metrics import metrics
+from core.compression import FLAG_COMPRESSED, CODEC_FLAGS, decompress
+
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("!BBHII")
+MAX_FRAME_SIZE = int(os.getenv("MAX_FRAME_SIZE", 16 * 1024 * 1024))  # 16MB
+RECV_SIZE = 65536
+
+# Tipos de frame
+FRAME_WELCOME = 1   # Saludo inicial del servidor
+FRAME_COMMAND = 2   # Comando o prompt del cliente
+FRAME_RESPONSE = 3  # Respuesta completa del servidor
+FRAME_PROMPT = 4    # El servidor espera una entrada del cliente (menús)
+FRAME_ERROR = 5     # Error de protocolo o de servidor
+FRAME_CHUNK = 6     # Fragmento de una respuesta en streaming
+FRAME_END = 7       # Fin de una respuesta en streaming
+FRAME_STATUS = 8    # Aviso informativo (posición en cola, reintentos); no es la respuesta
+FRAME_HELLO = 9     # Negociación de capacidades (compresión)
+FRAME_PING = 10     # Chequeo de vida; el servidor responde con otro PING (también en modo IA)
+
+class ProtocolError(Exception):
+    """Frame mal formado o versión de protocolo incompatible"""
+
+class ConnectionTimeout(Exception):
+    """El cliente no envió un frame a tiempo (idle) o dejó uno a medias (read)"""
+    
+    def __init__(self, kind, timeout):
+        super().__init__(f"Sin datos del cliente en {timeout:g}s ({kind})")
+        self.kind = kind
+
+class Frame(namedtuple("Frame", "type flags request_id payload")):
+    """Frame recibido"""
+    __slots__ = ()
+    
+    @property
+    def text(self):
+        return self.payload.decode()
+
+def encode_frame(frame_type, payload=b"", request_id=0, flags=0):
+    """Serializa un frame (cabecera + payload) en un único buffer"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame demasiado grande: {len(payload)} bytes")
+    return HEADER.pack(PROTOCOL_VERSION, frame_type, flags, request_id, len(payload)) + payload
+
+def encode_payload(payload, codec):
+    """Payload en bytes, comprimido si la conexión negoció un códec; retorna (payload, flags)"""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    if codec is None or not payload:
+        return payload, 0
+    return codec.compress(payload)
+
+def decode_payload(payload, flags, codec=None):
+    """Payload recibido, descomprimido si corresponde
+    
+    Solo se aceptan frames comprimidos con el códec negociado por HELLO en
+    esta conexión (`codec`): cualquier otro es un error de protocolo.
+    """
+    if not flags & FLAG_COMPRESSED:
+        return payload
+    if codec is None or flags & CODEC_FLAGS != codec.codec:
+        raise ProtocolError("Frame comprimido sin compresión negociada")
+    try:
+        return decompress(payload, flags, MAX_FRAME_SIZE)
+    except ValueError as e:
+        raise ProtocolError(str(e))
+
+def decode_header(header):
+    """Valida una cabecera y retorna (tipo, flags, request_id, longitud)"""
+    version, frame_type, flags, request_id, length = HEADER.unpack(header)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Versión de protocolo no soportada: {version}")
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame demasiado grande: {length} bytes")
+    return frame_type, flags, request_id, length
+
+class FramedSocket:
+    """Envuelve un socket (plano o TLS) y lee/escribe frames completos
+    
+    Del lado servidor, `idle_timeout` limita la espera de un frame nuevo y
+    `read_timeout` la de un frame que llegó a medias; al vencer, recv lanza
+    ConnectionTimeout. Sin ellos se respeta el timeout propio del socket.
+    """
+    
+    def __init__(self, sock, idle_timeout=None, read_timeout=None):
+        self.sock = sock
+        self.request_id = 0  # id del último frame recibido
+        self.codec = None    # Compresión de salida (tras negociar con HELLO)
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self._timeout = sock.gettimeout()
+        self._next_id = 0
+        self._buffer = bytearray()
+    
+    def next_request_id(self):
+        """Genera el siguiente request_id (lado cliente)"""
+        self._next_id = (self._next_id % 0xFFFFFFFF) + 1
+        return self._next_id
+    
+    def send(self, frame_type, payload=b"", request_id=None, flags=0):
+        """Envía un frame; por defecto responde al último request_id recibido"""
+        if request_id is None:
+            request_id = self.request_id
+        payload, compressed = encode_payload(payload, self.codec)
+        self._sendall(encode_frame(frame_type, payload, request_id, flags | compressed))
+        return request_id
+    
+    def send_many(self, frames):
+        """Envía varios frames (tipo, payload, request_id) en un solo sendall"""
+        data = []
+        for frame_type, payload, request_id in frames:
+            payload, compressed = encode_payload(payload, self.codec)
+            data.append(encode_frame(frame_type, payload, request_id, compressed))
+        self._sendall(b"".join(data))
+    
+    def _sendall(self, data):
+        with metrics.timer("send"):
+            self.sock.sendall(data)
+        metrics.inc("bytes_out", len(data))
+    
+    def recv(self):
+        """Retorna el siguiente frame completo o None si la conexión se cerró"""
+        # La espera hasta que el cliente envía algo no cuenta como latencia de recv
+        started = time.perf_counter() if self._buffer else None
+        while True:
+            frame = self._pop_frame()
+            if frame:
+                self.request_id = frame.request_id
+                metrics.observe("recv", time.perf_counter() - started)
+                return frame
+            
+            data = self._recv_timed() if self.idle_timeout or self.read_timeout else self.sock.recv(RECV_SIZE)
+            if started is None:
+                started = time.perf_counter()
+            if not data:
+                if self._buffer:
+                    raise ProtocolError("Conexión cerrada a mitad de un frame")
+                return None
+            metrics.inc("bytes_in", len(data))
+            self._buffer += data
+    
+    def _recv_timed(self):
+        """recv con el timeout que corresponde: idle entre frames, read a mitad de uno"""
+        partial = bool(self._buffer)
+        timeout = (self.read_timeout if partial else self.idle_timeout) or None
+        if timeout != self._timeout:
+            self.sock.settimeout(timeout)
+            self._timeout = timeout
+        try:
+            return self.sock.recv(RECV_SIZE)
+        except socket.timeout:
+            raise ConnectionTimeout("read" if partial else "idle", timeout) from None
+    
+    def _pop_frame(self):
+        if len(self._buffer) < HEADER.size:
+            return None
+        
+        frame_type, flags, request_id, length = decode_header(self._buffer[:HEADER.size])
+        end = HEADER.size + length
+        if len(self._buffer) < end:
+            return None
+        
+        payload = bytes(self._buffer[HEADER.size:end])
+        del self._buffer[:end]
+        return Frame(frame_type, flags, request_id, decode_payload(payload, flags, self.codec))
+    
+    def abort(self):
+        """Corta la conexión desde otro hilo (el recv bloqueado retorna None)"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def close(self):
+        self.sock.close()
+
+class AsyncFramedStream:
+    """Equivalente asyncio de FramedSocket sobre StreamReader/StreamWriter"""
+    
+    def __init__(self, reader, writer, idle_timeout=None, read_timeout=None):
+        self.reader = reader
+        self.writer = writer
+        self.request_id = 0
+        self.codec = None
+        self.idle_timeout = idle_timeout
+        self.read_timeout = read_timeout
+        self._loop = asyncio.get_running_loop()
+        self._next_id = 0
+    
+    def next_request_id(self):
+        """Genera el siguiente request_id (lado cliente)"""
+        self._next_id = (self._next_id % 0xFFFFFFFF) + 1
+        return self._next_id
+    
+    def write(self, frame_type, payload=b"", request_id=None, flags=0):
+        """Encola un frame en el buffer de escritura sin esperar (thread del loop)"""
+        if request_id is None:
+            request_id = self.request_id
+        payload, compressed = encode_payload(payload, self.codec)
+        data = encode_frame(frame_type, payload, request_id, flags | compressed)
+        self.writer.write(data)
+        metrics.inc("bytes_out", len(data))
+        return request_id
+    
+    async def send(self, frame_type, payload=b"", request_id=None, flags=0):
+        """Envía un frame respetando el control de flujo del transporte"""
+        started = time.perf_counter()
+        request_id = self.write(frame_type, payload, request_id, flags)
+        await self.writer.drain()
+        metrics.observe("send", time.perf_counter() - started)
+        return request_id
+    
+    async def recv(self):
+        """Retorna el siguiente frame completo o None si la conexión se cerró"""
+        try:
+            # Entre frames rige idle_timeout; desde el primer byte, read_timeout
+            first = await self._read(1, self.idle_timeout, "idle")
+        except asyncio.IncompleteReadError:
+            return None
+        try:
+            header = first + await self._read(HEADER.size - 1, self.read_timeout, "read")
+        except asyncio.IncompleteReadError:
+            raise ProtocolError("Conexión cerrada a mitad de un frame")
+        
+        started = time.perf_counter()
+        frame_type, flags, request_id, length = decode_header(header)
+        try:
+            payload = await self._read(length, self.read_timeout, "read") if length else b""
+        except asyncio.IncompleteReadError:
+            raise ProtocolError("Conexión cerrada a mitad de un frame")
+        
+        metrics.inc("bytes_in", HEADER.size + length)
+        metrics.observe("recv", time.perf_counter() - started)
+        self.request_id = request_id
+        return Frame(frame_type, flags, request_id, decode_payload(payload, flags, self.codec))
+    
+    async def _read(self, size, timeout, kind):
+        if not timeout:
+            return await self.reader.readexactly(size)
+        try:
+            return await asyncio.wait_for(self.reader.readexactly(size), timeout)
+        except asyncio.TimeoutError:
+            raise ConnectionTimeout(kind, timeout) from None
+    
+    def abort(self):
+        """Corta la conexión sin esperar (se puede llamar desde cualquier hilo)"""
+        self._loop.call_soon_threadsafe(self.writer.transport.abort)
+    
+    async def close(self):
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
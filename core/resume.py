@@ -0,0 +1,91 @@
+# core/resume.py
+"""
+Identidad de sesión y reanudación tras una reconexión
+
+Cada conexión recibe un ID de sesión aleatorio y, en el WELCOME, un token de
+reanudación firmado con HMAC (`<id>.<vence>.<firma>`). Un cliente que se
+reconecta envía `RESUME <token>` y recupera su sesión:
+    
+    - en caliente: si su ChatSession sigue en memoria (quedó "estacionada"
+      durante SESSION_GRACE segundos tras la desconexión), se reusa tal cual,
+      con el chat vivo y sin consultar la base
+    - en frío: pasada la gracia (o en otro worker), el ID se conserva y el
+      contexto se arma desde el último resumen guardado, como siempre
+
+Al vencer la gracia, la sesión estacionada se resume y sale de la RAM. Los
+workers prefork comparten SESSION_SECRET (el supervisor lo genera si no está
+configurado); sin un secreto fijo, los tokens no sobreviven a un reinicio.
+"""
+import os
+import hmac
+import time
+import hashlib
+import secrets
+import threading
+
+SESSION_SECRET = os.getenv("SESSION_SECRET") or secrets.token_hex(32)
+SESSION_GRACE = float(os.getenv("SESSION_GRACE", 300))                # segundos en memoria tras desconectarse
+SESSION_TOKEN_TTL = float(os.getenv("SESSION_TOKEN_TTL", 7 * 86400))  # validez del token (reanudación en frío)
+TOKEN_PREFIX = "TOKEN:"
+
+# Los workers (spawn) heredan el entorno: todos firman con el mismo secreto
+os.environ.setdefault("SESSION_SECRET", SESSION_SECRET)
+
+def _sign(session_id, expires):
+    message = f"{session_id}.{expires}".encode()
+    return hmac.new(SESSION_SECRET.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+def issue_token(session_id, ttl=SESSION_TOKEN_TTL):
+    expires = int(time.time() + ttl)
+    return f"{session_id}.{expires}.{_sign(session_id, expires)}"
+
+def verify_token(token):
+    """ID de sesión del token, o None si es inválido o venció"""
+    try:
+        session_id, expires, signature = token.strip().split(".")
+        expires = int(expires)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _sign(session_id, expires)):
+        return None
+    if expires < time.time():
+        return None
+    return session_id
+
+class SessionParking:
+    """Sesiones desconectadas que esperan una reanudación en caliente"""
+    
+    def __init__(self, grace=SESSION_GRACE):
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._parked = {}  # session_id -> (vence, datos del cliente)
+        self.stats = {"parked": 0, "resumed": 0, "expired": 0}
+    
+    def __len__(self):
+        return len(self._parked)
+    
+    def park(self, session_id, client):
+        with self._lock:
+            self._parked[session_id] = (time.monotonic() + self.grace, client)
+            self.stats["parked"] += 1
+    
+    def claim(self, session_id):
+        """Saca la sesión de la espera; retorna los datos guardados o None"""
+        with self._lock:
+            entry = self._parked.pop(session_id, None)
+            if entry is not None:
+                self.stats["resumed"] += 1
+        return entry[1] if entry else None
+    
+    def expired(self, everything=False):
+        """Saca y retorna [(session_id, datos)] de las que vencieron (o todas)"""
+        now = time.monotonic()
+        with self._lock:
+            done = [sid for sid, (deadline, _) in self._parked.items() if everything or deadline <= now]
+            entries = [(sid, self._parked.pop(sid)[1]) for sid in done]
+            self.stats["expired"] += len(entries)
+        return entries
+    
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, waiting=len(self._parked))
@@ -0,0 +1,270 @@
+# core/scheduler.py
+"""
+Despacho central de las llamadas a Gemini
+
+Todas las llamadas (turnos de chat y resúmenes) pasan por aquí antes de
+salir hacia la API:
+    
+    - Límite de llamadas simultáneas (GEMINI_MAX_INFLIGHT)
+    - Token buckets por modelo: peticiones y tokens por minuto
+    - Cola justa entre clientes: round-robin por client_id, así un cliente
+      con muchas peticiones no deja sin turno a los demás
+    - Reintento con backoff exponencial y jitter ante errores 429
+
+La llamada se ejecuta en el hilo de quien la pide (el streaming sigue
+funcionando igual); el scheduler solo decide cuándo puede empezar.
+"""
+import os
+import time
+import random
+import threading
+from collections import OrderedDict, deque
+from core.log import get_logger
+from core.metrics import metrics
+
+GEMINI_MAX_INFLIGHT = int(os.getenv("GEMINI_MAX_INFLIGHT", 16))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", 0))  # Peticiones por minuto por modelo (0 = sin límite)
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", 0))  # Tokens de entrada por minuto por modelo (0 = sin límite)
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 3))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", 1.0))  # segundos
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", 30))
+STATUS_INTERVAL = float(os.getenv("SCHEDULER_STATUS_INTERVAL", 2))  # Cada cuánto se informa la posición en cola
+
+log = get_logger("IA")
+
+def parse_rate_limits(raw):
+    """Parsea 'modelo=rpm:tpm,modelo=rpm' en {modelo: (rpm, tpm)}"""
+    limits = {}
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        if not name.strip() or not value.strip():
+            continue
+        rpm, _, tpm = value.partition(":")
+        try:
+            limits[name.strip()] = (float(rpm or 0), float(tpm or 0))
+        except ValueError:
+            continue
+    return limits
+
+MODEL_RATE_LIMITS = parse_rate_limits(os.getenv("MODEL_RATE_LIMITS", ""))
+
+def is_rate_limit_error(error):
+    """429 / RESOURCE_EXHAUSTED de la API (o del backend de pruebas)"""
+    if getattr(error, "code", None) == 429:
+        return True
+    text = str(error)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text
+
+class TokenBucket:
+    """Bucket que se rellena de forma continua: `rate` unidades por minuto"""
+    
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+    
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount, now):
+        """Segundos hasta poder consumir `amount` (0 si ya se puede)"""
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        pause = max(0.0, self.paused_until - now)
+        # Una petición más grande que el bucket pasa cuando el bucket está lleno
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return pause
+        return max(pause, (amount - self.tokens) / self.rate)
+    
+    def consume(self, amount, now):
+        if self.rate:
+            self._refill(now)
+            self.tokens -= min(amount, self.capacity)
+    
+    def pause(self, seconds, now):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+class ModelLimits:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+    
+    def wait_time(self, tokens, now):
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+    
+    def consume(self, tokens, now):
+        self.requests.consume(1, now)
+        self.tokens.consume(tokens, now)
+    
+    def pause(self, seconds, now):
+        self.requests.pause(seconds, now)
+
+class Ticket:
+    """Petición esperando turno"""
+    __slots__ = ("client_id", "model", "tokens", "enqueued")
+    
+    def __init__(self, client_id, model, tokens):
+        self.client_id = client_id
+        self.model = model
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+
+class GeminiScheduler:
+    """Cola justa con límite de concurrencia y token buckets por modelo"""
+    
+    def __init__(self, max_inflight=GEMINI_MAX_INFLIGHT):
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self._queues = OrderedDict()  # client_id -> deque[Ticket]; el orden es el round-robin
+        self._limits = {}             # modelo -> ModelLimits
+        self._cond = threading.Condition()
+        self._stats = {"admitted": 0, "waited": 0, "retries": 0, "rate_limited": 0}
+    
+    def _model_limits(self, model):
+        limits = self._limits.get(model)
+        if limits is None:
+            rpm, tpm = MODEL_RATE_LIMITS.get(model, (GEMINI_RPM, GEMINI_TPM))
+            limits = self._limits[model] = ModelLimits(rpm, tpm)
+        return limits
+    
+    def _next_ticket(self, now):
+        """Primer cliente (en orden round-robin) cuya petición puede salir ya
+        
+        Retorna (ticket, espera): si ninguno puede salir, espera es el tiempo
+        mínimo hasta que algún bucket tenga capacidad.
+        """
+        min_wait = None
+        for queue in self._queues.values():
+            ticket = queue[0]
+            wait = self._model_limits(ticket.model).wait_time(ticket.tokens, now)
+            if wait <= 0:
+                return ticket, 0.0
+            min_wait = wait if min_wait is None else min(min_wait, wait)
+        return None, min_wait
+    
+    def _position(self, ticket):
+        """Posición aproximada: peticiones de otros clientes que salen antes"""
+        position = 1
+        for client_id, queue in self._queues.items():
+            if client_id == ticket.client_id:
+                position += queue.index(ticket) * len(self._queues)
+                break
+            position += 1
+        return position
+    
+    def queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+    
+    def acquire(self, client_id, model, tokens=1, on_status=None):
+        """Bloquea hasta que la petición tiene turno; retorna los segundos de espera"""
+        ticket = Ticket(client_id, model, tokens)
+        next_status = 0.0
+        waited = False
+        
+        with self._cond:
+            self._queues.setdefault(client_id, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = None
+                    if self.inflight < self.max_inflight:
+                        head, delay = self._next_ticket(now)
+                        if head is ticket:
+                            break
+                    
+                    if not waited:
+                        waited = True
+                        self._stats["waited"] += 1
+                    if on_status and now >= next_status:
+                        next_status = now + STATUS_INTERVAL
+                        message = (f"En cola: posición {self._position(ticket)} de {self.queued()} "
+                                   f"({self.inflight}/{self.max_inflight} llamadas en curso)")
+                        # El aviso escribe en el socket: no retener el lock mientras tanto
+                        self._cond.release()
+                        try:
+                            on_status(message)
+                        finally:
+                            self._cond.acquire()
+                        continue
+                    
+                    timeout = STATUS_INTERVAL if on_status else None
+                    if delay:
+                        timeout = min(delay, timeout) if timeout else delay
+                    self._cond.wait(timeout)
+                
+                # Admitida: sale de la cola y el cliente pasa al final de la ronda
+                queue = self._queues.pop(client_id)
+                queue.popleft()
+                if queue:
+                    self._queues[client_id] = queue
+                self._model_limits(model).consume(tokens, now)
+                self.inflight += 1
+                self._stats["admitted"] += 1
+            except BaseException:
+                queue = self._queues.get(client_id)
+                if queue and ticket in queue:
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[client_id]
+                self._cond.notify_all()
+                raise
+            
+            # Puede que otra petición (de otro modelo) también tenga turno
+            self._cond.notify_all()
+        
+        wait = time.monotonic() - ticket.enqueued
+        metrics.observe("queue", wait)
+        if waited and on_status:
+            on_status(f"Atendido tras {wait:.1f}s en cola")
+        return wait
+    
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+    
+    def backoff(self, model, attempt):
+        """Tras un 429: pausa el modelo para todos y retorna la espera con jitter"""
+        delay = min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * (2 ** attempt))
+        delay = random.uniform(delay / 2, delay)
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            self._model_limits(model).pause(delay, time.monotonic())
+        return delay
+    
+    def call(self, client_id, model, fn, tokens=1, on_status=None, retry=lambda: True):
+        """Ejecuta fn() con turno, reintentando ante 429 mientras retry() lo permita"""
+        attempt = 0
+        while True:
+            self.acquire(client_id, model, tokens, on_status)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= GEMINI_MAX_RETRIES or not retry():
+                    raise
+                delay = self.backoff(model, attempt)
+                attempt += 1
+                with self._cond:
+                    self._stats["retries"] += 1
+                metrics.inc("gemini_retries", model=model)
+                log.warning("Límite de la API alcanzado, reintentando", model=model, attempt=attempt, delay=f"{delay:.1f}s")
+                if on_status:
+                    on_status(f"Límite de la API alcanzado, reintento {attempt} en {delay:.1f}s")
+            finally:
+                self.release()
+            time.sleep(delay)
+    
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["inflight"] = self.inflight
+            stats["queued"] = self.queued()
+            stats["clients_waiting"] = len(self._queues)
+        return stats
+
+gemini_scheduler = GeminiScheduler()
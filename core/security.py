@@ -4,6 +4,30 @@ Manejo de seguridad y encriptación TLS
 """
 import ssl
 import os
+import time
+import threading
+from core.log import get_logger
+
+TLS_HANDSHAKE_TIMEOUT = float(os.getenv("TLS_HANDSHAKE_TIMEOUT", 10))
+TLS_SESSION_TICKETS = int(os.getenv("TLS_SESSION_TICKETS", 2))  # Tickets TLS 1.3 por handshake
+
+log = get_logger("SECURITY")
+
+# Contadores de handshakes (servidor)
+_tls_lock = threading.Lock()
+_tls_stats = {
+    "handshakes": 0,
+    "resumed": 0,
+    "failures": 0,
+    "timeouts": 0,
+    "handshake_ms_total": 0.0,
+    "handshake_ms_max": 0.0,
+}
+
+# Contexto y sesión del cliente, reutilizados entre conexiones
+_client_lock = threading.Lock()
+_client_context = None
+_client_session = None
 
 def create_ssl_context():
     """Crea contexto SSL para servidor seguro"""
@@ -11,26 +35,113 @@ def create_ssl_context():
     keyfile = os.getenv("SSL_KEYFILE", "server.key")
     
     if not os.path.exists(certfile) or not os.path.exists(keyfile):
-        print(f"[ERROR]: Certificados no encontrados: {certfile}, {keyfile}")
+        log.error("Certificados no encontrados", certfile=certfile, keyfile=keyfile)
         return None
     
     try:
         context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
         context.load_cert_chain(certfile=certfile, keyfile=keyfile)
-        print(f"[SECURITY]: Contexto TLS creado con {certfile}")
+        
+        # Reanudación de sesión: tickets habilitados (TLS 1.2 y 1.3)
+        context.options &= ~ssl.OP_NO_TICKET
+        context.num_tickets = TLS_SESSION_TICKETS
+        
+        log.info("Contexto TLS creado", certfile=certfile)
         return context
     except Exception as e:
-        print(f"[ERROR]: Fallo al crear contexto SSL: {e}")
+        log.error("Fallo al crear contexto SSL", error=e)
         return None
 
+def record_handshake(duration, resumed=False, error=None):
+    """Registra el resultado de un handshake de servidor"""
+    with _tls_lock:
+        if error is None:
+            ms = duration * 1000
+            _tls_stats["handshakes"] += 1
+            _tls_stats["handshake_ms_total"] += ms
+            _tls_stats["handshake_ms_max"] = max(_tls_stats["handshake_ms_max"], ms)
+            if resumed:
+                _tls_stats["resumed"] += 1
+        elif isinstance(error, TimeoutError):
+            _tls_stats["timeouts"] += 1
+        else:
+            _tls_stats["failures"] += 1
+
+def get_tls_stats():
+    """Latencia media de handshake y tasa de reanudación"""
+    with _tls_lock:
+        stats = dict(_tls_stats)
+    done = stats["handshakes"]
+    stats["handshake_ms_avg"] = stats["handshake_ms_total"] / done if done else 0.0
+    stats["resumption_rate"] = stats["resumed"] / done if done else 0.0
+    return stats
+
+def server_handshake(conn, ssl_context, timeout=TLS_HANDSHAKE_TIMEOUT):
+    """Hace el handshake TLS de una conexión aceptada (fuera del bucle de accept)"""
+    started = time.perf_counter()
+    try:
+        tls_conn = ssl_context.wrap_socket(conn, server_side=True, do_handshake_on_connect=False)
+        tls_conn.settimeout(timeout)
+        tls_conn.do_handshake()
+        tls_conn.settimeout(None)
+    except Exception as e:
+        record_handshake(time.perf_counter() - started, error=e)
+        raise
+    
+    record_handshake(time.perf_counter() - started, tls_conn.session_reused)
+    return tls_conn
+
+class TimedSSLObject(ssl.SSLObject):
+    """SSLObject que mide su handshake (lo usa el servidor asyncio)"""
+    
+    def do_handshake(self):
+        started = getattr(self, "_handshake_started", None)
+        if started is None:
+            started = self._handshake_started = time.perf_counter()
+        try:
+            super().do_handshake()
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            raise
+        except Exception as e:
+            record_handshake(time.perf_counter() - started, error=e)
+            raise
+        record_handshake(time.perf_counter() - started, self.session_reused)
+
+def instrument_async_context(ssl_context):
+    """Hace que los handshakes de asyncio se registren en los contadores"""
+    ssl_context.sslobject_class = TimedSSLObject
+    return ssl_context
+
+def get_client_context():
+    """Contexto TLS del cliente, creado una sola vez"""
+    global _client_context
+    # Con varios hilos conectando a la vez, una sesión de otro contexto no se puede reanudar
+    with _client_lock:
+        if _client_context is None:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            _client_context = context
+    return _client_context
+
 def wrap_client_socket(sock, server_hostname):
-    """Envuelve socket cliente con TLS"""
-    context = ssl.create_default_context()
-    context.check_hostname = False
-    context.verify_mode = ssl.CERT_NONE
+    """Envuelve socket cliente con TLS (reanuda la última sesión si existe)"""
+    context = get_client_context()
     
     try:
-        return context.wrap_socket(sock, server_hostname=server_hostname)
+        return context.wrap_socket(sock, server_hostname=server_hostname, session=_client_session)
     except Exception as e:
-        print(f"[ERROR]: Fallo al envolver socket cliente: {e}")
-        return sock
\ No newline at end of file
+        log.error("Fallo al envolver socket cliente", error=e)
+        return sock
+
+def save_client_session(sock):
+    """Guarda la sesión TLS para reanudarla en la próxima conexión
+    
+    Con TLS 1.3 el ticket llega después del handshake, así que conviene
+    llamarla después de la primera lectura.
+    """
+    global _client_session
+    session = getattr(sock, "session", None)
+    if session is not None:
+        _client_session = session
+    return getattr(sock, "session_reused", False)
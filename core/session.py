@@ -0,0 +1,239 @@
+# core/session.py
+"""
+Sesión IA por cliente con chat vivo de Gemini
+"""
+import os
+import sys
+import time
+from collections import deque
+from google.genai import types
+from helpers.response_cache import history_digest
+from database.sessions import spill_messages, load_spilled, clear_spilled
+from core.metrics import metrics
+
+# Presupuesto de tokens antes de compactar (global y por modelo)
+DEFAULT_TOKEN_BUDGET = int(os.getenv("TOKEN_BUDGET", 200000))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", 104857600))  # 100MB
+SESSION_RING_SIZE = int(os.getenv("SESSION_RING_SIZE", 1000))  # Mensajes en RAM; los más viejos pasan a SQLite
+
+# Ventana de contexto que se envía al modelo en cada turno
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 32000))      # Tope configurable (0 = solo el límite del modelo)
+CONTEXT_LIMIT_RATIO = float(os.getenv("CONTEXT_LIMIT_RATIO", 0.8))    # Fracción del límite de entrada del modelo
+CONTEXT_REFILL_RATIO = float(os.getenv("CONTEXT_REFILL_RATIO", 0.75)) # Al rearmar, se llena hasta esta fracción
+
+# Roles internados: miles de mensajes comparten el mismo objeto str
+ROLE_USER = sys.intern("user")
+ROLE_MODEL = sys.intern("model")
+CONTEXT_PREFIX = "[CONTEXTO ANTERIOR]: "
+
+def parse_model_budgets(raw):
+    """Parsea 'modelo=tokens,modelo=tokens' en un diccionario"""
+    budgets = {}
+    for item in raw.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+MODEL_TOKEN_BUDGETS = parse_model_budgets(os.getenv("MODEL_TOKEN_BUDGETS", ""))
+
+def get_token_budget(model):
+    """Presupuesto de tokens de la sesión para un modelo"""
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+def estimate_tokens(text):
+    """Estimación rápida de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1
+
+def get_context_budget(input_token_limit):
+    """Tokens de historial que se envían por turno para un modelo"""
+    budget = int(input_token_limit * CONTEXT_LIMIT_RATIO)
+    return min(budget, CONTEXT_MAX_TOKENS) if CONTEXT_MAX_TOKENS else budget
+
+class Message:
+    """Mensaje del historial (sin __dict__: ~3 veces menos RAM que un dict)"""
+    __slots__ = ("role", "content", "timestamp", "tokens")
+    
+    def __init__(self, role, content, timestamp=None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.timestamp = timestamp or time.time()  # epoch en segundos (float)
+        self.tokens = estimate_tokens(content)      # Se calcula una vez por mensaje
+    
+    def __repr__(self):
+        return f"Message({self.role!r}, {self.content[:30]!r})"
+
+class ChatSession:
+    """Historial de un cliente y el chat de Gemini que lo acompaña
+    
+    El chat se crea una sola vez y el SDK le agrega cada turno, por lo que
+    un turno nuevo no reconstruye el historial. Solo se vuelve a crear al
+    cambiar de modelo, cuando el historial se modifica fuera del chat
+    (contexto previo, compactación) o cuando supera el presupuesto de
+    contexto del modelo: entonces se arma una ventana con el resumen previo
+    fijo y los turnos más recientes que entran (ver context_window).
+    
+    Los contadores de bytes y tokens (y el hash del historial que usa el
+    cache de respuestas) se actualizan al agregar mensajes, así que decidir
+    si hay que compactar es O(1) sin importar el largo.
+    
+    Los mensajes viven en un buffer circular de SESSION_RING_SIZE registros;
+    al llenarse, el más viejo se guarda en la tabla session_spill y sale de
+    la RAM (el chat vivo ve solo la ventana en memoria). drain() los vuelve
+    a juntar para el resumen. El resumen previo se guarda aparte (fijo al
+    inicio del historial) y no se duplica al reactivar IA.
+    """
+    
+    def __init__(self, client_id, ring_size=SESSION_RING_SIZE):
+        self.client_id = client_id
+        self.messages = deque(maxlen=ring_size)
+        self.context = None  # Message con el resumen previo (o None)
+        self.spilled = 0
+        self.chat = None
+        self.model = None
+        self.chat_tokens = 0  # Tokens del historial que tiene el chat vivo
+        self.chat_since = None  # epoch del mensaje más viejo del chat vivo (sin contar el contexto)
+        self.bytes_used = 0
+        self.tokens_used = 0
+        self.digest = ""
+    
+    def __len__(self):
+        return len(self.messages) + self.spilled + (1 if self.context else 0)
+    
+    def get_chat(self, gemini_client, model, budget):
+        """Retorna el chat vivo, creándolo solo si hace falta
+        
+        `budget` son los tokens de historial permitidos para el modelo
+        (get_context_budget). Si el chat vivo los superó, se rearma con una
+        ventana más chica para no hacerlo en cada turno.
+        """
+        if self.chat is not None and self.model == model and self.chat_tokens <= budget:
+            return self.chat
+        
+        if self.chat is not None and self.model == model:
+            metrics.inc("context_rebuilds")
+            budget = int(budget * CONTEXT_REFILL_RATIO)
+        window = self.context_window(budget)
+        history = [types.Content(role=msg.role, parts=[types.Part(text=msg.content)]) for msg in window]
+        self.chat = gemini_client.chats.create(model=f"models/{model}", history=history)
+        self.model = model
+        self.chat_tokens = sum(msg.tokens for msg in window)
+        first = next((msg for msg in window if msg is not self.context), None)
+        self.chat_since = first.timestamp if first else time.time()
+        return self.chat
+    
+    def context_window(self, budget):
+        """Resumen previo fijo + los turnos más nuevos que entran en `budget` tokens
+        
+        Recorre desde el final y se detiene al llenarse: el costo depende del
+        tamaño de la ventana, no del historial. Los turnos se toman completos
+        (pregunta y respuesta) para no cortar un intercambio a la mitad.
+        """
+        window = []
+        used = self.context.tokens if self.context else 0
+        pending = []
+        for message in reversed(self.messages):
+            pending.append(message)
+            if message.role != ROLE_USER:
+                continue
+            # Turno completo (user + respuestas): entra entero o se corta aquí
+            cost = sum(msg.tokens for msg in pending)
+            if used + cost > budget:
+                break
+            used += cost
+            window.extend(pending)
+            pending = []
+        window.reverse()
+        if self.context:
+            window.insert(0, self.context)
+        return window
+    
+    def window(self):
+        """Mensajes en memoria, con el contexto fijo primero"""
+        if self.context:
+            yield self.context
+        yield from self.messages
+    
+    def add_context(self, summary):
+        """Fija el resumen previo como contexto (si cambió, fuerza recrear el chat)"""
+        content = f"{CONTEXT_PREFIX}{summary}"
+        if self.context and self.context.content == content:
+            return
+        if self.context:
+            self._count(self.context, -1)
+        self.context = Message(ROLE_USER, content)
+        self._count(self.context, 1)
+        self._rehash()
+        self.chat = None
+    
+    def add_turn(self, request, reply, prompt=None):
+        """Registra un turno que el chat vivo ya incorporó a su historial
+        
+        `prompt` es lo que recibió el chat si difiere de `request` (con los
+        fragmentos recuperados): el historial guarda la pregunta y el chat
+        cuenta los tokens que realmente se le enviaron.
+        """
+        timestamp = time.time()
+        request_message = Message(ROLE_USER, request, timestamp)
+        reply_message = Message(ROLE_MODEL, reply, timestamp)
+        self._append(request_message)
+        self._append(reply_message)
+        sent_tokens = request_message.tokens if prompt is None else estimate_tokens(prompt)
+        self.chat_tokens += sent_tokens + reply_message.tokens
+    
+    def add_cached_turn(self, request, reply):
+        """Registra un turno respondido desde el cache (el chat vivo no lo vio)"""
+        self.add_turn(request, reply)
+        self.chat = None
+    
+    def _append(self, message):
+        if len(self.messages) == self.messages.maxlen:
+            # El buffer está lleno: el más viejo pasa a SQLite
+            spill_messages(self.client_id, [self.messages.popleft()])
+            self.spilled += 1
+        self.messages.append(message)
+        self._count(message, 1)
+        self.digest = history_digest(self.digest, message.role, message.content)
+    
+    def _count(self, message, sign):
+        self.bytes_used += sign * len(message.content.encode())
+        self.tokens_used += sign * message.tokens
+    
+    def _rehash(self):
+        """Recalcula el hash del historial (solo si cambia el contexto con mensajes)"""
+        self.digest = ""
+        if self.spilled:
+            # Sin los mensajes volcados no se puede reproducir la cadena: clave nueva
+            self.digest = history_digest("", "spilled", f"{self.client_id}:{time.time()}")
+        for message in self.window():
+            self.digest = history_digest(self.digest, message.role, message.content)
+    
+    def needs_compaction(self, model):
+        """True si la sesión superó el presupuesto de tokens o bytes (O(1))"""
+        return self.tokens_used > get_token_budget(model) or self.bytes_used > SESSION_MAX_BYTES
+    
+    def drain(self):
+        """Retorna los mensajes de la conversación (volcados y ventana) y vacía la sesión
+        
+        El contexto no se incluye: ya es el último resumen guardado y el
+        resumen incremental parte de él.
+        """
+        messages = list(self.messages)
+        if self.spilled:
+            spilled = [Message(role, content, timestamp) for role, content, timestamp in load_spilled(self.client_id)]
+            messages[0:0] = spilled
+        self.reset()
+        return messages
+    
+    def reset(self):
+        """Vacía el historial y descarta el chat (cambio de modelo, compactación)"""
+        if self.spilled:
+            clear_spilled(self.client_id)
+        self.messages.clear()
+        self.context = None
+        self.spilled = 0
+        self.chat = None
+        self.chat_tokens = 0
+        self.bytes_used = 0
+        self.tokens_used = 0
+        self.digest = ""
@@ -0,0 +1,159 @@
+# core/supervisor.py
+"""
+Supervisor del modo prefork (SERVER_WORKERS > 1)
+
+Arranca N procesos worker que escuchan en el mismo puerto con SO_REUSEPORT;
+el kernel reparte las conexiones entre ellos, así el cifrado TLS y el armado
+de historiales usan todos los núcleos en lugar de competir por un solo GIL.
+    
+    - Un worker que muere se vuelve a arrancar (con backoff si falla seguido)
+    - SIGHUP: recarga gradual, worker por worker (el nuevo escucha antes de
+      detener el viejo, sin dejar el puerto sin atender)
+    - SIGTERM / SIGINT: detiene todos los workers a la vez y espera a que
+      drenen sus conexiones y guarden los resúmenes
+"""
+import os
+import time
+import signal
+import multiprocessing
+from multiprocessing.connection import wait
+from core.log import get_logger
+from core.connections import DRAIN_TIMEOUT, SHUTDOWN_TIMEOUT
+
+WORKER_READY_TIMEOUT = float(os.getenv("WORKER_READY_TIMEOUT", 30))
+# El worker drena (DRAIN_TIMEOUT) y después espera resúmenes y escrituras
+# (SHUTDOWN_TIMEOUT cada uno); el margen cubre expirar las sesiones en espera
+WORKER_STOP_MARGIN = 15
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", DRAIN_TIMEOUT + 2 * SHUTDOWN_TIMEOUT + WORKER_STOP_MARGIN))
+RESTART_BACKOFF_MAX = 30  # segundos
+STABLE_AFTER = 60         # Un worker que vivió esto se considera estable (reinicia el backoff)
+
+log = get_logger("SYSTEM")
+
+class WorkerSlot:
+    """Un puesto de worker: el proceso actual y su historial de reinicios"""
+    
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.ready = None  # Se conserva: el hijo lo deserializa después de arrancar
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at = 0.0
+
+class Supervisor:
+    """Arranca, vigila y recarga los procesos worker
+    
+    `target(index, ready)` es la función del worker: debe ser importable
+    (los workers se crean con `spawn`) y llamar a ready.set() cuando ya
+    está escuchando. `on_exit(pid)` se llama al terminar cada worker.
+    """
+    
+    def __init__(self, target, workers, on_exit=None):
+        self.target = target
+        self.slots = [WorkerSlot(i) for i in range(workers)]
+        self.on_exit = on_exit
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = False
+        self._reload = False
+    
+    def _spawn(self, slot):
+        ready = self._context.Event()
+        process = self._context.Process(target=self.target, args=(slot.index, ready), name=f"worker-{slot.index}")
+        process.start()
+        slot.process = process
+        slot.ready = ready
+        slot.started_at = time.monotonic()
+        log.info("Worker iniciado", worker=slot.index, pid=process.pid)
+        return ready
+    
+    def _stop_process(self, process, timeout=WORKER_STOP_TIMEOUT, terminate=True):
+        """SIGTERM y espera; SIGKILL si no terminó a tiempo"""
+        if process.is_alive():
+            if terminate:
+                process.terminate()
+            process.join(timeout)
+        if process.is_alive():
+            log.warning("Worker no terminó a tiempo, forzando", pid=process.pid)
+            process.kill()
+            process.join()
+        if self.on_exit:
+            self.on_exit(process.pid)
+    
+    def _handle_stop(self, signum, frame):
+        self._stopping = True
+    
+    def _handle_reload(self, signum, frame):
+        self._reload = True
+    
+    def reload(self):
+        """Reemplaza los workers uno por uno sin dejar de atender el puerto"""
+        log.info("Recargando workers")
+        for slot in self.slots:
+            if self._stopping:
+                return
+            old = slot.process
+            ready = self._spawn(slot)
+            if not ready.wait(WORKER_READY_TIMEOUT):
+                log.error("El nuevo worker no quedó listo; se conserva el anterior", worker=slot.index)
+                self._stop_process(slot.process, timeout=0)
+                slot.process = old
+                continue
+            if old is not None:
+                self._stop_process(old)
+            slot.failures = 0
+    
+    def run(self):
+        """Bucle del supervisor; retorna cuando se pide detener el servidor"""
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_reload)
+        
+        for slot in self.slots:
+            self._spawn(slot)
+        
+        try:
+            while not self._stopping:
+                if self._reload:
+                    self._reload = False
+                    self.reload()
+                    continue
+                
+                # Despierta cuando termina un worker (o cada segundo para revisar señales)
+                sentinels = [slot.process.sentinel for slot in self.slots if slot.process is not None]
+                wait(sentinels, timeout=1.0)
+                self._check_workers()
+        finally:
+            log.info("Deteniendo workers", workers=len(self.slots))
+            # Todos reciben SIGTERM juntos y drenan en paralelo
+            processes = [slot.process for slot in self.slots if slot.process is not None]
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                self._stop_process(process, terminate=False)
+    
+    def _check_workers(self):
+        now = time.monotonic()
+        for slot in self.slots:
+            process = slot.process
+            if process is not None and not process.is_alive():
+                process.join()
+                log.error("Worker terminó inesperadamente", worker=slot.index, pid=process.pid, exitcode=process.exitcode)
+                if self.on_exit:
+                    self.on_exit(process.pid)
+                
+                # Backoff exponencial si se cae apenas arranca
+                if now - slot.started_at < STABLE_AFTER:
+                    slot.failures += 1
+                else:
+                    slot.failures = 0
+                delay = min(RESTART_BACKOFF_MAX, 2 ** slot.failures - 1) if slot.failures else 0
+                slot.restart_at = now + delay
+                slot.process = None
+                if delay:
+                    log.warning("Reiniciando worker con espera", worker=slot.index, delay=f"{delay}s")
+            
+            if slot.process is None and now >= slot.restart_at and not self._stopping:
+                self._spawn(slot)
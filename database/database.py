@@ -1,25 +1,161 @@
 import sqlite3
 import os
+import time
+import queue
+import threading
 from dotenv import load_dotenv
+from database.migrations import migrate
 
 load_dotenv()
 
+# Pool y PRAGMAs de conexión
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 8))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", 128))  # Sentencias preparadas por conexión
+DB_PRAGMAS = {
+    "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL").upper(),
+    "cache_size": int(os.getenv("DB_CACHE_SIZE", -16000)),    # Negativo = KiB (16MB)
+    "mmap_size": int(os.getenv("DB_MMAP_SIZE", 268435456)),   # 256MB
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT", 5000)),  # ms
+    "temp_store": "MEMORY",
+}
+
+def open_connection():
+    """Abre una conexión nueva con los PRAGMAs configurados"""
+    conn = sqlite3.connect(
+        os.getenv("DB_PATH", "ai_bridge.db"),
+        check_same_thread=False,
+        cached_statements=DB_STATEMENT_CACHE
+    )
+    for name, value in DB_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+class ConnectionPool:
+    """Pool acotado de conexiones SQLite reutilizables
+    
+    Cada hilo (o tarea en el executor) toma una conexión mientras dura su
+    bloque `with`; un `with` anidado en el mismo hilo reutiliza la misma.
+    Al reutilizar conexiones también se reutiliza su caché de sentencias
+    preparadas.
+    """
+    
+    def __init__(self, size=DB_POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {
+            "opens": 0,
+            "checkouts": 0,
+            "reuses": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "held_time_ms": 0.0,
+            "in_use": 0,
+        }
+    
+    def acquire(self):
+        local = self._local
+        if getattr(local, "conn", None) is not None:
+            local.depth += 1
+            return local.conn
+        
+        if not self._slots.acquire(blocking=False):
+            started = time.perf_counter()
+            self._slots.acquire()
+            with self._lock:
+                self._stats["waits"] += 1
+                self._stats["wait_time_ms"] += (time.perf_counter() - started) * 1000
+        
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            try:
+                conn = open_connection()
+            except Exception:
+                self._slots.release()
+                raise
+            reused = False
+        
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["reuses" if reused else "opens"] += 1
+        
+        local.conn = conn
+        local.depth = 1
+        local.since = time.perf_counter()
+        return conn
+    
+    def release(self):
+        local = self._local
+        local.depth -= 1
+        if local.depth > 0:
+            return
+        
+        conn = local.conn
+        local.conn = None
+        with self._lock:
+            self._stats["in_use"] -= 1
+            self._stats["held_time_ms"] += (time.perf_counter() - local.since) * 1000
+        
+        self._idle.put(conn)
+        self._slots.release()
+    
+    def depth(self):
+        """Bloques `with` anidados que tienen prestada la conexión de este hilo"""
+        return getattr(self._local, "depth", 0) if getattr(self._local, "conn", None) is not None else 0
+    
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["idle"] = self._idle.qsize()
+        stats["size"] = self.size
+        return stats
+
+class PooledConnection:
+    """Préstamo de una conexión del pool para un bloque `with`
+    
+    Igual que sqlite3.Connection como context manager: confirma al salir sin
+    errores y revierte si hubo una excepción; además devuelve la conexión.
+    Con bloques anidados en el mismo hilo solo el más externo confirma o
+    revierte: los internos son parte de su transacción.
+    """
+    
+    def __init__(self, pool):
+        self._pool = pool
+        self._conn = None
+    
+    def __enter__(self):
+        self._conn = self._pool.acquire()
+        return self._conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._pool.depth() == 1:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self._conn = None
+            self._pool.release()
+        return False
+
+pool = ConnectionPool()
+
 def get_connection():
-    return sqlite3.connect(os.getenv("DB_PATH", "ai_bridge.db"))
+    return PooledConnection(pool)
+
+def get_pool_stats():
+    """Contadores del pool (aperturas, esperas, tiempo retenido)"""
+    return pool.stats()
 
 def init():
     with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-                CREATE TABLE IF NOT EXISTS messages(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id TEXT, role TEXT, content TEXT, timestamp DATETIME)
-            """
-        )
-        cursor.execute(
-            """
-                CREATE TABLE IF NOT EXISTS summaries(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id TEXT, summary_text TEXT, created_at DATETIME)
-            """
-        )
-        conn.commit()
+        migrate(conn)
 
 init()
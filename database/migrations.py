@@ -0,0 +1,94 @@
+# database/migrations.py
+"""
+Migraciones de esquema versionadas con PRAGMA user_version
+"""
+from core.log import get_logger
+
+log = get_logger("DB")
+
+# (versión, descripción, sentencias)
+MIGRATIONS = [
+    (1, "Tablas base", [
+        "CREATE TABLE IF NOT EXISTS messages(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id TEXT, role TEXT, content TEXT, timestamp DATETIME)",
+        "CREATE TABLE IF NOT EXISTS summaries(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id TEXT, summary_text TEXT, created_at DATETIME)",
+    ]),
+    (2, "Índices por cliente y fecha", [
+        "CREATE INDEX IF NOT EXISTS idx_messages_client_ts ON messages(client_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_summaries_client_created ON summaries(client_id, created_at)",
+    ]),
+    (3, "Archivo de mensajes para la retención", [
+        "CREATE TABLE IF NOT EXISTS messages_archive(id INTEGER PRIMARY KEY, client_id TEXT, role TEXT, content TEXT, timestamp DATETIME, archived_at DATETIME)",
+    ]),
+    (4, "Cache de respuestas IA", [
+        "CREATE TABLE IF NOT EXISTS response_cache(key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL, expires_at REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache(expires_at)",
+    ]),
+    (5, "Registro de sesiones compartido entre workers", [
+        "CREATE TABLE IF NOT EXISTS sessions(client_id TEXT PRIMARY KEY, worker_pid INTEGER, ip TEXT, port INTEGER, connected_at DATETIME, selected_model TEXT, summary_pid INTEGER)",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_summary_pid ON sessions(summary_pid)",
+    ]),
+    (6, "Mensajes volcados del buffer de sesión", [
+        "CREATE TABLE IF NOT EXISTS session_spill(id INTEGER PRIMARY KEY AUTOINCREMENT, client_id TEXT, role TEXT, content TEXT, timestamp REAL)",
+        "CREATE INDEX IF NOT EXISTS idx_session_spill_client ON session_spill(client_id, id)",
+    ]),
+    (7, "Linaje de resúmenes incrementales", [
+        "ALTER TABLE summaries ADD COLUMN parent_id INTEGER",
+        "ALTER TABLE summaries ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE summaries ADD COLUMN covered_until REAL",
+        "ALTER TABLE summaries ADD COLUMN chunks INTEGER NOT NULL DEFAULT 1",
+    ]),
+    (8, "Índice de texto completo (FTS5) de mensajes y resúmenes", [
+        # Tablas de contenido externo: el texto vive en messages/summaries, el índice solo guarda tokens.
+        # client_id se indexa para filtrar por cliente dentro del MATCH
+        "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, client_id, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(summary_text, client_id, content='summaries', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+        "INSERT INTO messages_fts(rowid, content, client_id) VALUES (new.id, new.content, new.client_id); END",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content, client_id) VALUES ('delete', old.id, old.content, old.client_id); END",
+        "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content, client_id ON messages BEGIN "
+        "INSERT INTO messages_fts(messages_fts, rowid, content, client_id) VALUES ('delete', old.id, old.content, old.client_id); "
+        "INSERT INTO messages_fts(rowid, content, client_id) VALUES (new.id, new.content, new.client_id); END",
+        "CREATE TRIGGER IF NOT EXISTS summaries_fts_insert AFTER INSERT ON summaries BEGIN "
+        "INSERT INTO summaries_fts(rowid, summary_text, client_id) VALUES (new.id, new.summary_text, new.client_id); END",
+        "CREATE TRIGGER IF NOT EXISTS summaries_fts_delete AFTER DELETE ON summaries BEGIN "
+        "INSERT INTO summaries_fts(summaries_fts, rowid, summary_text, client_id) VALUES ('delete', old.id, old.summary_text, old.client_id); END",
+        "CREATE TRIGGER IF NOT EXISTS summaries_fts_update AFTER UPDATE OF summary_text, client_id ON summaries BEGIN "
+        "INSERT INTO summaries_fts(summaries_fts, rowid, summary_text, client_id) VALUES ('delete', old.id, old.summary_text, old.client_id); "
+        "INSERT INTO summaries_fts(rowid, summary_text, client_id) VALUES (new.id, new.summary_text, new.client_id); END",
+        # Backfill de las bases existentes
+        "INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')",
+        "INSERT INTO summaries_fts(summaries_fts) VALUES ('rebuild')",
+    ]),
+    (9, "Desconexión de sesiones (purga del registro)", [
+        "ALTER TABLE sessions ADD COLUMN disconnected_at DATETIME",
+        "CREATE INDEX IF NOT EXISTS idx_sessions_disconnected ON sessions(disconnected_at)",
+    ]),
+]
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Aplica en orden las migraciones pendientes; retorna la versión final"""
+    current = get_version(conn)
+    
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA no admite parámetros; la versión es un entero propio
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        log.info("Migración aplicada", version=version, description=description)
+        current = version
+    
+    return current
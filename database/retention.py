@@ -0,0 +1,181 @@
+# database/retention.py
+"""
+Retención incremental de la tabla messages
+
+Mueve (o borra) en lotes pequeños los mensajes más antiguos que el período
+de retención. Los lotes se recorren por rowid, que crece con el tiempo, así
+que cada pasada solo toca la cola vieja de la tabla y nunca la re-escanea.
+
+La misma pasada purga el registro de sesiones: una fila desconectada hace
+más de SESSION_TOKEN_TTL ya no se puede reanudar y no tiene resumen en curso.
+Purgada la fila, el historial de ese ID (mensajes y resúmenes) tampoco es
+alcanzable: se archiva o se borra según RETENTION_MODE. Así también salen
+las filas de los IDs derivados de la IP de versiones anteriores, que ningún
+token puede reanudar.
+"""
+import os
+import time
+import datetime
+import threading
+from database.database import get_connection
+from database.writer import db_writer, DURABILITY_COMMIT
+from core.log import get_logger
+from core.resume import SESSION_TOKEN_TTL, SESSION_GRACE
+
+MESSAGES_RETENTION_DAYS = int(os.getenv("MESSAGES_RETENTION_DAYS", 0))  # 0 = sin límite
+RETENTION_MODE = os.getenv("RETENTION_MODE", "archive").lower()  # archive | delete
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", 1000))
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", 3600))  # segundos
+SPILL_MARGIN = 60  # segundos tras SESSION_GRACE: las sesiones en espera vencidas ya se resumieron
+
+log = get_logger("DB")
+
+def _batch_upper_id(cutoff, batch_size):
+    """Mayor id del siguiente lote de mensajes vencidos (None si no hay)"""
+    with get_connection() as conn:
+        row = conn.execute(
+            "SELECT MAX(id) FROM (SELECT id FROM messages WHERE timestamp < ? ORDER BY id LIMIT ?)",
+            (cutoff, batch_size)
+        ).fetchone()
+    return row[0] if row else None
+
+def run_retention_pass(days=MESSAGES_RETENTION_DAYS, mode=RETENTION_MODE, batch_size=RETENTION_BATCH):
+    """Procesa todos los mensajes vencidos en lotes; retorna cuántos movió"""
+    if days <= 0:
+        return 0
+    
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    total = 0
+    
+    while True:
+        upper_id = _batch_upper_id(cutoff, batch_size)
+        if upper_id is None:
+            break
+        
+        with get_connection() as conn:
+            count = conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE id <= ? AND timestamp < ?", (upper_id, cutoff)
+            ).fetchone()[0]
+        
+        if mode == "archive":
+            # INSERT OR IGNORE: repetir un lote interrumpido es inofensivo
+            db_writer.submit(
+                "INSERT OR IGNORE INTO messages_archive (id, client_id, role, content, timestamp, archived_at) "
+                "SELECT id, client_id, role, content, timestamp, ? FROM messages WHERE id <= ? AND timestamp < ?",
+                (datetime.datetime.now(), upper_id, cutoff)
+            )
+        db_writer.submit(
+            "DELETE FROM messages WHERE id <= ? AND timestamp < ?",
+            (upper_id, cutoff),
+            DURABILITY_COMMIT
+        )
+        total += count
+    
+    if total:
+        log.info("Retención aplicada", messages=total, mode=mode)
+    return total
+
+def purge_sessions(max_age=SESSION_TOKEN_TTL):
+    """Borra del registro las sesiones que ya no se pueden reanudar; retorna cuántas"""
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=max_age)
+    with get_connection() as conn:
+        count = conn.execute(
+            "SELECT COUNT(*) FROM sessions WHERE disconnected_at < ? AND summary_pid IS NULL", (cutoff,)
+        ).fetchone()[0]
+    if count:
+        db_writer.submit(
+            "DELETE FROM sessions WHERE disconnected_at < ? AND summary_pid IS NULL",
+            (cutoff,),
+            DURABILITY_COMMIT
+        )
+        log.info("Sesiones purgadas", sessions=count)
+    return count
+
+# Clientes sin fila en el registro y sin actividad desde `cutoff`
+ORPHANS_QUERY = (
+    "SELECT client_id FROM {table} GROUP BY client_id "
+    "HAVING MAX({column}) < ? AND client_id NOT IN (SELECT client_id FROM sessions) LIMIT ?"
+)
+
+def _orphaned_clients(cutoff, batch_size):
+    with get_connection() as conn:
+        clients = set()
+        for table, column in (("messages", "timestamp"), ("summaries", "created_at")):
+            rows = conn.execute(ORPHANS_QUERY.format(table=table, column=column), (cutoff, batch_size)).fetchall()
+            clients.update(row[0] for row in rows)
+    return sorted(clients)
+
+def purge_orphaned_history(max_age=SESSION_TOKEN_TTL, mode=RETENTION_MODE, batch_size=RETENTION_BATCH):
+    """Historial de los IDs que ya no se pueden reanudar; retorna cuántos clientes limpió
+    
+    Corre después de purge_sessions: un ID sin fila en `sessions` y sin
+    actividad en SESSION_TOKEN_TTL no tiene conexión ni token válido.
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=max_age)
+    total = 0
+    
+    while True:
+        clients = _orphaned_clients(cutoff, batch_size)
+        if not clients:
+            break
+        
+        placeholders = ", ".join("?" * len(clients))
+        if mode == "archive":
+            db_writer.submit(
+                "INSERT OR IGNORE INTO messages_archive (id, client_id, role, content, timestamp, archived_at) "
+                f"SELECT id, client_id, role, content, timestamp, ? FROM messages WHERE client_id IN ({placeholders})",
+                (datetime.datetime.now(), *clients)
+            )
+        db_writer.submit(f"DELETE FROM messages WHERE client_id IN ({placeholders})", tuple(clients))
+        db_writer.submit(f"DELETE FROM summaries WHERE client_id IN ({placeholders})", tuple(clients), DURABILITY_COMMIT)
+        total += len(clients)
+    
+    if total:
+        log.info("Historial sin sesión purgado", clients=total, mode=mode)
+    return total
+
+def purge_orphaned_spill(grace=SESSION_GRACE + SPILL_MARGIN):
+    """Borra los mensajes volcados de sesiones que ya no están en memoria; retorna cuántos
+    
+    Una sesión conectada o en espera tiene su fila sin desconexión, o
+    desconectada hace menos de la gracia. Si el worker murió antes de
+    resumirla, sus volcados quedan sin dueño: los mensajes siguen en
+    `messages`, solo se pierde su paso por el resumen.
+    """
+    cutoff = datetime.datetime.now() - datetime.timedelta(seconds=grace)
+    where = (
+        "client_id NOT IN (SELECT client_id FROM sessions "
+        "WHERE disconnected_at IS NULL OR disconnected_at >= ?)"
+    )
+    with get_connection() as conn:
+        count = conn.execute(f"SELECT COUNT(*) FROM session_spill WHERE {where}", (cutoff,)).fetchone()[0]
+    if count:
+        db_writer.submit(f"DELETE FROM session_spill WHERE {where}", (cutoff,), DURABILITY_COMMIT)
+        log.warning("Mensajes volcados sin sesión borrados", messages=count)
+    return count
+
+def start_retention_worker(interval=RETENTION_INTERVAL):
+    """Ejecuta la retención periódicamente en un hilo daemon
+    
+    La purga de sesiones (y de su historial) corre siempre; la de mensajes,
+    solo si MESSAGES_RETENTION_DAYS está configurado.
+    """
+    def loop():
+        while True:
+            try:
+                run_retention_pass()
+            except Exception as e:
+                log.error("Falló la retención de mensajes", error=e)
+            try:
+                purge_sessions()
+                purge_orphaned_history()
+                purge_orphaned_spill()
+            except Exception as e:
+                log.error("Falló la purga de sesiones", error=e)
+            time.sleep(interval)
+    
+    thread = threading.Thread(target=loop, name="db-retention", daemon=True)
+    thread.start()
+    if MESSAGES_RETENTION_DAYS > 0:
+        log.info("Retención de mensajes habilitada", days=MESSAGES_RETENTION_DAYS, mode=RETENTION_MODE)
+    return thread
@@ -0,0 +1,115 @@
+# database/search.py
+"""
+Búsqueda de texto completo en el historial (FTS5)
+
+messages_fts y summaries_fts (migración 8) indexan el texto de mensajes y
+resúmenes; los triggers los mantienen al día con cada INSERT/DELETE, así
+que la retención y la poda de resúmenes también limpian el índice.
+    
+    search_history     comando SEARCH: mensajes y resúmenes con todos los términos
+    retrieve_context   modo IA: los k fragmentos pasados más relevantes al prompt
+"""
+import os
+import re
+import datetime
+from database.database import get_connection
+from database.writer import db_writer
+from core.log import get_logger
+
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", 10))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 3))  # Fragmentos agregados al prompt (0 = deshabilitado)
+RETRIEVAL_MAX_TERMS = 12  # Términos del prompt que se buscan
+RETRIEVAL_MIN_TERM = 3    # Largo mínimo de un término del prompt
+SNIPPET_TOKENS = 24       # Palabras por fragmento
+
+TERM_RE = re.compile(r"\w+")
+
+log = get_logger("DB")
+
+# bm25 con peso 0 para client_id: solo filtra, no puntúa
+MESSAGES_QUERY = (
+    "SELECT 'message', m.role, snippet(messages_fts, 0, ?, ?, '…', ?), m.timestamp, bm25(messages_fts, 1.0, 0.0) AS score "
+    "FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid "
+    "WHERE messages_fts MATCH ? {where} ORDER BY score LIMIT ?"
+)
+SUMMARIES_QUERY = (
+    "SELECT 'summary', 'summary', snippet(summaries_fts, 0, ?, ?, '…', ?), s.created_at, bm25(summaries_fts, 1.0, 0.0) AS score "
+    "FROM summaries_fts JOIN summaries s ON s.id = summaries_fts.rowid "
+    "WHERE summaries_fts MATCH ? {where} ORDER BY score LIMIT ?"
+)
+
+def build_match(client_id, text, column, any_term=False):
+    """Expresión MATCH segura: términos entre comillas, filtrada por cliente
+    
+    any_term=True (recuperación) busca cualquiera de los términos largos
+    del prompt y deja que bm25 ordene; si no, exige todos.
+    """
+    terms = list(dict.fromkeys(TERM_RE.findall(text.lower())))
+    if any_term:
+        terms = [term for term in terms if len(term) >= RETRIEVAL_MIN_TERM][:RETRIEVAL_MAX_TERMS]
+    if not terms:
+        return None
+    joined = (" OR " if any_term else " AND ").join(f'"{term}"' for term in terms)
+    return f'client_id : "{client_id}" AND {column} : ({joined})'
+
+def _query(client_id, text, limit, any_term, highlight, before=None, skip_latest_summary=False):
+    """Resultados de mensajes y resúmenes, mezclados por puntaje"""
+    message_match = build_match(client_id, text, "content", any_term)
+    if not message_match:
+        return []
+    summary_match = build_match(client_id, text, "summary_text", any_term)
+    
+    message_where, message_params = "", []
+    if before:
+        message_where, message_params = "AND m.timestamp < ?", [before]
+    summary_where, summary_params = "", []
+    if skip_latest_summary:
+        # El último resumen ya va fijo como contexto
+        summary_where = "AND s.id < (SELECT MAX(id) FROM summaries WHERE client_id = ?)"
+        summary_params = [client_id]
+    
+    rows = []
+    with get_connection() as conn:
+        rows += conn.execute(
+            MESSAGES_QUERY.format(where=message_where),
+            (*highlight, SNIPPET_TOKENS, message_match, *message_params, limit)
+        ).fetchall()
+        rows += conn.execute(
+            SUMMARIES_QUERY.format(where=summary_where),
+            (*highlight, SNIPPET_TOKENS, summary_match, *summary_params, limit)
+        ).fetchall()
+    rows.sort(key=lambda row: row[4])
+    return rows[:limit]
+
+def search_history(client_id, text, limit=SEARCH_LIMIT):
+    """Coincidencias del cliente: [(tipo, rol, fragmento, fecha)]"""
+    # Los últimos mensajes pueden seguir en la cola del escritor
+    db_writer.flush()
+    try:
+        return [row[:4] for row in _query(client_id, text, limit, False, ("[", "]"))]
+    except Exception as e:
+        log.error("Búsqueda fallida", client=client_id[:8], error=e)
+        return []
+
+def retrieve_context(client_id, prompt, k=RETRIEVAL_TOP_K, since=None):
+    """Los k fragmentos pasados más relevantes para el prompt
+    
+    `since` (epoch) excluye los mensajes desde ese momento: ya están en la
+    ventana de contexto que recibe el modelo.
+    """
+    if not k:
+        return []
+    before = datetime.datetime.fromtimestamp(since) if since else None
+    try:
+        rows = _query(client_id, prompt, k, True, ("", ""), before, skip_latest_summary=True)
+    except Exception as e:
+        log.error("Recuperación de contexto fallida", client=client_id[:8], error=e)
+        return []
+    return [f"{role}: {snippet}" for _, role, snippet, _, _ in rows]
+
+def with_retrieved_context(snippets, prompt):
+    """Prompt con los fragmentos recuperados delante"""
+    if not snippets:
+        return prompt
+    lines = "\n".join(f"- {snippet}" for snippet in snippets)
+    return f"[HISTORIAL RELEVANTE]\n{lines}\n\n{prompt}"
@@ -0,0 +1,126 @@
+# database/sessions.py
+"""
+Registro de sesiones compartido entre procesos (modo prefork)
+
+Cada worker guarda en la tabla `sessions` lo que otro worker necesita saber
+de un cliente que vuelve a conectarse por otro proceso:
+    
+    - modelo elegido (CHANGE-MODEL se conserva entre conexiones y workers)
+    - si tiene un resumen en curso y en qué proceso (summary_pid), para que
+      al reactivar IA en otro worker se espere ese resumen igual que en uno solo
+    - worker, IP y puerto de la última conexión, y cuándo se desconectó: la
+      retención borra las filas que ya no se pueden reanudar (ver
+      database/retention.py)
+
+También guarda los mensajes que salen del buffer circular de una sesión
+larga (tabla `session_spill`) hasta que se resumen. Los que deja un proceso
+que terminó sin resumir se borran al arrancar y en la retención; todos
+siguen en `messages`.
+"""
+import os
+import time
+import datetime
+from database.database import get_connection
+from database.writer import db_writer, DURABILITY_COMMIT
+from core.log import get_logger
+
+SESSION_POLL_INTERVAL = 0.1  # segundos entre consultas al esperar un resumen de otro worker
+
+log = get_logger("DB")
+
+def register_session(client_id, ip, port):
+    """Registra la conexión en este worker; retorna el modelo guardado (o None)"""
+    db_writer.submit(
+        "INSERT INTO sessions (client_id, worker_pid, ip, port, connected_at) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(client_id) DO UPDATE SET worker_pid = excluded.worker_pid, ip = excluded.ip, "
+        "port = excluded.port, connected_at = excluded.connected_at, disconnected_at = NULL",
+        (client_id, os.getpid(), ip, port, datetime.datetime.now())
+    )
+    try:
+        with get_connection() as conn:
+            row = conn.execute("SELECT selected_model FROM sessions WHERE client_id = ?", (client_id,)).fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        log.error("No se pudo leer la sesión", client=client_id[:8], error=e)
+        return None
+
+def close_session(client_id):
+    """Anota la desconexión (si la sesión no pasó a otro worker mientras tanto)"""
+    db_writer.submit(
+        "UPDATE sessions SET disconnected_at = ? WHERE client_id = ? AND worker_pid = ?",
+        (datetime.datetime.now(), client_id, os.getpid())
+    )
+
+def discard_session(client_id):
+    """Borra la fila de una sesión que nunca guardó nada (se reemplazó con RESUME)"""
+    db_writer.submit("DELETE FROM sessions WHERE client_id = ? AND worker_pid = ?", (client_id, os.getpid()))
+
+def close_stale_sessions():
+    """Al arrancar: las filas que quedaron conectadas son de un proceso que ya no existe"""
+    db_writer.submit("UPDATE sessions SET disconnected_at = ? WHERE disconnected_at IS NULL", (datetime.datetime.now(),))
+    # Ninguna sesión sigue en memoria: sus mensajes volcados no se van a resumir
+    db_writer.submit("DELETE FROM session_spill", ())
+
+def save_selected_model(client_id, model):
+    # Se confirma antes de responder: el cliente puede reconectar enseguida por otro worker
+    db_writer.submit("UPDATE sessions SET selected_model = ? WHERE client_id = ?", (model, client_id), DURABILITY_COMMIT)
+
+def mark_summary_pending(client_id):
+    """Anota que este proceso tiene un resumen en curso para el cliente"""
+    db_writer.submit("UPDATE sessions SET summary_pid = ? WHERE client_id = ?", (os.getpid(), client_id))
+
+def clear_summary_pending(client_id):
+    # Va por el mismo escritor que el INSERT del resumen: se confirma después que él
+    db_writer.submit(
+        "UPDATE sessions SET summary_pid = NULL WHERE client_id = ? AND summary_pid = ?",
+        (client_id, os.getpid())
+    )
+
+def wait_remote_summary(client_id, timeout):
+    """Espera (acotado) a que otro worker termine el resumen de este cliente"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with get_connection() as conn:
+                row = conn.execute("SELECT summary_pid FROM sessions WHERE client_id = ?", (client_id,)).fetchone()
+        except Exception as e:
+            log.error("No se pudo consultar la sesión", client=client_id[:8], error=e)
+            return False
+        
+        if not row or row[0] is None or row[0] == os.getpid():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(SESSION_POLL_INTERVAL)
+
+def release_worker(pid):
+    """Limpia lo que dejó un worker que terminó (sus resúmenes en curso se perdieron)"""
+    db_writer.submit("UPDATE sessions SET summary_pid = NULL WHERE summary_pid = ?", (pid,))
+    db_writer.submit(
+        "UPDATE sessions SET disconnected_at = ? WHERE worker_pid = ? AND disconnected_at IS NULL",
+        (datetime.datetime.now(), pid)
+    )
+
+def spill_messages(client_id, messages):
+    """Vuelca mensajes que ya no entran en la RAM de la sesión"""
+    for message in messages:
+        db_writer.submit(
+            "INSERT INTO session_spill (client_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+            (client_id, message.role, message.content, message.timestamp)
+        )
+
+def load_spilled(client_id):
+    """Mensajes volcados de un cliente, en orden: [(role, content, timestamp)]"""
+    # Los INSERT pueden seguir en la cola del escritor
+    db_writer.flush()
+    try:
+        with get_connection() as conn:
+            return conn.execute(
+                "SELECT role, content, timestamp FROM session_spill WHERE client_id = ? ORDER BY id", (client_id,)
+            ).fetchall()
+    except Exception as e:
+        log.error("No se pudieron leer los mensajes volcados", client=client_id[:8], error=e)
+        return []
+
+def clear_spilled(client_id):
+    db_writer.submit("DELETE FROM session_spill WHERE client_id = ?", (client_id,))
@@ -0,0 +1,153 @@
+# database/writer.py
+"""
+Escritor único de SQLite con escritura diferida (write-behind)
+
+Todas las escrituras pasan por una cola que drena un solo hilo. Las
+operaciones se agrupan en lotes acotados por tamaño y por tiempo, y cada
+lote se escribe con executemany en una única transacción (un fsync por
+lote en lugar de uno por fila). Si el lote falla, cada operación se
+reintenta en su propia transacción para aislar la que lo hizo fallar.
+"""
+import os
+import time
+import queue
+import itertools
+import threading
+from dotenv import load_dotenv
+from database.database import open_connection
+from core.log import get_logger
+
+load_dotenv()
+
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", 200))
+DB_BATCH_INTERVAL = float(os.getenv("DB_BATCH_INTERVAL", 0.05))  # segundos
+
+# Niveles de durabilidad
+DURABILITY_ASYNC = "async"    # Retorna al encolar
+DURABILITY_COMMIT = "commit"  # Espera a que el lote se confirme en disco
+DB_DURABILITY = os.getenv("DB_DURABILITY", DURABILITY_ASYNC).lower()
+
+log = get_logger("DB")
+
+class WriteOp:
+    """Operación encolada para el escritor"""
+    __slots__ = ("kind", "sql", "params", "done", "error")
+    
+    def __init__(self, kind, sql=None, params=None, wait=False):
+        self.kind = kind  # write | flush | stop
+        self.sql = sql
+        self.params = params
+        self.done = threading.Event() if wait else None
+        self.error = None
+
+class DatabaseWriter:
+    """Hilo escritor único con lotes por tamaño/tiempo"""
+    
+    def __init__(self, batch_size=DB_BATCH_SIZE, batch_interval=DB_BATCH_INTERVAL):
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "failed_batches": 0, "dropped": 0}
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+    
+    def submit(self, sql, params, durability=None):
+        """Encola una escritura; con DURABILITY_COMMIT espera la confirmación"""
+        durability = durability or DB_DURABILITY
+        op = WriteOp("write", sql, params, wait=durability == DURABILITY_COMMIT)
+        self._ensure_started()
+        self._queue.put(op)
+        
+        if op.done:
+            op.done.wait()
+            if op.error:
+                raise op.error
+        return op
+    
+    def flush(self, timeout=None):
+        """Espera a que todo lo encolado hasta ahora esté confirmado"""
+        if self._thread is None:
+            return True
+        op = WriteOp("flush", wait=True)
+        self._queue.put(op)
+        return op.done.wait(timeout)
+    
+    def close(self, timeout=None):
+        """Escribe lo pendiente y detiene el hilo"""
+        if self._thread is None:
+            return True
+        op = WriteOp("stop", wait=True)
+        self._queue.put(op)
+        return op.done.wait(timeout)
+    
+    def pending(self):
+        return self._queue.qsize()
+    
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_interval
+        
+        while len(batch) < self.batch_size and batch[-1].kind == "write":
+            # Si alguien espera, no demorar el lote: tomar solo lo ya encolado
+            urgent = any(op.done for op in batch)
+            try:
+                if urgent:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _write_batch(self, conn, batch):
+        writes = [op for op in batch if op.kind == "write"]
+        try:
+            # Operaciones consecutivas con el mismo SQL van en un solo executemany
+            for sql, group in itertools.groupby(writes, key=lambda op: op.sql):
+                conn.executemany(sql, [op.params for op in group])
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            self.stats["failed_batches"] += 1
+            log.warning("Falló un lote de escrituras, se reintenta una por una", writes=len(writes), error=e)
+            self._write_each(conn, writes)
+        self.stats["batches"] += 1
+        
+        for op in batch:
+            if op.done:
+                op.done.set()
+    
+    def _write_each(self, conn, writes):
+        """Reintenta cada operación en su propia transacción: solo falla la culpable"""
+        for op in writes:
+            try:
+                conn.execute(op.sql, op.params)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                op.error = e
+                self.stats["dropped"] += 1
+                log.error("Escritura descartada", sql=" ".join(op.sql.split())[:80], error=e)
+    
+    def _run(self):
+        # Conexión dedicada (fuera del pool de lectura), mismos PRAGMAs
+        conn = open_connection()
+        try:
+            while True:
+                batch = self._next_batch()
+                self._write_batch(conn, batch)
+                if any(op.kind == "stop" for op in batch):
+                    break
+        finally:
+            conn.close()
+
+db_writer = DatabaseWriter()
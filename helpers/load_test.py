@@ -0,0 +1,184 @@
+# helpers/load_test.py
+"""
+Generador de carga concurrente para el servidor
+
+Abre N conexiones (opcionalmente TLS), ejecuta una mezcla de comandos INFO /
+LIST-MODELS / IA y reporta throughput y latencias p50/p95/p99 por comando.
+Para no gastar cuota, levantar el servidor con MODEL_BACKEND=fake.
+
+Uso:
+    python -m helpers.load_test --connections 50 --duration 30 --mix INFO=1,LIST-MODELS=1,IA=3 --output run.json
+"""
+import os
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+from dotenv import load_dotenv
+
+from core.protocol import FRAME_COMMAND
+from ai_bridge import open_connection, read_reply
+
+load_dotenv()
+
+def parse_mix(raw):
+    """Parsea 'INFO=1,IA=3' en [(comando, peso)]"""
+    mix = []
+    for item in raw.split(","):
+        name, _, weight = item.partition("=")
+        if name.strip():
+            mix.append((name.strip().upper(), float(weight or 1)))
+    return mix
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class LoadStats:
+    """Latencias y errores por comando (compartido entre hilos)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+    
+    def record(self, name, seconds):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds * 1000)
+    
+    def error(self, name):
+        with self._lock:
+            self.errors[name] = self.errors.get(name, 0) + 1
+    
+    def summary(self, elapsed):
+        commands = {}
+        total = 0
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(name, []))
+            total += len(values)
+            commands[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "throughput_ops_s": len(values) / elapsed if elapsed else 0.0,
+                "mean_ms": sum(values) / len(values) if values else 0.0,
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1] if values else 0.0,
+            }
+        return {
+            "elapsed_s": elapsed,
+            "total_ops": total,
+            "throughput_ops_s": total / elapsed if elapsed else 0.0,
+            "commands": commands,
+        }
+
+def loopback_source(index):
+    """IP de origen 127.x.y.z distinta por conexión (como si fueran equipos diferentes)"""
+    index += 2
+    return f"127.{index // 65536 % 256}.{index // 256 % 256}.{index % 256 or 1}"
+
+def request(conn, text):
+    """Envía un comando y lee su respuesta completa; retorna (texto, ttft)"""
+    started = time.perf_counter()
+    request_id = conn.send(FRAME_COMMAND, text, conn.next_request_id())
+    text, is_error, ttft = read_reply(conn, request_id, sent=started)
+    if is_error:
+        raise RuntimeError(text)
+    return text, ttft
+
+def run_worker(args, mix, stats, deadline, seed, index):
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    prompt = "x" * args.prompt_size
+    
+    try:
+        source_ip = loopback_source(index) if args.spread_loopback else None
+        conn, _ = open_connection(args.host, args.port, args.tls, args.timeout, compression=args.compression,
+                                  source_address=source_ip)
+    except Exception as e:
+        stats.error("CONNECT")
+        print(f"[LOAD] Error de conexión: {e}")
+        return
+    
+    done = 0
+    try:
+        while time.time() < deadline and (not args.requests or done < args.requests):
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                if name == "IA":
+                    request(conn, "IA")
+                    turn_started = time.perf_counter()
+                    _, ttft = request(conn, f"{prompt} #{done}")
+                    stats.record("IA", time.perf_counter() - turn_started)
+                    stats.record("IA-TTFT", ttft)
+                    request(conn, "ia-deactivate")
+                else:
+                    request(conn, name)
+                    stats.record(name, time.perf_counter() - started)
+            except (ConnectionError, socket.timeout, OSError) as e:
+                stats.error(name)
+                print(f"[LOAD] Conexión perdida: {e}")
+                break
+            except Exception:
+                stats.error(name)
+            done += 1
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del servidor de sockets")
+    parser.add_argument("--host", default=os.getenv("IP_SERVER", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT_SERVER", 65432)))
+    parser.add_argument("--tls", action="store_true", default=os.getenv("USE_TLS", "true").lower() == "true")
+    parser.add_argument("--no-tls", dest="tls", action="store_false")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de prueba")
+    parser.add_argument("--requests", type=int, default=0, help="Operaciones por conexión (0 = hasta --duration)")
+    parser.add_argument("--mix", default="INFO=1,LIST-MODELS=1,IA=3")
+    parser.add_argument("--prompt-size", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spread-loopback", action="store_true",
+                        help="Una IP 127.x.y.z por conexión (como si fueran equipos diferentes)")
+    parser.add_argument("--compression", action="store_true", help="Negociar compresión con el servidor")
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+    
+    mix = parse_mix(args.mix)
+    stats = LoadStats()
+    print(f"[LOAD] {args.connections} conexiones contra {args.host}:{args.port} ({'TLS' if args.tls else 'plano'}), mezcla {args.mix}")
+    
+    started = time.time()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=run_worker, args=(args, mix, stats, deadline, args.seed + i, i), daemon=True)
+        for i in range(args.connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    
+    result = stats.summary(elapsed)
+    result["config"] = {key: value for key, value in vars(args).items() if key != "output"}
+    result["timestamp"] = started
+    
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    
+    print(f"[LOAD] {result['total_ops']} operaciones en {elapsed:.1f}s ({result['throughput_ops_s']:.1f} ops/s)")
+    for name, data in result["commands"].items():
+        print(f"  {name:12} n={data['count']:6} err={data['errors']:4} "
+              f"p50={data['p50_ms']:.1f}ms p95={data['p95_ms']:.1f}ms p99={data['p99_ms']:.1f}ms")
+    print(f"[LOAD] Resultados guardados en {args.output}")
+
+if __name__ == "__main__":
+    main()
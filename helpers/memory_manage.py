@@ -1,90 +1,169 @@
 import os
-import sys
 import datetime
 from database.database import get_connection
+from database.writer import db_writer, DURABILITY_COMMIT
+from core.log import get_logger
+from core.metrics import metrics
+from core.scheduler import gemini_scheduler
+from core.session import estimate_tokens
 
-def save_message(client_id, role, content):
-    """ Persistencia real en SQLite """
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 30000))  # Tokens máx. de mensajes por llamada de resumen
+
+log = get_logger("DB")
+log_ia = get_logger("IA")
+
+SUMMARY_PROMPT = (
+    "Actúa como un gestor de memoria. Resume de forma técnica y concisa esta conversación "
+    "para que pueda ser retomada en el futuro sin perder información clave:\n\n"
+)
+ROLLING_PROMPT = (
+    "Actúa como un gestor de memoria. Este es el resumen acumulado de la conversación:\n\n"
+    "{previous}\n\n"
+    "Intégrale los mensajes nuevos de forma técnica y concisa, sin perder información "
+    "clave del resumen anterior:\n\n"
+)
+CHUNK_PROMPT = (
+    "Actúa como un gestor de memoria. Resume de forma técnica y concisa esta parte "
+    "({part} de {total}) de una conversación, sin perder información clave:\n\n"
+)
+MERGE_PROMPT = (
+    "Actúa como un gestor de memoria. Une estos resúmenes parciales consecutivos de una "
+    "misma conversación en un solo resumen técnico y conciso:\n\n"
+)
+
+def save_message(client_id, role, content, durability=None):
+    """ Persistencia en SQLite vía el escritor único (write-behind) """
     try:
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO messages (client_id, role, content, timestamp) VALUES (?, ?, ?, ?)", 
-                (client_id, role, content, datetime.datetime.now())
-            )
-            conn.commit()
+        db_writer.submit(
+            "INSERT INTO messages (client_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+            (client_id, role, content, datetime.datetime.now()),
+            durability
+        )
     except Exception as e:
-        print(f"[ERROR-DB]: No se pudo guardar el mensaje: {e}")
+        log.error("No se pudo guardar el mensaje", client=client_id[:8], error=e)
 
-def get_last_summaries(client_id):
-    """ Recupera contexto histórico (Capa 3) """
+def get_summary_head(client_id):
+    """ Último resumen del linaje: (id, summary_text, message_count) o None """
     try:
         with get_connection() as conn:
             cursor = conn.cursor()
-            # CORRECCIÓN: Se agregó el "=" faltante después de client_id
             cursor.execute(
-                "SELECT summary_text FROM summaries WHERE client_id = ? ORDER BY created_at DESC LIMIT 1", 
+                "SELECT id, summary_text, message_count FROM summaries WHERE client_id = ? ORDER BY created_at DESC LIMIT 1",
                 (client_id,)
             )
-            row = cursor.fetchone()
-            return row[0] if row else None
+            return cursor.fetchone()
     except Exception as e:
-        print(f"[ERROR-DB]: Error al recuperar resumen: {e}")
+        log.error("Error al recuperar resumen", client=client_id[:8], error=e)
         return None
+
+def get_last_summaries(client_id):
+    """ Recupera contexto histórico (Capa 3)
     
-def get_size(obj, seen=None):
-    """ Calcula el tamaño real en bytes de un objeto y sus contenidos """
-    size = sys.getsizeof(obj)
-    if seen is None:
-        seen = set()
-    obj_id = id(obj)
-    if obj_id in seen:
-        return 0
-    seen.add(obj_id)
-    if isinstance(obj, dict):
-        size += sum([get_size(v, seen) for v in obj.values()])
-        size += sum([get_size(k, seen) for k in obj.keys()])
-    elif hasattr(obj, '__dict__'):
-        size += get_size(obj.__dict__, seen)
-    elif hasattr(obj, '__iter__') and not isinstance(obj, (str, bytes, bytearray)):
-        size += sum([get_size(i, seen) for i in obj])
-    return size
+    Cada resumen integra al anterior (parent_id), así que el último ya cubre
+    toda la conversación: no hace falta releer mensajes ni resúmenes viejos.
+    """
+    head = get_summary_head(client_id)
+    return head[1] if head else None
+
+class PartialSummary:
+    """ Resumen parcial con la forma de un mensaje (para chunk_messages) """
+    __slots__ = ("role", "content")
     
-def ai_self_summarize(client_id, messages_list, genai_client, model_selected):
-    """ Gemini resume la conversación y guarda en DB """
-    if not messages_list: return None
+    def __init__(self, content):
+        self.role = "resumen"
+        self.content = content
 
-    history_text = "\n".join([f"{m['role']}: {m['content']}" for m in messages_list])
+def chunk_messages(messages_list, max_tokens=SUMMARY_CHUNK_TOKENS):
+    """ Agrupa los mensajes en bloques de texto de a lo sumo max_tokens (estimados)
+    
+    Un mensaje más grande que el bloque se parte en pedazos; nunca se arma
+    el texto completo de la conversación en memoria.
+    """
+    max_chars = max_tokens * 4
+    lines, size = [], 0
+    for m in messages_list:
+        line = f"{m.role}: {m.content}"
+        for start in range(0, len(line), max_chars):
+            piece = line[start:start + max_chars]
+            if lines and size + len(piece) > max_chars:
+                yield "\n".join(lines)
+                lines, size = [], 0
+            lines.append(piece)
+            size += len(piece) + 1
+    if lines:
+        yield "\n".join(lines)
 
-    prompt_instruction = (
-        "Actúa como un gestor de memoria. Resume de forma técnica y concisa esta conversación "
-        "para que pueda ser retomada en el futuro sin perder información clave:\n\n"
-        f"{history_text}"
+def generate_summary(client_id, genai_client, model_selected, prompt):
+    # Pasa por el scheduler: comparte cupo y límites con los turnos de chat
+    response = gemini_scheduler.call(
+        client_id,
+        model_selected,
+        lambda: genai_client.models.generate_content(model=model_selected, contents=prompt),
+        estimate_tokens(prompt)
     )
+    # Un resumen vacío no puede reemplazar al anterior como cabeza del linaje
+    if not response.text or not response.text.strip():
+        raise ValueError("El modelo devolvió un resumen vacío")
+    return response.text
+
+def reduce_summaries(client_id, partials, genai_client, model_selected):
+    """ Une resúmenes parciales por grupos hasta que entran en un bloque """
+    while len(partials) > 1 and sum(estimate_tokens(p) for p in partials) > SUMMARY_CHUNK_TOKENS:
+        groups = list(chunk_messages([PartialSummary(p) for p in partials]))
+        if len(groups) >= len(partials):
+            break  # Cada parcial ya llena un bloque: no se puede agrupar más
+        partials = [generate_summary(client_id, genai_client, model_selected, MERGE_PROMPT + group) for group in groups]
+    return "\n\n".join(partials)
 
+def ai_self_summarize(client_id, messages_list, genai_client, model_selected):
+    """ Gemini integra los mensajes nuevos al último resumen y guarda en DB
+    
+    Solo se envían los mensajes desde el resumen anterior. Si no entran en
+    un bloque (SUMMARY_CHUNK_TOKENS), se resumen por partes (map) y las
+    partes se unen (reduce) antes de integrarlas.
+    """
+    if not messages_list: return None
+    
     try:
-        response = genai_client.models.generate_content(
-            model=model_selected,
-            contents=prompt_instruction
+        parent = get_summary_head(client_id)
+        blocks = list(chunk_messages(messages_list))
+        chunks = len(blocks)
+        if chunks == 1:
+            new_text = blocks[0]
+        else:
+            partials = [
+                generate_summary(client_id, genai_client, model_selected, CHUNK_PROMPT.format(part=i, total=chunks) + block)
+                for i, block in enumerate(blocks, 1)
+            ]
+            new_text = reduce_summaries(client_id, partials, genai_client, model_selected)
+        del blocks
+        
+        if parent:
+            prompt_instruction = ROLLING_PROMPT.format(previous=parent[1]) + new_text
+        else:
+            prompt_instruction = SUMMARY_PROMPT + new_text
+        summary_result = generate_summary(client_id, genai_client, model_selected, prompt_instruction)
+        metrics.inc("summaries", mode="rolling" if parent else "initial")
+        if chunks > 1:
+            metrics.inc("summary_chunks", chunks)
+        
+        # Guardar nuevo resumen con su linaje
+        db_writer.submit(
+            "INSERT INTO summaries (client_id, summary_text, created_at, parent_id, message_count, covered_until, chunks) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (client_id, summary_result, datetime.datetime.now(), parent[0] if parent else None,
+             (parent[2] if parent else 0) + len(messages_list), max(m.timestamp for m in messages_list), chunks)
         )
-        summary_result = response.text
-
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            # Guardar nuevo resumen
-            cursor.execute(
-                "INSERT INTO summaries (client_id, summary_text, created_at) VALUES (?, ?, ?)", 
-                (client_id, summary_result, datetime.datetime.now())
+        # Mantener solo los últimos 50 (esperar confirmación: la reactivación lo lee)
+        # El corte sale del índice (client_id, created_at): no re-escanea la tabla
+        db_writer.submit('''
+            DELETE FROM summaries
+            WHERE client_id = ? AND created_at < (
+                SELECT created_at FROM summaries WHERE client_id = ? ORDER BY created_at DESC LIMIT 1 OFFSET 49
             )
-            # Mantener solo los últimos 50
-            cursor.execute(''' 
-                DELETE FROM summaries 
-                WHERE client_id = ? AND id NOT IN (
-                    SELECT id FROM summaries WHERE client_id = ? ORDER BY created_at DESC LIMIT 50
-                ) 
-            ''', (client_id, client_id))
-            conn.commit()
+        ''', (client_id, client_id), DURABILITY_COMMIT)
         return summary_result
     except Exception as e:
-        print(f"[ERROR-IA]: Error en auto-resumen: {e}")
-        return None
\ No newline at end of file
+        metrics.inc("errors", kind="summarize")
+        log_ia.error("Error en auto-resumen", client=client_id[:8], error=e)
+        return None
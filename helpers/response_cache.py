@@ -0,0 +1,161 @@
+# helpers/response_cache.py
+"""
+Cache de respuestas IA para prompts repetidos
+
+La clave es (modelo, hash del historial normalizado, prompt normalizado):
+dos clientes con el mismo historial que envían el mismo prompt al mismo
+modelo reciben la misma respuesta sin otra llamada a Gemini. Si llegan a la
+vez, solo el primero llama a Gemini y los demás esperan su respuesta.
+    
+    Capa 1: LRU en memoria acotado por bytes, con TTL
+    Capa 2: tabla response_cache en SQLite (opcional, sobrevive reinicios)
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from database.database import get_connection
+from database.writer import db_writer
+from core.log import get_logger
+from core.metrics import metrics
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "off").lower()  # off | memory | sqlite
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 3600))  # segundos
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 33554432))  # 32MB
+RESPONSE_CACHE_WAIT = float(os.getenv("RESPONSE_CACHE_WAIT", 60))  # Espera máx. a una petición idéntica en curso
+PURGE_EVERY = 256  # Escrituras entre limpiezas de vencidos en SQLite
+
+log = get_logger("IA")
+
+def normalize_text(text):
+    """Colapsa espacios para que diferencias de formato no eviten un acierto"""
+    return " ".join(text.split())
+
+def history_digest(previous, role, content):
+    """Encadena un mensaje al hash del historial (O(largo del mensaje))"""
+    return hashlib.sha256(f"{previous}\x00{role}\x00{normalize_text(content)}".encode()).hexdigest()
+
+def make_key(model, digest, prompt):
+    return hashlib.sha256(f"{model}\x00{digest}\x00{normalize_text(prompt)}".encode()).hexdigest()
+
+class ResponseCache:
+    """LRU + TTL en memoria con una segunda capa opcional en SQLite"""
+    
+    def __init__(self, mode=RESPONSE_CACHE, ttl=RESPONSE_CACHE_TTL, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.enabled = mode in ("memory", "sqlite")
+        self.use_sqlite = mode == "sqlite"
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # clave -> (respuesta, vence, bytes)
+        self._inflight = {}            # clave -> Event de la petición que la está generando
+        self._lock = threading.Lock()
+        self._writes = 0
+    
+    def get_or_claim(self, key, timeout=RESPONSE_CACHE_WAIT):
+        """Retorna (respuesta, dueño)
+        
+        Con un acierto retorna (respuesta, False). Si falta y nadie la está
+        generando, retorna (None, True): el llamador debe pedirla a Gemini,
+        guardarla con put() y llamar siempre a release(). Si otra petición
+        idéntica está en curso, espera su resultado.
+        """
+        while True:
+            reply, tier = self._lookup(key)
+            if reply is not None:
+                metrics.inc("response_cache", result="hit", tier=tier)
+                return reply, False
+            
+            with self._lock:
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self._inflight[key] = threading.Event()
+                    metrics.inc("response_cache", result="miss")
+                    return None, True
+            
+            metrics.inc("response_cache", result="coalesced")
+            if not pending.wait(timeout):
+                metrics.inc("response_cache", result="miss")
+                return None, False
+            # El dueño terminó: volver a buscar (si falló, tomar su lugar)
+    
+    def release(self, key):
+        """Libera la clave reclamada y despierta a las peticiones que la esperaban"""
+        with self._lock:
+            pending = self._inflight.pop(key, None)
+        if pending:
+            pending.set()
+    
+    def _lookup(self, key):
+        """(respuesta, capa) o (None, None); promueve a memoria los aciertos de SQLite"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                reply, expires_at, size = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return reply, "memory"
+                self._remove(key)
+        
+        if self.use_sqlite:
+            row = self._load(key, now)
+            if row:
+                reply, expires_at = row
+                with self._lock:
+                    self._store(key, reply, expires_at)
+                return reply, "sqlite"
+        
+        return None, None
+    
+    def put(self, key, model, reply):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, reply, expires_at)
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY == 0
+        
+        if self.use_sqlite:
+            db_writer.submit(
+                "INSERT OR REPLACE INTO response_cache (key, model, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, reply, time.time(), expires_at)
+            )
+            if purge:
+                db_writer.submit("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),))
+    
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes_used, "evictions": self.evictions}
+    
+    def _store(self, key, reply, expires_at):
+        size = len(reply.encode())
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (reply, expires_at, size)
+        self.bytes_used += size
+        
+        # Desalojar los menos usados hasta volver al límite
+        while self.bytes_used > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+    
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self.bytes_used -= size
+    
+    def _load(self, key, now):
+        try:
+            with get_connection() as conn:
+                return conn.execute(
+                    "SELECT response, expires_at FROM response_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+        except Exception as e:
+            log.error("No se pudo leer el cache de respuestas", error=e)
+            return None
+
+response_cache = ResponseCache()
@@ -0,0 +1,146 @@
+# helpers/summary_worker.py
+"""
+Pool de hilos para generar resúmenes fuera del camino de la petición
+"""
+import os
+import queue
+import threading
+import itertools
+from helpers.memory_manage import ai_self_summarize
+from database.sessions import mark_summary_pending, clear_summary_pending
+from core.log import get_logger
+from core.metrics import metrics
+
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", 2))
+
+# Menor número = mayor prioridad
+PRIORITY_DEACTIVATE = 0  # El cliente puede volver a entrar y esperar el resumen
+PRIORITY_COMPACTION = 1
+
+log = get_logger("IA")
+
+class SummaryJob:
+    """Resumen pendiente de un cliente"""
+    
+    def __init__(self, client_id, messages, genai_client, model, priority):
+        self.client_id = client_id
+        self.messages = list(messages)
+        self.genai_client = genai_client
+        self.model = model
+        self.priority = priority
+        self.started = False
+        self.done = threading.Event()
+
+class SummaryWorker:
+    """Cola de resúmenes con prioridad y deduplicación por cliente
+    
+    Si llega un trabajo para un cliente que ya tiene uno en cola (sin empezar),
+    se fusionan los mensajes en un solo resumen y se conserva la prioridad más alta.
+    Los resúmenes de un mismo cliente nunca corren a la vez: cada uno parte de
+    la cabeza que dejó el anterior, así que uno que llega mientras otro está
+    en curso queda en espera y se encola cuando ese termina.
+    """
+    
+    def __init__(self, workers=SUMMARY_WORKERS):
+        self._queue = queue.PriorityQueue()
+        self._pending = {}  # client_id -> SummaryJob en cola
+        self._running = {}  # client_id -> SummaryJob en curso
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._active = 0
+        self._seq = itertools.count()
+        self._threads = []
+        
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name=f"summary-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def submit(self, client_id, messages, genai_client, model, priority=PRIORITY_DEACTIVATE):
+        """Encola un resumen y retorna de inmediato"""
+        if not messages:
+            return None
+        
+        with self._lock:
+            job = self._pending.get(client_id)
+            if job and not job.started:
+                job.messages.extend(messages)
+                job.model = model
+                if priority < job.priority:
+                    # Se re-encola; la entrada anterior se descarta al salir
+                    job.priority = priority
+                    if client_id not in self._running:
+                        self._queue.put((priority, next(self._seq), job))
+                return job
+            
+            job = SummaryJob(client_id, messages, genai_client, model, priority)
+            self._pending[client_id] = job
+            # Con un resumen en curso espera a que termine (ver _finish)
+            if client_id not in self._running:
+                self._queue.put((priority, next(self._seq), job))
+        
+        # Visible para los demás workers (modo prefork)
+        mark_summary_pending(client_id)
+        return job
+    
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending) + self._active
+    
+    def wait_client(self, client_id, timeout=None):
+        """Espera el resumen pendiente de un cliente (si lo hay)"""
+        with self._lock:
+            job = self._pending.get(client_id) or self._running.get(client_id)
+        return job.done.wait(timeout) if job else True
+    
+    def wait_idle(self, timeout=None):
+        """Espera a que no queden resúmenes en cola ni en curso (tests, apagado)"""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self._pending and not self._active, timeout)
+    
+    def shutdown(self, timeout=None):
+        """Termina los resúmenes pendientes y detiene los hilos"""
+        finished = self.wait_idle(timeout)
+        for _ in self._threads:
+            self._queue.put((float("inf"), next(self._seq), None))
+        return finished
+    
+    def _run(self):
+        while True:
+            priority, _, job = self._queue.get()
+            if job is None:
+                break
+            
+            with self._lock:
+                # Entrada obsoleta (re-priorizada o ya tomada) o cliente con un
+                # resumen en curso: se vuelve a encolar cuando ese termine
+                if job.started or priority != job.priority or job.client_id in self._running:
+                    continue
+                job.started = True
+                self._active += 1
+                if self._pending.get(job.client_id) is job:
+                    del self._pending[job.client_id]
+                self._running[job.client_id] = job
+            
+            try:
+                with metrics.timer("summarize"):
+                    ai_self_summarize(job.client_id, job.messages, job.genai_client, job.model)
+            except Exception as e:
+                log.error("Resumen en segundo plano falló", client=job.client_id[:8], error=e)
+            finally:
+                self._finish(job)
+    
+    def _finish(self, job):
+        with self._idle:
+            self._active -= 1
+            if self._running.get(job.client_id) is job:
+                del self._running[job.client_id]
+            
+            # El trabajo que esperaba parte ahora de la cabeza recién guardada
+            follow_up = self._pending.get(job.client_id)
+            if follow_up:
+                self._queue.put((follow_up.priority, next(self._seq), follow_up))
+            else:
+                clear_summary_pending(job.client_id)
+            self._idle.notify_all()
+        job.done.set()
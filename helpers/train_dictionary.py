@@ -0,0 +1,59 @@
+# helpers/train_dictionary.py
+"""
+Entrena el diccionario de compresión con respuestas reales
+
+Lee las últimas respuestas del modelo guardadas en la tabla messages, arma
+un diccionario con los fragmentos más repetidos y lo escribe en un archivo.
+Servidor y clientes deben usar el mismo archivo (COMPRESSION_DICT); si no
+coinciden, la conexión se comprime sin diccionario.
+
+Uso:
+    python -m helpers.train_dictionary --limit 5000 --output compression.dict
+"""
+import zlib
+import argparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database.database import get_connection
+from core.compression import MAX_DICTIONARY_SIZE, BUILTIN_DICTIONARY, train_dictionary
+
+def load_samples(limit):
+    with get_connection() as conn:
+        rows = conn.execute(
+            "SELECT content FROM messages WHERE role = 'model' ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el diccionario de compresión")
+    parser.add_argument("--limit", type=int, default=5000, help="Respuestas a analizar")
+    parser.add_argument("--size", type=int, default=MAX_DICTIONARY_SIZE, help="Tamaño máx. del diccionario (bytes)")
+    parser.add_argument("--output", default="compression.dict")
+    args = parser.parse_args()
+    
+    samples = load_samples(args.limit)
+    if not samples:
+        print("[DICT] No hay respuestas guardadas; se mantiene el diccionario incorporado")
+        return
+    
+    dictionary = train_dictionary(samples, args.size)
+    with open(args.output, "wb") as f:
+        f.write(dictionary)
+    
+    # Comparación rápida contra el diccionario incorporado
+    def ratio(zdict):
+        raw = wire = 0
+        for sample in samples[:500]:
+            data = sample.encode()
+            compressor = zlib.compressobj(6, zdict=zdict)
+            raw += len(data)
+            wire += len(compressor.compress(data) + compressor.flush())
+        return raw / wire if wire else 0.0
+    
+    print(f"[DICT] {len(samples)} respuestas, diccionario de {len(dictionary)} bytes en {args.output}")
+    print(f"[DICT] Ratio zlib: incorporado {ratio(BUILTIN_DICTIONARY):.2f}x, entrenado {ratio(dictionary):.2f}x")
+
+if __name__ == "__main__":
+    main()
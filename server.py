@@ -1,17 +1,38 @@
 # server.py
 import socket
+import time
 import threading
 import datetime
+import asyncio
+import signal
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
 
 # Importaciones propias
-from helpers.memory_manage import get_last_summaries, save_message, ai_self_summarize, get_size
-from core.security import create_ssl_context
-from core.models import ModelManager
-from core.commands import create_client_id, get_connection_info, change_model_command, list_models_command
+from helpers.memory_manage import get_last_summaries, save_message
+from database.database import get_pool_stats
+from database.writer import db_writer
+from database.retention import start_retention_worker
+from database.sessions import (register_session, close_session, discard_session, close_stale_sessions,
+                               wait_remote_summary, release_worker)
+from database.search import retrieve_context, with_retrieved_context
+from helpers.summary_worker import SummaryWorker, PRIORITY_DEACTIVATE, PRIORITY_COMPACTION
+from helpers.response_cache import response_cache, make_key
+from core.security import create_ssl_context, server_handshake, instrument_async_context, get_tls_stats, TLS_HANDSHAKE_TIMEOUT
+from core.protocol import FramedSocket, AsyncFramedStream, ConnectionTimeout, FRAME_WELCOME, FRAME_COMMAND, FRAME_RESPONSE, FRAME_ERROR, FRAME_CHUNK, FRAME_END, FRAME_STATUS, FRAME_HELLO, FRAME_PING
+from core.compression import available_codecs, negotiate, compression_stats
+from core.models import ModelManager, MODELS_CACHE_PATH
+from core.backends import create_backend, MODEL_BACKEND
+from core.session import ChatSession, estimate_tokens, get_context_budget
+from core.scheduler import gemini_scheduler
+from core.commands import create_client_id, get_connection_info, change_model_command, change_model_command_async, list_models_command, search_command
+from core.metrics import metrics, start_metrics_server, METRICS_HOST, METRICS_PORT
+from core.log import get_logger
+from core.supervisor import Supervisor
+from core.resume import SessionParking, issue_token, verify_token, TOKEN_PREFIX
+from core.connections import (ConnectionTracker, tune_socket, worker_limits, REJECT_MESSAGES,
+                              IDLE_TIMEOUT, READ_TIMEOUT, DRAIN_TIMEOUT, SHUTDOWN_TIMEOUT)
 
 load_dotenv()
 
@@ -19,207 +40,784 @@ load_dotenv()
 IP_SERVER = os.getenv("IP_SERVER", "0.0.0.0")
 PORT_SERVER = int(os.getenv("PORT_SERVER", 65432))
 USE_TLS = os.getenv("USE_TLS", "true").lower() == "true"
+SERVER_MODE = os.getenv("SERVER_MODE", "threads").lower()  # threads | asyncio
+LISTEN_BACKLOG = int(os.getenv("LISTEN_BACKLOG", 128))
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", 32))
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "true").lower() == "true"
+SUMMARY_WAIT_TIMEOUT = float(os.getenv("SUMMARY_WAIT_TIMEOUT", 10))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", 1))  # > 1 = procesos prefork con SO_REUSEPORT
+SESSION_REAP_INTERVAL = 5  # segundos entre revisiones de sesiones en espera
+
+log = get_logger("SYSTEM")
+log_security = get_logger("SECURITY")
 
 # Estado global
 clients_connected = {}
 chat_sessions = {}
 gemini_client = None
 model_manager = None
+summary_worker = SummaryWorker()
+connection_tracker = ConnectionTracker()  # Límites, pedidos en curso y drenado al apagar
+parked_sessions = SessionParking()  # Sesiones desconectadas que aún pueden reanudarse en caliente
+sessions_lock = threading.Lock()    # Registro/desregistro de conexiones y sesiones en espera
 
-# Inicializar Gemini
-api_key = os.getenv("GEMINI_API_KEY")
-if api_key:
-    gemini_client = genai.Client(api_key=api_key)
-    model_manager = ModelManager(gemini_client)
-    print("[SYSTEM] Gemini API configurada")
+# Inicializar backend de modelos (Gemini o local de pruebas)
+gemini_client = create_backend()
+if gemini_client:
+    # El catálogo del backend falso no se guarda en disco
+    model_manager = ModelManager(gemini_client, cache_path=None if MODEL_BACKEND == "fake" else MODELS_CACHE_PATH)
+    log.info("Backend de modelos configurado", backend=MODEL_BACKEND)
 else:
-    print("[WARNING] GEMINI_API_KEY no encontrada")
+    log.warning("GEMINI_API_KEY no encontrada")
+
+# Estadísticas de otros componentes incluidas en STATS y /metrics
+metrics.register_collector("tls", get_tls_stats)
+metrics.register_collector("db_pool", get_pool_stats)
+metrics.register_collector("db_writer", lambda: {"pending": db_writer.pending(), **db_writer.stats})
+metrics.register_collector("summaries", lambda: {"pending": summary_worker.pending_count()})
+metrics.register_collector("models", lambda: dict(model_manager.stats) if model_manager else {})
+metrics.register_collector("response_cache", response_cache.stats)
+metrics.register_collector("scheduler", gemini_scheduler.stats)
+metrics.register_collector("compression", compression_stats.snapshot)
+metrics.register_collector("parked_sessions", parked_sessions.snapshot)
+metrics.register_collector("connection_limits", connection_tracker.snapshot)
+
+def load_ia_context(client_id):
+    """Carga el contexto previo (último resumen) en la sesión del cliente"""
+    session = chat_sessions.get(client_id)
+    if session is not None and len(session):
+        # Sesión reanudada en caliente: el chat vivo ya tiene su historial
+        return
+    
+    # Si el resumen de la sesión anterior sigue en cola, esperarlo (acotado),
+    # también si lo está haciendo otro worker
+    summary_worker.wait_client(client_id, SUMMARY_WAIT_TIMEOUT)
+    wait_remote_summary(client_id, SUMMARY_WAIT_TIMEOUT)
+    with metrics.timer("history"):
+        last_summary = get_last_summaries(client_id)
+        if client_id not in chat_sessions:
+            chat_sessions[client_id] = ChatSession(client_id)
+        
+        if last_summary:
+            chat_sessions[client_id].add_context(last_summary)
+
+def close_ia_session(client_id):
+    """Resume la sesión IA y libera la memoria"""
+    log.info("Cerrando sesión IA", client=client_id[:8])
+    current_model = clients_connected[client_id].get('selected_model', 'gemini-2.0-flash')
+    summary_worker.submit(client_id, chat_sessions[client_id].drain(), gemini_client, current_model, PRIORITY_DEACTIVATE)
+
+def process_ia_message(client_id, request, on_chunk=None, on_status=None):
+    """Procesa un turno de IA (bloqueante) y retorna la respuesta completa
+    
+    Si se indica on_chunk, todo el texto de la respuesta (incluidos los
+    errores) se entrega además fragmento a fragmento a medida que llega.
+    on_status recibe los avisos del scheduler (posición en cola, reintentos).
+    """
+    session = chat_sessions[client_id]
+    current_model = clients_connected[client_id].get('selected_model', 'gemini-2.0-flash')
+    metrics.inc("turns")
+    
+    # Control de tamaño (contadores incrementales, presupuesto por modelo)
+    if session.needs_compaction(current_model):
+        log.info("Compactando memoria", client=client_id[:8], tokens=session.tokens_used)
+        summary_worker.submit(client_id, session.drain(), gemini_client, current_model, PRIORITY_COMPACTION)
+    
+    cache_key = None
+    cache_owner = False
+    prompt = request
+    
+    # Procesar con Gemini
+    try:
+        # Obtener respuesta (el chat vivo ya contiene la ventana de historial)
+        if gemini_client:
+            with metrics.timer("history"):
+                # Ventana: resumen previo fijo + turnos recientes dentro del límite del modelo
+                budget = get_context_budget(model_manager.input_token_limit(current_model))
+                chat = session.get_chat(gemini_client, current_model, budget)
+            with metrics.timer("search"):
+                # Fragmentos pasados relevantes que ya no están en la ventana del chat
+                snippets = retrieve_context(client_id, request, since=session.chat_since)
+                prompt = with_retrieved_context(snippets, request)
+            
+            # Cache de respuestas: mismo modelo, mismo historial y mismo prompt final
+            # (con los fragmentos propios del cliente, así no se comparte entre clientes)
+            if response_cache.enabled:
+                if clients_connected[client_id].get('use_cache', True):
+                    cache_key = make_key(current_model, session.digest, prompt)
+                    reply, cache_owner = response_cache.get_or_claim(cache_key)
+                    if reply is not None:
+                        session.add_cached_turn(request, reply)
+                        if on_chunk:
+                            on_chunk(reply)
+                        with metrics.timer("save"):
+                            save_message(client_id, "user", request)
+                            save_message(client_id, "model", reply)
+                        return reply
+                else:
+                    metrics.inc("response_cache", result="bypass")
+            
+            tokens = session.chat_tokens + estimate_tokens(prompt)
+            
+            if on_chunk:
+                parts = []
+                
+                def stream_reply():
+                    with metrics.timer("gemini"):
+                        for chunk in chat.send_message_stream(prompt):
+                            if chunk.text:
+                                parts.append(chunk.text)
+                                on_chunk(chunk.text)
+                
+                # Solo se reintenta un 429 si todavía no salió ningún fragmento
+                gemini_scheduler.call(client_id, current_model, stream_reply, tokens, on_status, retry=lambda: not parts)
+                reply = "".join(parts)
+                if not reply:
+                    reply = "(sin respuesta)"
+                    on_chunk(reply)
+            else:
+                def send_reply():
+                    with metrics.timer("gemini"):
+                        return chat.send_message(prompt)
+                
+                response = gemini_scheduler.call(client_id, current_model, send_reply, tokens, on_status)
+                reply = response.text if response.text else "(sin respuesta)"
+        else:
+            reply = "Error: Gemini no configurado"
+            if on_chunk:
+                on_chunk(reply)
+        
+        # Guardar en memoria (el chat vivo cuenta el prompt enviado, con fragmentos)
+        session.add_turn(request, reply, prompt)
+        if cache_key and reply != "(sin respuesta)":
+            response_cache.put(cache_key, current_model, reply)
+        
+        # Persistir en DB
+        with metrics.timer("save"):
+            save_message(client_id, "user", request)
+            save_message(client_id, "model", reply)
+    
+    except Exception as e:
+        metrics.inc("errors", kind="gemini")
+        reply = f"[ERROR]: {str(e)}"
+        if on_chunk:
+            on_chunk(reply)
+    finally:
+        if cache_owner:
+            response_cache.release(cache_key)
+    
+    return reply
 
 def ia_activate(conn, client_id):
     """Modo IA activado"""
-    conn.sendall(b"ia-activate")
+    conn.send(FRAME_RESPONSE, "ia-activate")
     
     # Cargar contexto previo
-    last_summary = get_last_summaries(client_id)
-    if client_id not in chat_sessions:
-        chat_sessions[client_id] = {"messages": []}
-    
-    if last_summary:
-        chat_sessions[client_id]["messages"].append({
-            "role": "user",
-            "content": f"[CONTEXTO ANTERIOR]: {last_summary}"
-        })
+    load_ia_context(client_id)
     
     try:
-        while True:
-            data = conn.recv(1024)
-            if not data:
+        while connection_tracker.idle(conn):
+            frame = conn.recv()
+            if frame is None:
                 break
+            connection_tracker.busy(conn)
+            
+            if frame.type == FRAME_PING:
+                conn.send(FRAME_PING)
+                continue
+            
+            if frame.type != FRAME_COMMAND:
+                conn.send(FRAME_ERROR, f"Tipo de frame inesperado: {frame.type}")
+                continue
             
-            request = data.decode().strip()
+            request = frame.text.strip()
             
             # Salir del modo IA
             if request.lower() == 'ia-deactivate':
-                print(f"[SYSTEM] Cerrando sesión IA para {client_id[:8]}")
-                current_model = clients_connected[client_id].get('selected_model', 'gemini-2.0-flash')
-                ai_self_summarize(client_id, chat_sessions[client_id]['messages'], gemini_client, current_model)
-                chat_sessions[client_id]["messages"] = []
+                close_ia_session(client_id)
+                conn.send(FRAME_RESPONSE, "ia-deactivate")
+                break
+            # Salir sin resumir: el historial sigue en memoria para el próximo IA
+            # y se resume al desconectar (ai_bridge lo usa antes de cada comando)
+            if request.lower() == 'ia-pause':
+                conn.send(FRAME_RESPONSE, "ia-pause")
                 break
             
-            # Control de tamaño
-            if get_size(chat_sessions[client_id]["messages"]) > 104857600:  # 100MB
-                print(f"[SYSTEM] Compactando memoria para {client_id[:8]}")
-                current_model = clients_connected[client_id].get('selected_model', 'gemini-2.0-flash')
-                ai_self_summarize(client_id, chat_sessions[client_id]['messages'], gemini_client, current_model)
-                chat_sessions[client_id]["messages"] = []
-            
-            # Procesar con Gemini
-            try:
-                current_model = clients_connected[client_id].get('selected_model', 'gemini-2.0-flash')
-                
-                # Preparar historial
-                gemini_history = []
-                for msg in chat_sessions[client_id]["messages"]:
-                    gemini_history.append(
-                        types.Content(role=msg["role"], parts=[types.Part(text=msg["content"])])
-                    )
-                
-                # Obtener respuesta
-                if gemini_client:
-                    chat = gemini_client.chats.create(
-                        model=f"models/{current_model}",
-                        history=gemini_history
-                    )
-                    response = chat.send_message(request)
-                    reply = response.text if response.text else "(sin respuesta)"
-                else:
-                    reply = "Error: Gemini no configurado"
-                
-                # Guardar en memoria
-                timestamp = datetime.datetime.now()
-                chat_sessions[client_id]["messages"].append({
-                    "role": "user",
-                    "content": request,
-                    "timestamp": timestamp
-                })
-                chat_sessions[client_id]["messages"].append({
-                    "role": "model",
-                    "content": reply,
-                    "timestamp": timestamp
-                })
-                
-                # Persistir en DB
-                save_message(client_id, "user", request)
-                save_message(client_id, "model", reply)
+            on_status = lambda text: conn.send(FRAME_STATUS, text)
+            if STREAM_REPLIES:
+                # Reenviar cada fragmento apenas llega y cerrar con FRAME_END
+                process_ia_message(client_id, request, lambda text: conn.send(FRAME_CHUNK, text), on_status)
+                conn.send(FRAME_END)
+            else:
+                reply = process_ia_message(client_id, request, on_status=on_status)
                 
-            except Exception as e:
-                reply = f"[ERROR]: {str(e)}"
-            
-            # Enviar respuesta
-            conn.sendall(reply.encode())
-            
+                # Enviar respuesta (un solo frame, sin truncar)
+                conn.send(FRAME_RESPONSE, reply)
+    
+    except ConnectionTimeout:
+        raise  # La conexión se cierra en el handler
     except Exception as e:
-        print(f"[ERROR] Sesión IA {client_id[:8]}: {e}")
+        metrics.inc("errors", kind=type(e).__name__)
+        log.error("Sesión IA interrumpida", client=client_id[:8], error=e)
+
+def build_commands(client_id):
+    """Diccionario de comandos del cliente (cada uno recibe el texto tras el nombre)"""
+    return {
+        "INFO": lambda args: get_connection_info(client_id, clients_connected),
+        "CHANGE-MODEL": lambda args: change_model_command(client_id, clients_connected, chat_sessions, model_manager),
+        "LIST-MODELS": lambda args: list_models_command(client_id, clients_connected, model_manager),
+        "STATS": lambda args: metrics.render_text(),
+        "CACHE": lambda args: toggle_response_cache(client_id),
+        "SEARCH": lambda args: search_command(client_id, args)
+    }
+
+def parse_command(text):
+    """Separa 'NOMBRE argumentos' en (NOMBRE en mayúsculas, argumentos)"""
+    name, _, args = text.strip().partition(" ")
+    return name.upper(), args.strip()
+
+def toggle_response_cache(client_id):
+    """Activa o desactiva el cache de respuestas para este cliente"""
+    if not response_cache.enabled:
+        return "Cache de respuestas deshabilitado en el servidor (RESPONSE_CACHE=off)"
+    client = clients_connected[client_id]
+    client['use_cache'] = not client.get('use_cache', True)
+    return f"Cache de respuestas: {'activado' if client['use_cache'] else 'desactivado'} para este cliente"
+
+def unknown_command(cmd):
+    return f"Comando '{cmd}' no reconocido\nComandos: INFO, CHANGE-MODEL, LIST-MODELS, STATS, CACHE, SEARCH <términos>, RESUME <token>, IA"
+
+def welcome_text(client_id):
+    """Saludo con el ID de sesión y su token de reanudación"""
+    return f"ID:{client_id[:12]}\nConectado a {IP_SERVER}:{PORT_SERVER}\n{TOKEN_PREFIX}{issue_token(client_id)}"
+
+def register_client(conn, addr, client_id=None):
+    """Registra la conexión bajo un ID nuevo (o el de una sesión reanudada) y lo retorna
+    
+    Si la sesión seguía asociada a otra conexión (el cliente se reconectó antes
+    de que se detectara la caída), esa conexión se corta: la nueva la reemplaza.
+    """
+    client_id = client_id or create_client_id()
+    # El registro compartido conserva el modelo elegido aunque conecte por otro worker
+    saved_model = register_session(client_id, addr[0], addr[1])
+    with sessions_lock:
+        previous = clients_connected.get(client_id) or parked_sessions.claim(client_id) or {}
+        clients_connected[client_id] = {
+            'conn': conn,
+            'ip': addr[0],
+            'port': addr[1],
+            'connectedAt': datetime.datetime.now(),
+            'selected_model': previous.get('selected_model') or saved_model or 'gemini-2.0-flash',
+            'use_cache': previous.get('use_cache', True)
+        }
+    if previous.get('conn') is not None:
+        log.info("Conexión reemplazada por una reanudación", client=client_id[:8])
+        previous['conn'].abort()
+    return client_id
+
+def release_client(client_id, conn):
+    """Desregistra la conexión; si deja historial en memoria, la sesión queda en espera"""
+    with sessions_lock:
+        client = clients_connected.get(client_id)
+        if client is None or client['conn'] is not conn:
+            return  # La sesión ya pasó a otra conexión
+        del clients_connected[client_id]
+        
+        session = chat_sessions.get(client_id)
+        if session is not None and len(session):
+            parked_sessions.park(client_id, {key: value for key, value in client.items() if key != 'conn'})
+        else:
+            chat_sessions.pop(client_id, None)
+    close_session(client_id)
+
+def resume_client(conn, addr, client_id, token):
+    """RESUME <token>: asocia la conexión a la sesión del token; retorna (ID, respuesta)"""
+    resumed_id = verify_token(token)
+    if resumed_id is None:
+        metrics.inc("resumes", mode="invalid")
+        return client_id, "Error: token de sesión inválido o vencido"
+    
+    if resumed_id != client_id:
+        release_client(client_id, conn)
+        if client_id not in chat_sessions:
+            # La sesión de esta conexión quedó vacía: su fila no le sirve a nadie
+            discard_session(client_id)
+        register_client(conn, addr, resumed_id)
+    
+    session = chat_sessions.get(resumed_id)
+    mode = "warm" if session is not None and len(session) else "cold"
+    metrics.inc("resumes", mode=mode)
+    log.info("Sesión reanudada", client=resumed_id[:8], mode=mode)
+    return resumed_id, f"RESUMED:{mode}\nID:{resumed_id[:12]}\n{TOKEN_PREFIX}{issue_token(resumed_id)}"
+
+def expire_parked_sessions(everything=False):
+    """Resume y saca de la RAM las sesiones en espera vencidas (o todas, al apagar)"""
+    with sessions_lock:
+        expired = [(client_id, client, chat_sessions.pop(client_id, None))
+                   for client_id, client in parked_sessions.expired(everything)]
+    
+    for client_id, client, session in expired:
+        if session is not None and len(session):
+            log.info("Sesión en espera vencida", client=client_id[:8], messages=len(session))
+            current_model = client.get('selected_model', 'gemini-2.0-flash')
+            summary_worker.submit(client_id, session.drain(), gemini_client, current_model, PRIORITY_DEACTIVATE)
+
+def start_session_reaper(interval=SESSION_REAP_INTERVAL):
+    """Revisa periódicamente las sesiones en espera en un hilo daemon"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                expire_parked_sessions()
+            except Exception as e:
+                log.error("Falló la expiración de sesiones", error=e)
+    
+    thread = threading.Thread(target=loop, name="session-reaper", daemon=True)
+    thread.start()
+    return thread
+
+def accept_hello(conn, frame):
+    """Aplica la compresión pedida en un HELLO; retorna las flags de la respuesta"""
+    conn.codec = negotiate(frame.flags, frame.payload)
+    return conn.codec.flags if conn.codec else 0
 
 def client_handler(conn, addr, client_id):
     """Maneja conexión de cliente"""
-    conn.sendall(f"ID:{client_id[:12]}\nConectado a {IP_SERVER}:{PORT_SERVER}".encode())
+    # Las flags del saludo anuncian los códecs de compresión disponibles
+    conn.send(FRAME_WELCOME, welcome_text(client_id), flags=available_codecs())
     
     # Diccionario de comandos
-    COMMANDS = {
-        "INFO": lambda: get_connection_info(client_id, clients_connected),
-        "CHANGE-MODEL": lambda: change_model_command(client_id, clients_connected, chat_sessions, model_manager),
-        "LIST-MODELS": lambda: list_models_command(client_id, clients_connected, model_manager)
-    }
+    COMMANDS = build_commands(client_id)
     
     try:
-        while True:
-            data = conn.recv(1024)
-            if not data:
+        while connection_tracker.idle(conn):
+            frame = conn.recv()
+            if frame is None:
                 break
+            connection_tracker.busy(conn)
+            
+            if frame.type == FRAME_HELLO:
+                conn.send(FRAME_HELLO, flags=accept_hello(conn, frame))
+                continue
+            
+            if frame.type == FRAME_PING:
+                conn.send(FRAME_PING)
+                continue
             
-            cmd = data.decode().strip().upper()
+            if frame.type != FRAME_COMMAND:
+                conn.send(FRAME_ERROR, f"Tipo de frame inesperado: {frame.type}")
+                continue
+            
+            cmd, args = parse_command(frame.text)
+            metrics.inc("commands", command=cmd if cmd in COMMANDS or cmd in ("IA", "RESUME") else "unknown")
             
             # Modo IA
             if cmd == "IA":
                 ia_activate(conn, client_id)
                 continue
             
+            # Reanudar otra sesión: cambia el ID de esta conexión
+            if cmd == "RESUME":
+                client_id, response = resume_client(conn, addr, client_id, args)
+                COMMANDS = build_commands(client_id)
+                conn.send(FRAME_RESPONSE, response)
+                continue
+            
             # Comandos normales
             handler = COMMANDS.get(cmd)
             if handler:
-                response = handler()
+                response = handler(args)
             else:
-                response = f"Comando '{cmd}' no reconocido\nComandos: INFO, CHANGE-MODEL, LIST-MODELS, IA"
+                response = unknown_command(cmd)
             
-            conn.sendall(response.encode())
+            conn.send(FRAME_RESPONSE, response)
+    
+    except ConnectionTimeout as e:
+        metrics.inc("connections_timed_out", kind=e.kind)
+        log.info("Conexión cerrada por timeout", client=client_id[:8], kind=e.kind)
+    except Exception as e:
+        metrics.inc("errors", kind=type(e).__name__)
+        log.error("Conexión de cliente interrumpida", client=client_id[:8], error=e)
+    finally:
+        # Limpiar al desconectar (la sesión queda en espera si tiene historial)
+        release_client(client_id, conn)
+        conn.close()
+        metrics.gauge_add("connections_active", -1)
+        log.info("Cliente desconectado", client=client_id[:8])
+
+async def ia_activate_async(stream, client_id):
+    """Modo IA como corrutina; las llamadas bloqueantes van al executor"""
+    loop = asyncio.get_running_loop()
+    await stream.send(FRAME_RESPONSE, "ia-activate")
+    
+    # Cargar contexto previo
+    await loop.run_in_executor(None, load_ia_context, client_id)
+    
+    try:
+        while connection_tracker.idle(stream):
+            frame = await stream.recv()
+            if frame is None:
+                break
+            connection_tracker.busy(stream)
             
+            if frame.type == FRAME_PING:
+                await stream.send(FRAME_PING)
+                continue
+            
+            if frame.type != FRAME_COMMAND:
+                await stream.send(FRAME_ERROR, f"Tipo de frame inesperado: {frame.type}")
+                continue
+            
+            request = frame.text.strip()
+            
+            # Salir del modo IA
+            if request.lower() == 'ia-deactivate':
+                await loop.run_in_executor(None, close_ia_session, client_id)
+                await stream.send(FRAME_RESPONSE, "ia-deactivate")
+                break
+            if request.lower() == 'ia-pause':
+                await stream.send(FRAME_RESPONSE, "ia-pause")
+                break
+            
+            # Fragmentos y avisos se producen en el executor y se escriben desde el loop
+            request_id = frame.request_id
+            on_status = lambda text: loop.call_soon_threadsafe(stream.write, FRAME_STATUS, text, request_id)
+            if STREAM_REPLIES:
+                on_chunk = lambda text: loop.call_soon_threadsafe(stream.write, FRAME_CHUNK, text, request_id)
+                await loop.run_in_executor(None, process_ia_message, client_id, request, on_chunk, on_status)
+                await stream.send(FRAME_END, b"", request_id)
+            else:
+                reply = await loop.run_in_executor(None, process_ia_message, client_id, request, None, on_status)
+                await stream.send(FRAME_RESPONSE, reply)
+    
+    except ConnectionTimeout:
+        raise  # La conexión se cierra en el handler
+    except Exception as e:
+        metrics.inc("errors", kind=type(e).__name__)
+        log.error("Sesión IA interrumpida", client=client_id[:8], error=e)
+
+async def client_handler_async(reader, writer, ssl_context=None):
+    """Maneja una conexión en el servidor asyncio"""
+    stream = AsyncFramedStream(reader, writer, IDLE_TIMEOUT, READ_TIMEOUT)
+    addr = writer.get_extra_info("peername")
+    
+    # asyncio entrega la conexión con el handshake TLS ya hecho: se rechaza con un frame ERROR
+    reason = connection_tracker.admit(addr[0])
+    if reason:
+        metrics.inc("errors", kind="connection_limit")
+        log.warning("Conexión rechazada", addr=addr[0], reason=reason)
+        await stream.send(FRAME_ERROR, REJECT_MESSAGES[reason])
+        await stream.close()
+        return
+    
+    tune_socket(writer.get_extra_info("socket"))
+    if not connection_tracker.attach(stream):
+        connection_tracker.release(addr[0], stream)
+        await stream.close()
+        return
+    
+    if ssl_context:
+        session_reused = writer.get_extra_info("ssl_object").session_reused
+        log_security.info("TLS establecido", addr=addr[0], resumed=session_reused)
+    
+    # El registro consulta SQLite: fuera del loop, como el resto de la DB
+    loop = asyncio.get_running_loop()
+    client_id = await loop.run_in_executor(None, register_client, stream, addr)
+    metrics.inc("connections")
+    metrics.gauge_add("connections_active", 1)
+    log.info("Cliente conectado", client=client_id[:8], addr=f"{addr[0]}:{addr[1]}")
+    
+    COMMANDS = build_commands(client_id)
+    
+    try:
+        await stream.send(FRAME_WELCOME, welcome_text(client_id), flags=available_codecs())
+        
+        while connection_tracker.idle(stream):
+            frame = await stream.recv()
+            if frame is None:
+                break
+            connection_tracker.busy(stream)
+            
+            if frame.type == FRAME_HELLO:
+                await stream.send(FRAME_HELLO, flags=accept_hello(stream, frame))
+                continue
+            
+            if frame.type == FRAME_PING:
+                await stream.send(FRAME_PING)
+                continue
+            
+            if frame.type != FRAME_COMMAND:
+                await stream.send(FRAME_ERROR, f"Tipo de frame inesperado: {frame.type}")
+                continue
+            
+            cmd, args = parse_command(frame.text)
+            metrics.inc("commands", command=cmd if cmd in COMMANDS or cmd in ("IA", "RESUME") else "unknown")
+            
+            # Modo IA
+            if cmd == "IA":
+                await ia_activate_async(stream, client_id)
+                continue
+            
+            if cmd == "RESUME":
+                client_id, response = await loop.run_in_executor(None, resume_client, stream, addr, client_id, args)
+                COMMANDS = build_commands(client_id)
+                await stream.send(FRAME_RESPONSE, response)
+                continue
+            
+            # El menú interactivo necesita leer del stream
+            if cmd == "CHANGE-MODEL":
+                response = await change_model_command_async(client_id, clients_connected, chat_sessions, model_manager)
+            else:
+                handler = COMMANDS.get(cmd)
+                if handler:
+                    response = await loop.run_in_executor(None, handler, args)
+                else:
+                    response = unknown_command(cmd)
+            
+            await stream.send(FRAME_RESPONSE, response)
+    
+    except ConnectionTimeout as e:
+        metrics.inc("connections_timed_out", kind=e.kind)
+        log.info("Conexión cerrada por timeout", client=client_id[:8], kind=e.kind)
     except Exception as e:
-        print(f"[ERROR] Cliente {client_id[:8]}: {e}")
+        metrics.inc("errors", kind=type(e).__name__)
+        log.error("Conexión de cliente interrumpida", client=client_id[:8], error=e)
+    finally:
+        release_client(client_id, stream)
+        await stream.close()
+        # Después del cierre: el drenado espera también el cierre TLS
+        connection_tracker.release(addr[0], stream)
+        metrics.gauge_add("connections_active", -1)
+        log.info("Cliente desconectado", client=client_id[:8])
+
+async def serve_async(ssl_context, reuse_port=False, ready=None):
+    """Bucle principal del servidor asyncio (hasta SIGTERM / Ctrl+C, luego drena)"""
+    loop = asyncio.get_running_loop()
+    
+    # Las señales detienen el servidor de forma ordenada en lugar de cortar el loop
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        if signal.getsignal(signum) is signal.SIG_IGN:
+            continue  # Los workers prefork solo atienden el SIGTERM del supervisor
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Sin soporte (Windows): Ctrl+C corta el loop sin drenar
+    
+    # Executor acotado para Gemini y SQLite
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="blocking"))
+    
+    # Los handshakes TLS corren concurrentes en el loop, con timeout
+    if ssl_context:
+        instrument_async_context(ssl_context)
+    
+    server = await asyncio.start_server(
+        lambda reader, writer: client_handler_async(reader, writer, ssl_context),
+        IP_SERVER,
+        PORT_SERVER,
+        ssl=ssl_context,
+        ssl_handshake_timeout=TLS_HANDSHAKE_TIMEOUT if ssl_context else None,
+        backlog=LISTEN_BACKLOG,
+        reuse_address=True,
+        reuse_port=reuse_port or None
+    )
+    
+    log.info("Escuchando conexiones", mode="asyncio", max_connections=connection_tracker.max_total,
+             max_per_ip=connection_tracker.max_per_ip, executor=EXECUTOR_WORKERS)
+    if ready:
+        ready.set()
+    async with server:
+        await stop.wait()
+        log.info("Deteniendo servidor")
+        server.close()
+        await drain_connections_async()
+
+async def drain_connections_async(timeout=DRAIN_TIMEOUT):
+    """Igual que drain_connections, en el loop (el cierre de conexiones no es thread-safe)"""
+    in_flight = connection_tracker.begin_drain()
+    log.info("Drenando conexiones", active=connection_tracker.active(), in_flight=in_flight)
+    deadline = time.monotonic() + timeout
+    while connection_tracker.active() and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
+    if connection_tracker.active():
+        log.warning("Drenado vencido, cortando conexiones", remaining=connection_tracker.abort_all())
+
+def drain_connections(timeout=DRAIN_TIMEOUT):
+    """Corta las conexiones ociosas y espera a que terminen los pedidos en curso
+    
+    Cada handler cierra su conexión al terminar el pedido; al liberarla, su
+    sesión queda en espera y se resume con el resto al apagar.
+    """
+    in_flight = connection_tracker.begin_drain()
+    log.info("Drenando conexiones", active=connection_tracker.active(), in_flight=in_flight)
+    if not connection_tracker.wait_drained(timeout):
+        log.warning("Drenado vencido, cortando conexiones", remaining=connection_tracker.abort_all())
+        connection_tracker.wait_drained(1)
+
+def handle_connection(conn, addr, ssl_context):
+    """Handshake TLS con timeout, registro y atención del cliente (hilo propio)"""
+    try:
+        tune_socket(conn)
+        
+        # Aplicar TLS si está configurado
+        if USE_TLS and ssl_context:
+            try:
+                conn = server_handshake(conn, ssl_context)
+                log_security.info("TLS establecido", addr=addr[0], resumed=conn.session_reused)
+            except Exception as e:
+                metrics.inc("errors", kind="tls_handshake")
+                log_security.error("Fallo TLS", addr=addr[0], error=e)
+                conn.close()
+                return
+        
+        conn = FramedSocket(conn, IDLE_TIMEOUT, READ_TIMEOUT)
+        
+        # El servidor empezó a detenerse durante el handshake
+        if not connection_tracker.attach(conn):
+            conn.close()
+            return
+        
+        # Registrar cliente
+        client_id = register_client(conn, addr)
+        metrics.inc("connections")
+        metrics.gauge_add("connections_active", 1)
+        log.info("Cliente conectado", client=client_id[:8], addr=f"{addr[0]}:{addr[1]}")
+        
+        client_handler(conn, addr, client_id)
+    finally:
+        connection_tracker.release(addr[0], conn)
+
+def reject_connection(conn, addr, reason, ssl_context):
+    """Cierra una conexión que excede los límites, sin hilo ni handshake
+    
+    Sin TLS se avisa con un frame ERROR; con TLS el aviso costaría el
+    handshake que el límite intenta evitar, así que solo se cierra.
+    """
+    metrics.inc("errors", kind="connection_limit")
+    log.warning("Conexión rechazada", addr=addr[0], reason=reason)
+    try:
+        if not ssl_context:
+            conn.settimeout(0)
+            FramedSocket(conn).send(FRAME_ERROR, REJECT_MESSAGES[reason])
+    except OSError:
+        pass
     finally:
-        # Limpiar al desconectar
-        if client_id in clients_connected:
-            del clients_connected[client_id]
         conn.close()
-        print(f"[SYSTEM] Cliente {client_id[:8]} desconectado")
 
-def start_server():
-    """Inicia el servidor"""
-    print(f"[SYSTEM] Iniciando servidor en {IP_SERVER}:{PORT_SERVER}")
-    print(f"[SYSTEM] TLS: {'HABILITADO' if USE_TLS else 'DESHABILITADO'}")
+def serve_threads(ssl_context, reuse_port=False, ready=None):
+    """Bucle principal del servidor con un hilo por conexión"""
+    # Crear socket
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
+        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuse_port:
+            # Varios workers escuchan en el mismo puerto; el kernel reparte las conexiones
+            server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        server_socket.bind((IP_SERVER, PORT_SERVER))
+        server_socket.listen(LISTEN_BACKLOG)
+        
+        log.info("Escuchando conexiones", mode="threads", max_connections=connection_tracker.max_total,
+                 max_per_ip=connection_tracker.max_per_ip)
+        if ready:
+            ready.set()
+        
+        try:
+            while True:
+                conn, addr = server_socket.accept()
+                
+                # Sobre los límites se rechaza antes de crear el hilo
+                reason = connection_tracker.admit(addr[0])
+                if reason:
+                    reject_connection(conn, addr, reason, ssl_context)
+                    continue
+                
+                # Iniciar hilo (el handshake TLS se hace ahí, no en el bucle de accept)
+                thread = threading.Thread(
+                    target=handle_connection,
+                    args=(conn, addr, ssl_context),
+                    daemon=True
+                )
+                thread.start()
+        except KeyboardInterrupt:
+            log.info("Deteniendo servidor")
     
+    # Socket de escucha cerrado: terminar lo que está en curso
+    drain_connections()
+
+def run_server(reuse_port=False, ready=None, metrics_port=METRICS_PORT):
+    """Atiende conexiones en este proceso hasta Ctrl+C / SIGTERM"""
     # Configurar TLS
     ssl_context = None
     if USE_TLS:
         ssl_context = create_ssl_context()
         if not ssl_context:
-            print("[WARNING] Continuando sin TLS")
+            log.warning("Continuando sin TLS")
     
     # Cargar modelos si hay Gemini
     if model_manager:
         models = model_manager.get_available_models()
-        print(f"[SYSTEM] {len(models)} modelos cargados")
+        log.info("Modelos cargados", count=len(models))
     
-    # Crear socket
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-        server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server_socket.bind((IP_SERVER, PORT_SERVER))
-        server_socket.listen(5)
+    # Métricas en formato Prometheus (solo si METRICS_PORT > 0)
+    if start_metrics_server(port=metrics_port):
+        log.info("Métricas disponibles", url=f"http://{METRICS_HOST}:{metrics_port}/metrics")
+    
+    start_session_reaper()
+    
+    try:
+        if SERVER_MODE == "asyncio":
+            asyncio.run(serve_async(ssl_context, reuse_port, ready))
+        else:
+            serve_threads(ssl_context, reuse_port, ready)
+    except KeyboardInterrupt:
+        log.info("Deteniendo servidor")
+    finally:
+        # Las sesiones en espera ya no se van a reanudar: resumirlas
+        expire_parked_sessions(everything=True)
         
-        print(f"[SYSTEM] Escuchando conexiones...")
+        # No perder resúmenes pendientes al apagar
+        pending = summary_worker.pending_count()
+        if pending:
+            log.info("Esperando resúmenes pendientes", pending=pending)
+        summary_worker.shutdown(SHUTDOWN_TIMEOUT)
         
-        while True:
-            conn, addr = server_socket.accept()
-            
-            # Aplicar TLS si está configurado
-            if USE_TLS and ssl_context:
-                try:
-                    conn = ssl_context.wrap_socket(conn, server_side=True)
-                    print(f"[SECURITY] TLS establecido con {addr[0]}")
-                except Exception as e:
-                    print(f"[ERROR] Fallo TLS: {e}")
-                    conn.close()
-                    continue
-            
-            # Registrar cliente
-            client_id = create_client_id(addr[0])
-            clients_connected[client_id] = {
-                'conn': conn,
-                'ip': addr[0],
-                'port': addr[1],
-                'connectedAt': datetime.datetime.now(),
-                'selected_model': 'gemini-2.0-flash'
-            }
-            
-            # Iniciar hilo
-            thread = threading.Thread(
-                target=client_handler,
-                args=(conn, addr, client_id),
-                daemon=True
-            )
-            thread.start()
-            
-            print(f"[SYSTEM] Cliente {client_id[:8]} conectado desde {addr[0]}:{addr[1]}")
+        # Confirmar las escrituras diferidas
+        db_writer.close(SHUTDOWN_TIMEOUT)
+
+def stop_on_sigterm(signum, frame):
+    # Solo la primera señal detiene: una segunda no debe cortar el drenado
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    raise KeyboardInterrupt
+
+def worker_main(index, ready):
+    """Proceso worker del modo prefork (lo arranca el supervisor con spawn)"""
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    # Ctrl+C llega a todo el grupo de procesos: el worker espera el SIGTERM del supervisor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # MAX_CONNECTIONS y MAX_CONNECTIONS_PER_IP son del servidor: cada worker aplica su parte
+    connection_tracker.max_total, connection_tracker.max_per_ip = worker_limits(SERVER_WORKERS)
+    # Cada worker expone sus métricas en su propio puerto
+    run_server(reuse_port=True, ready=ready, metrics_port=METRICS_PORT + index if METRICS_PORT else 0)
+
+def start_server():
+    """Inicia el servidor"""
+    log.info("Iniciando servidor", addr=f"{IP_SERVER}:{PORT_SERVER}", tls=USE_TLS, workers=SERVER_WORKERS)
+    
+    # Ninguna conexión sigue abierta de una ejecución anterior
+    close_stale_sessions()
+    
+    # Retención periódica de messages y del registro de sesiones (una sola vez)
+    start_retention_worker()
+    
+    if SERVER_WORKERS > 1 and hasattr(socket, "SO_REUSEPORT"):
+        Supervisor(worker_main, SERVER_WORKERS, on_exit=release_worker).run()
+        db_writer.close(SHUTDOWN_TIMEOUT)
+        return
+    
+    if SERVER_WORKERS > 1:
+        log.warning("SO_REUSEPORT no disponible en esta plataforma; se usa un solo proceso")
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, stop_on_sigterm)
+    run_server()
 
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    start_server()
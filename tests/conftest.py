@@ -0,0 +1,95 @@
+# tests/conftest.py
+"""
+Configuración común de las pruebas
+
+Los módulos leen el entorno al importarse: la base temporal y el backend
+falso se fijan aquí, antes de importar nada del proyecto.
+"""
+import os
+import sys
+import socket
+import tempfile
+import subprocess
+import time
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DIR = tempfile.mkdtemp(prefix="ai_bridge_tests_")
+
+os.environ.update({
+    "DB_PATH": os.path.join(TEST_DIR, "tests.db"),
+    "MODEL_BACKEND": "fake",
+    "FAKE_LATENCY_MS": "0",
+    "FAKE_CHUNK_DELAY_MS": "0",
+    "RESPONSE_CACHE": "memory",
+    "SESSION_SECRET": "tests",
+    "METRICS_PORT": "0",
+})
+sys.path.insert(0, ROOT)
+
+SERVER_START_TIMEOUT = 20  # segundos
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def launch_server(**env):
+    """Arranca server.py (sin TLS) en un puerto libre; retorna (proceso, puerto)
+    
+    `env` agrega o reemplaza variables de entorno (SERVER_WORKERS, límites...).
+    """
+    port = free_port()
+    env = dict(
+        os.environ,
+        IP_SERVER="127.0.0.1",
+        PORT_SERVER=str(port),
+        USE_TLS="false",
+        DB_PATH=os.path.join(TEST_DIR, "server.db"),
+        **env
+    )
+    process = subprocess.Popen(
+        [sys.executable, "server.py"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process, port
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                pytest.fail("El servidor de pruebas no arrancó")
+            time.sleep(0.1)
+
+def stop_server(process):
+    """SIGTERM y espera al drenado; retorna el código de salida"""
+    process.terminate()
+    try:
+        return process.wait(SERVER_START_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        return process.wait()
+
+@pytest.fixture(scope="session")
+def server_address():
+    """Servidor real (modo threads, sin TLS) en un proceso aparte; retorna (host, puerto)"""
+    process, port = launch_server()
+    yield "127.0.0.1", port
+    stop_server(process)
+
+@pytest.fixture
+def start_server():
+    """Arranca servidores con su propia configuración; se detienen al terminar la prueba"""
+    started = []
+    
+    def start(**env):
+        process, port = launch_server(**env)
+        started.append(process)
+        return process, port
+    
+    yield start
+    for process in started:
+        if process.poll() is None:
+            stop_server(process)
@@ -0,0 +1,68 @@
+# tests/test_batch.py
+"""Modo batch del cliente: entrada texto/JSONL, pipelining y resultados JSONL"""
+import io
+import os
+import sys
+import json
+import argparse
+import subprocess
+from client import parse_batch_line, BatchResults, BatchRun
+from conftest import ROOT
+
+def batch_args(host, port, **overrides):
+    options = dict(host=host, port=port, tls=False, timeout=30, compression=True, mode="ia", format="auto",
+                   depth=4, connections=2)
+    options.update(overrides)
+    return argparse.Namespace(**options)
+
+def run(args, lines):
+    output = io.StringIO()
+    results = BatchResults(output)
+    BatchRun(args, results).run(io.StringIO("".join(line + "\n" for line in lines)))
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    return sorted(records, key=lambda record: record["index"]), results
+
+def test_parse_batch_line():
+    assert parse_batch_line(1, "  \n", "auto") is None
+    assert parse_batch_line(2, "hola\n", "auto").prompt == "hola"
+    item = parse_batch_line(3, '{"id": "a", "prompt": "hola"}', "auto")
+    assert (item.id, item.prompt, item.error) == ("a", "hola", None)
+    assert parse_batch_line(4, '{"id": "a"}', "jsonl").error.startswith("Línea inválida")
+    assert parse_batch_line(5, "{roto", "auto").error.startswith("Línea inválida")
+    assert parse_batch_line(6, '{"prompt": "x"}', "text").prompt == '{"prompt": "x"}'
+
+def test_ia_prompts_are_pipelined_over_the_pool(server_address):
+    host, port = server_address
+    lines = [f"pregunta numero {i}" for i in range(10)] + ['{"id": "json", "prompt": "otra"}', "{roto", ""]
+    records, results = run(batch_args(host, port), lines)
+    
+    assert [record["index"] for record in records] == list(range(1, 13))
+    answered = records[:11]
+    assert all(record["response"] and record["latency_ms"] >= 0 for record in answered)
+    assert answered[10]["id"] == "json"
+    assert {record["connection"] for record in answered} <= {0, 1}
+    assert records[11]["error"].startswith("Línea inválida") and records[11]["connection"] is None
+    assert (len(results.latencies), results.errors) == (11, 1)
+
+def test_pipelined_replies_match_their_requests(server_address):
+    host, port = server_address
+    lines = [f"SEARCH termino{i}" for i in range(12)]
+    records, _ = run(batch_args(host, port, mode="command", depth=4, connections=1), lines)
+    # Cada respuesta llega con el request_id de su comando, aunque haya 4 en vuelo
+    for i, record in enumerate(records):
+        assert record["response"] == f"Sin resultados para: termino{i}"
+        assert record["connection"] == 0
+
+def test_lost_server_reports_every_prompt(tmp_path):
+    # Nadie escucha en el puerto: cada prompt termina con error y el proceso sale
+    source = tmp_path / "prompts.txt"
+    source.write_text("uno\ndos\n", encoding="utf-8")
+    result = subprocess.run(
+        [sys.executable, "client.py", "--batch", str(source), "--no-tls", "--host", "127.0.0.1", "--port", "1",
+         "--connections", "2"],
+        cwd=ROOT, capture_output=True, text=True, timeout=60, env=dict(os.environ, SESSION_TOKEN_FILE="")
+    )
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    assert sorted(record["prompt"] for record in records) == ["dos", "uno"]
+    assert all(record["error"] == "Sin conexiones disponibles" for record in records)
+    assert "0 respuestas, 2 errores" in result.stderr
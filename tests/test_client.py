@@ -0,0 +1,112 @@
+# tests/test_client.py
+"""Lógica compartida del cliente (sin E/S) y los dos transportes contra el servidor"""
+import time
+import sqlite3
+import asyncio
+import pytest
+from core.protocol import Frame, FRAME_RESPONSE, FRAME_PROMPT, FRAME_ERROR, FRAME_CHUNK, FRAME_END, FRAME_STATUS
+from ai_bridge import Client, AsyncClient, BridgeSession, BridgeError
+from ai_bridge.connection import Emit, RECV
+from conftest import TEST_DIR
+
+MENU = "Elegí un modelo:\n 1. gemini-2.0-flash\n 2. gemini-2.5-flash\n 0. Cancelar"
+
+def run(operation, replies):
+    """Ejecuta una operación respondiendo a cada envío con `replies`; retorna (enviados, emitidos, resultado)
+    
+    Cada respuesta es una lista de (tipo, texto) para el request_id del envío.
+    """
+    sent, emitted, inbox = [], [], []
+    replies = iter(replies)
+    result = None
+    while True:
+        try:
+            action = operation.send(result)
+        except StopIteration as done:
+            return sent, emitted, done.value
+        result = None
+        if isinstance(action, Emit):
+            emitted.append(action.text)
+        elif action is RECV:
+            result = inbox.pop(0)
+        else:
+            sent.append(action.payload)
+            request_id = len(sent)
+            inbox.extend(Frame(frame_type, 0, request_id, text.encode()) for frame_type, text in next(replies))
+            result = request_id
+
+def test_change_model_picks_the_menu_option():
+    session = BridgeSession()
+    sent, _, result = run(session.change_model("gemini-2.5-flash"),
+                          [[(FRAME_PROMPT, MENU)], [(FRAME_RESPONSE, "✅ Modelo cambiado")]])
+    assert sent == ["CHANGE-MODEL", "2"]
+    assert result == "✅ Modelo cambiado"
+
+def test_change_model_closes_the_menu_when_the_model_is_missing():
+    session = BridgeSession()
+    operation = session.change_model("otro")
+    with pytest.raises(BridgeError):
+        run(operation, [[(FRAME_PROMPT, MENU)], [(FRAME_RESPONSE, "Cancelado")]])
+
+def test_ask_enters_ia_mode_once_and_streams_the_pieces():
+    session = BridgeSession()
+    statuses = []
+    turn = [(FRAME_STATUS, "en cola"), (FRAME_CHUNK, "ho"), (FRAME_CHUNK, "la"), (FRAME_END, "")]
+    sent, emitted, _ = run(session.ask("hola", statuses.append), [[(FRAME_RESPONSE, "ia-activate")], turn])
+    assert sent == ["IA", "hola"]
+    assert emitted == ["ho", "la"]
+    assert statuses == ["en cola"]
+    assert session.ia_mode
+    
+    # Un comando posterior sale antes del modo IA, sin pedir un resumen
+    sent, _, _ = run(session.info(), [[(FRAME_RESPONSE, "ia-pause")], [(FRAME_RESPONSE, "info")]])
+    assert sent == ["ia-pause", "INFO"]
+    assert not session.ia_mode
+    
+    sent, _, _ = run(session.enter_ia(), [[(FRAME_RESPONSE, "ia-activate")]])
+    sent, _, _ = run(session.leave_ia(), [[(FRAME_RESPONSE, "ia-deactivate")]])
+    assert sent == ["ia-deactivate"]
+
+def test_server_error_is_raised():
+    session = BridgeSession()
+    with pytest.raises(BridgeError, match="sin cuota"):
+        run(session.search("x"), [[(FRAME_ERROR, "sin cuota")]])
+
+def test_sync_and_async_clients_agree(server_address):
+    host, port = server_address
+    with Client(host, port, use_tls=False, resume=False) as client:
+        models, current = client.list_models()
+        assert current in models
+        reply = client.ask("hola")
+    
+    async def async_turn():
+        async with AsyncClient(host, port, use_tls=False, resume=False) as client:
+            assert (await client.list_models()) == (models, current)
+            reply = await client.ask("hola")
+            assert client.ia_mode
+            assert await client.ping()
+            return reply
+    
+    assert asyncio.run(async_turn()) and reply
+
+def server_summaries(client_id):
+    """Resúmenes guardados por el servidor de pruebas para la sesión"""
+    with sqlite3.connect(f"{TEST_DIR}/server.db") as conn:
+        return conn.execute("SELECT COUNT(*) FROM summaries WHERE client_id = ?", (client_id,)).fetchone()[0]
+
+def test_commands_between_turns_do_not_summarize(server_address):
+    host, port = server_address
+    with Client(host, port, use_tls=False, resume=False) as client:
+        client_id = client.token.split(".")[0]
+        client.ask("hola")
+        client.info()
+        client.ask("seguimos")
+        time.sleep(0.3)
+        assert server_summaries(client_id) == 0
+        
+        # Salir explícitamente sí guarda el resumen de los dos turnos
+        client.leave_ia()
+        deadline = time.monotonic() + 5
+        while not server_summaries(client_id):
+            assert time.monotonic() < deadline, "no se guardó el resumen"
+            time.sleep(0.05)
@@ -0,0 +1,107 @@
+# tests/test_compression.py
+"""Compresión negociada (HELLO) y límites de descompresión"""
+import os
+import zlib
+import socket
+import pytest
+from core import protocol, compression
+from core.compression import (Codec, FLAG_ZLIB, FLAG_ZSTD, FLAG_DICT, FLAG_COMPRESSED, DICT_ID, DICTIONARY_ID,
+                              decompress, negotiate, hello_payload)
+from core.protocol import FramedSocket, ProtocolError, FRAME_COMMAND, encode_frame, decode_payload
+from ai_bridge import open_connection
+
+@pytest.fixture
+def pair():
+    left, right = socket.socketpair()
+    yield FramedSocket(left), FramedSocket(right)
+    left.close()
+    right.close()
+
+def test_compressed_round_trip(pair):
+    client, server = pair
+    client.codec = Codec(FLAG_ZLIB, use_dict=True, min_bytes=0)
+    server.codec = Codec(FLAG_ZLIB, use_dict=True, min_bytes=0)
+    client.send(FRAME_COMMAND, "repetido " * 500)
+    assert server.recv().text == "repetido " * 500
+
+def test_compressed_frame_without_negotiation():
+    payload = zlib.compress(b"hola")
+    with pytest.raises(ProtocolError):
+        decode_payload(payload, FLAG_COMPRESSED | FLAG_ZLIB, codec=None)
+    # Otro códec que el negociado también es un error
+    with pytest.raises(ProtocolError):
+        decode_payload(payload, FLAG_COMPRESSED | FLAG_ZSTD, codec=Codec(FLAG_ZLIB, False))
+
+def test_zlib_bomb_is_bounded():
+    bomb = zlib.compress(b"\0" * (8 * 1024 * 1024))
+    with pytest.raises(ValueError):
+        decompress(bomb, FLAG_COMPRESSED | FLAG_ZLIB, 1024 * 1024)
+    assert len(decompress(bomb, FLAG_COMPRESSED | FLAG_ZLIB, 8 * 1024 * 1024)) == 8 * 1024 * 1024
+
+def test_zstd_bomb_is_bounded():
+    zstandard = pytest.importorskip("zstandard")
+    data = b"\0" * (8 * 1024 * 1024)
+    declared = zstandard.ZstdCompressor().compress(data)
+    with pytest.raises(ValueError):
+        decompress(declared, FLAG_COMPRESSED | FLAG_ZSTD, 1024 * 1024)
+    
+    # Sin tamaño en la cabecera (compresión en streaming) también se corta
+    streamed = zstandard.ZstdCompressor(write_content_size=False).compress(data)
+    with pytest.raises(ValueError):
+        decompress(streamed, FLAG_COMPRESSED | FLAG_ZSTD, 1024 * 1024)
+    assert decompress(streamed, FLAG_COMPRESSED | FLAG_ZSTD, len(data)) == data
+
+def test_zstd_bomb_rejected_by_frame_limit(pair, monkeypatch):
+    zstandard = pytest.importorskip("zstandard")
+    monkeypatch.setattr(protocol, "MAX_FRAME_SIZE", 1024 * 1024)
+    client, server = pair
+    server.codec = Codec(FLAG_ZSTD, use_dict=False)
+    bomb = zstandard.ZstdCompressor().compress(b"\0" * (8 * 1024 * 1024))
+    client.sock.sendall(encode_frame(FRAME_COMMAND, bomb, 1, FLAG_COMPRESSED | FLAG_ZSTD))
+    with pytest.raises(ProtocolError):
+        server.recv()
+
+def test_negotiation_prefers_zstd_and_checks_the_dictionary(monkeypatch):
+    monkeypatch.setattr(compression, "COMPRESSION", "auto")
+    both = FLAG_ZLIB | FLAG_ZSTD
+    expected = FLAG_ZSTD if compression.zstandard is not None else FLAG_ZLIB
+    assert negotiate(both, hello_payload()).flags == expected | FLAG_DICT
+    # Otro diccionario: se comprime sin él
+    assert negotiate(both, DICT_ID.pack(DICTIONARY_ID + 1)).flags == expected
+    assert negotiate(FLAG_ZLIB, b"").codec == FLAG_ZLIB
+    assert negotiate(0, hello_payload()) is None
+    
+    monkeypatch.setattr(compression, "COMPRESSION", "zlib")
+    assert negotiate(both, hello_payload()).codec == FLAG_ZLIB
+    monkeypatch.setattr(compression, "COMPRESSION", "off")
+    assert negotiate(both, hello_payload()) is None
+
+def test_small_and_incompressible_payloads_go_raw():
+    codec = Codec(FLAG_ZLIB, use_dict=False, min_bytes=64)
+    assert codec.compress(b"corto") == (b"corto", 0)
+    noise = os.urandom(4096)
+    assert codec.compress(noise) == (noise, 0)
+    data, flags = codec.compress(b"repetido " * 100)
+    assert flags == FLAG_ZLIB | FLAG_COMPRESSED and len(data) < 900
+
+def stats_frame(conn):
+    request_id = conn.send(FRAME_COMMAND, "STATS", conn.next_request_id())
+    frame = conn.recv()
+    assert frame.request_id == request_id
+    return frame
+
+def test_only_clients_that_sent_hello_get_compressed_frames(server_address):
+    host, port = server_address
+    plain, _ = open_connection(host, port, use_tls=False)
+    negotiated, _ = open_connection(host, port, use_tls=False, compression=True)
+    try:
+        assert plain.codec is None and negotiated.codec is not None
+        raw = stats_frame(plain)
+        compressed = stats_frame(negotiated)
+    finally:
+        plain.close()
+        negotiated.close()
+    
+    assert not raw.flags & FLAG_COMPRESSED
+    assert compressed.flags & FLAG_COMPRESSED
+    assert compressed.text.startswith("=== ESTADÍSTICAS DEL SERVIDOR ===")
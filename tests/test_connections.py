@@ -0,0 +1,112 @@
+# tests/test_connections.py
+"""Ciclo de vida de las conexiones: límites, timeouts de lectura y drenado al apagar"""
+import time
+import socket
+import threading
+import pytest
+from ai_bridge import Client, open_connection
+from core.connections import ConnectionTracker, REJECT_MESSAGES
+from conftest import stop_server
+
+MODES = ["threads", "asyncio"]
+
+class FakeConn:
+    def __init__(self):
+        self.aborted = False
+    
+    def abort(self):
+        self.aborted = True
+
+def wait_closed(conn, timeout):
+    """Segundos hasta que el servidor cierra la conexión"""
+    started = time.monotonic()
+    conn.sock.settimeout(timeout)
+    assert conn.recv() is None
+    return time.monotonic() - started
+
+def connect_when_free(port, timeout=5):
+    """Conecta reintentando mientras los lugares de la IP sigan ocupados
+    
+    El servidor libera el lugar al terminar el handler, apenas después de
+    cerrar el socket (incluido el sondeo de arranque de launch_server).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return open_connection("127.0.0.1", port, use_tls=False)[0]
+        except ConnectionError:
+            assert time.monotonic() < deadline, "los lugares no se liberaron"
+            time.sleep(0.05)
+
+def test_tracker_enforces_the_limits():
+    tracker = ConnectionTracker(max_total=3, max_per_ip=2)
+    assert tracker.admit("10.0.0.1") is None
+    assert tracker.admit("10.0.0.1") is None
+    assert tracker.admit("10.0.0.1") == "per_ip"
+    assert tracker.admit("10.0.0.2") is None
+    assert tracker.admit("10.0.0.3") == "total"
+    
+    tracker.release("10.0.0.1")
+    assert tracker.admit("10.0.0.3") is None
+    snapshot = tracker.snapshot()
+    assert (snapshot["active"], snapshot["rejected_per_ip"], snapshot["rejected_total"]) == (3, 1, 1)
+
+def test_drain_cuts_idle_connections_and_waits_for_busy_ones():
+    tracker = ConnectionTracker(max_total=10, max_per_ip=0)
+    idle, busy = FakeConn(), FakeConn()
+    for conn in (idle, busy):
+        tracker.admit("10.0.0.1")
+        tracker.attach(conn)
+    tracker.idle(idle)
+    
+    assert tracker.begin_drain() == 1
+    assert idle.aborted and not busy.aborted
+    assert tracker.admit("10.0.0.2") == "draining"
+    assert not tracker.idle(busy)  # Terminado el pedido, el handler cierra
+    tracker.release("10.0.0.1", idle)
+    assert not tracker.wait_drained(0.05)
+    tracker.release("10.0.0.1", busy)
+    assert tracker.wait_drained(0.05)
+
+@pytest.mark.parametrize("mode", MODES)
+def test_server_rejects_over_the_ip_limit_and_closes_silent_clients(start_server, mode):
+    _, port = start_server(SERVER_MODE=mode, MAX_CONNECTIONS_PER_IP="2", IDLE_TIMEOUT="2", READ_TIMEOUT="0.3")
+    first = connect_when_free(port)
+    second = connect_when_free(port)
+    try:
+        with pytest.raises(ConnectionError, match=REJECT_MESSAGES["per_ip"]):
+            open_connection("127.0.0.1", port, use_tls=False)
+        
+        # Frame empezado y nunca completado: se corta por READ_TIMEOUT
+        second.sock.sendall(b"\x02\x00")
+        assert wait_closed(second, 5) < 1.5
+        # Sin frames: se corta por IDLE_TIMEOUT
+        assert 1 < wait_closed(first, 5) < 4
+    finally:
+        first.close()
+        second.close()
+    
+    # Los lugares se liberaron al cerrar
+    connect_when_free(port).close()
+
+@pytest.mark.parametrize("mode", MODES)
+def test_sigterm_finishes_turns_in_flight(start_server, mode):
+    process, port = start_server(SERVER_MODE=mode, FAKE_LATENCY_MS="1000")
+    idle, _ = open_connection("127.0.0.1", port, use_tls=False)
+    replies = []
+    with Client("127.0.0.1", port, use_tls=False, resume=False) as client:
+        client.enter_ia()
+        asking = threading.Thread(target=lambda: replies.append(client.ask("una pregunta lenta")))
+        asking.start()
+        time.sleep(0.3)  # El turno ya está en el servidor
+        process.terminate()
+        
+        # La ociosa se corta enseguida; el turno en curso termina completo
+        assert wait_closed(idle, 5) < 1
+        asking.join(10)
+    idle.close()
+    
+    assert replies and replies[0]
+    assert stop_server(process) == 0
+    with pytest.raises(OSError):
+        socket.create_connection(("127.0.0.1", port), timeout=1).close()
@@ -0,0 +1,39 @@
+# tests/test_database.py
+"""Pool de conexiones de lectura"""
+import pytest
+from database.database import get_connection, open_connection, pool
+
+@pytest.fixture
+def table():
+    with get_connection() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS pool_test (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM pool_test")
+    other = open_connection()
+    yield lambda: other.execute("SELECT COUNT(*) FROM pool_test").fetchone()[0]
+    other.close()
+
+def test_nested_blocks_reuse_the_connection():
+    with get_connection() as outer:
+        with get_connection() as inner:
+            assert inner is outer
+            assert pool.depth() == 2
+        assert pool.depth() == 1
+    assert pool.depth() == 0
+
+def test_only_the_outermost_block_commits(table):
+    with get_connection() as outer:
+        with get_connection() as inner:
+            inner.execute("INSERT INTO pool_test (id) VALUES (1)")
+        # El bloque interno no confirmó: otra conexión todavía no lo ve
+        assert table() == 0
+        outer.execute("INSERT INTO pool_test (id) VALUES (2)")
+    assert table() == 2
+
+def test_error_in_the_outer_block_rolls_back_the_inner_writes(table):
+    with pytest.raises(RuntimeError):
+        with get_connection() as outer:
+            with get_connection() as inner:
+                inner.execute("INSERT INTO pool_test (id) VALUES (1)")
+            outer.execute("INSERT INTO pool_test (id) VALUES (2)")
+            raise RuntimeError("falla")
+    assert table() == 0
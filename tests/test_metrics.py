@@ -0,0 +1,63 @@
+# tests/test_metrics.py
+"""Histogramas por etapa, STATS, /metrics y logs estructurados"""
+import json
+import logging
+from core.log import TextFormatter, JsonFormatter
+from core.metrics import Histogram, Metrics
+from core.protocol import FRAME_COMMAND
+from ai_bridge import open_connection, read_reply
+
+def test_histogram_percentiles_interpolate_inside_the_bucket():
+    histogram = Histogram(buckets=(0.01, 0.1, 1))
+    for _ in range(90):
+        histogram.observe(0.005)
+    for _ in range(10):
+        histogram.observe(0.5)
+    
+    counts, count, _, max_value = histogram.snapshot()
+    assert counts == [90, 0, 10, 0]
+    assert count == 100 and max_value == 0.5
+    assert histogram.percentile(50) <= 0.01
+    assert 0.1 < histogram.percentile(95) <= 0.5
+    assert Histogram().percentile(99) == 0.0
+
+def test_prometheus_buckets_are_cumulative():
+    registry = Metrics()
+    registry.inc("commands", cmd="INFO")
+    registry.inc("commands", 2, cmd="INFO")
+    registry.observe("send", 0.0002)
+    registry.observe("send", 20)
+    registry.register_collector("pool", lambda: {"size": 4, "healthy": True})
+    registry.register_collector("broken", lambda: 1 / 0)
+    
+    text = registry.render_prometheus()
+    assert 'ai_bridge_commands_total{cmd="INFO"} 3' in text
+    assert 'ai_bridge_stage_seconds_bucket{stage="send",le="0.00025"} 1' in text
+    assert 'ai_bridge_stage_seconds_bucket{stage="send",le="30"} 2' in text
+    assert 'ai_bridge_stage_seconds_count{stage="send"} 2' in text
+    assert "ai_bridge_pool_healthy 1" in text
+    # Un componente que falla no rompe el resto del reporte
+    assert registry.snapshot()["components"]["broken"]["error"]
+
+def test_log_fields_in_text_and_json():
+    record = logging.LogRecord("ai_bridge.db", logging.ERROR, __file__, 1, "No se pudo guardar", None, None)
+    record.component = "DB"
+    record.fields = {"client": "a3f8b2e1", "error": "disco lleno"}
+    assert TextFormatter().format(record).endswith('[ERROR-DB] No se pudo guardar client=a3f8b2e1 error="disco lleno"')
+    assert json.loads(JsonFormatter().format(record))["error"] == "disco lleno"
+
+def test_stats_command_reports_stages(server_address):
+    host, port = server_address
+    conn, _ = open_connection(host, port, use_tls=False)
+    try:
+        request_id = conn.send(FRAME_COMMAND, "INFO", conn.next_request_id())
+        read_reply(conn, request_id)
+        request_id = conn.send(FRAME_COMMAND, "STATS", conn.next_request_id())
+        text, is_error, _ = read_reply(conn, request_id)
+    finally:
+        conn.close()
+    
+    assert not is_error
+    assert text.startswith("=== ESTADÍSTICAS DEL SERVIDOR ===")
+    assert "recv" in text and "send" in text
+    assert "INFO=" in text
@@ -0,0 +1,65 @@
+# tests/test_models.py
+"""Catálogo de modelos: single-flight, stale-while-revalidate y cache en disco"""
+import time
+import threading
+from types import SimpleNamespace
+from core.models import ModelManager
+
+class FakeCatalog:
+    """models.list() que cuenta las llamadas y puede quedar bloqueado"""
+    
+    def __init__(self, names, delay=0.0):
+        self.names = names
+        self.delay = delay
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.models = self
+    
+    def list(self):
+        self.calls += 1
+        self.release.wait(5)
+        time.sleep(self.delay)
+        return [SimpleNamespace(name=f"models/{name}", input_token_limit=1000) for name in self.names]
+
+def test_concurrent_refreshes_share_one_call():
+    catalog = FakeCatalog(["gemini-2.0-flash"], delay=0.2)
+    manager = ModelManager(catalog, cache_path=None)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_available_models())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert catalog.calls == 1
+    assert results == [["gemini-2.0-flash"]] * 5
+    assert manager.stats["coalesced"] == 4
+
+def test_stale_catalog_is_served_while_refreshing():
+    catalog = FakeCatalog(["gemini-2.5-flash"])
+    manager = ModelManager(catalog, cache_path=None)
+    manager.cache, manager.cache_timestamp = ["gemini-2.0-flash"], 0
+    
+    # El refresco queda bloqueado: la respuesta no lo espera
+    catalog.release.clear()
+    assert manager.get_available_models() == ["gemini-2.0-flash"]
+    assert manager.get_available_models() == ["gemini-2.0-flash"]
+    assert manager.stats["stale_served"] == 2
+    
+    catalog.release.set()
+    deadline = time.monotonic() + 5
+    while manager.stats["refreshes"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert catalog.calls == 1
+    assert manager.get_available_models() == ["gemini-2.5-flash"]
+
+def test_catalog_survives_a_restart(tmp_path):
+    path = str(tmp_path / "models.json")
+    catalog = FakeCatalog(["gemini-2.0-flash", "text-embedding-004", "gemma-3-27b-it"])
+    ModelManager(catalog, cache_path=path).get_available_models()
+    
+    # Sin API disponible, el catálogo guardado se sirve igual
+    restarted = ModelManager(FakeCatalog([]), cache_path=path)
+    assert restarted.get_available_models() == ["gemini-2.0-flash", "gemma-3-27b-it"]
+    assert restarted.input_token_limit("gemma-3-27b-it") == 1000
@@ -0,0 +1,98 @@
+# tests/test_prefork.py
+"""Modo prefork: registro de sesiones compartido, workers reiniciados y RESUME entre workers"""
+import os
+import re
+import time
+import signal
+import threading
+import uuid
+from ai_bridge import Client, open_connection
+from core.connections import worker_limits
+from database.writer import db_writer
+from database.sessions import (register_session, save_selected_model, mark_summary_pending, wait_remote_summary,
+                               release_worker)
+
+WORKER_RE = re.compile(r"Worker: (\d+)")
+
+def worker_of(client):
+    return int(WORKER_RE.search(client.info()).group(1))
+
+def test_selected_model_is_shared_through_the_registry():
+    client_id = uuid.uuid4().hex
+    assert register_session(client_id, "127.0.0.1", 1234) is None
+    save_selected_model(client_id, "gemma-3-27b-it")
+    db_writer.flush()
+    assert register_session(client_id, "127.0.0.1", 1235) == "gemma-3-27b-it"
+
+def test_limits_are_split_between_workers():
+    assert worker_limits(4, 10000, 100) == (2500, 25)
+    assert worker_limits(3, 10, 0) == (4, 0)
+    assert worker_limits(1, 10, 5) == (10, 5)
+
+def test_waits_for_a_summary_running_in_another_worker(monkeypatch):
+    client_id = uuid.uuid4().hex
+    other_pid = os.getpid() + 100000
+    register_session(client_id, "127.0.0.1", 1234)
+    # El resumen en curso es de otro proceso
+    monkeypatch.setattr(os, "getpid", lambda: other_pid)
+    mark_summary_pending(client_id)
+    db_writer.flush()
+    monkeypatch.undo()
+    
+    assert not wait_remote_summary(client_id, 0.2)
+    
+    # El worker muere: el supervisor libera sus resúmenes y la espera termina
+    timer = threading.Timer(0.2, lambda: (release_worker(other_pid), db_writer.flush()))
+    timer.start()
+    started = time.monotonic()
+    assert wait_remote_summary(client_id, 5)
+    assert time.monotonic() - started >= 0.1
+    timer.join()
+
+def test_workers_are_restarted_and_sessions_move_between_them(start_server):
+    _, port = start_server(SERVER_WORKERS="2")
+    
+    # Con SO_REUSEPORT el kernel reparte las conexiones entre los dos workers
+    with Client("127.0.0.1", port, use_tls=False, resume=False) as client:
+        client.change_model("gemma-3-27b-it")
+        first_worker, token = worker_of(client), client.token
+    
+    moved = False
+    for _ in range(50):
+        with Client("127.0.0.1", port, use_tls=False, token=token) as client:
+            token = client.token
+            if worker_of(client) != first_worker:
+                # El modelo elegido viaja por el registro compartido
+                assert client.resumed
+                assert client.list_models()[1] == "gemma-3-27b-it"
+                moved = True
+                break
+    assert moved, "todas las conexiones fueron al mismo worker"
+    
+    # Un worker que muere se reemplaza y el puerto sigue atendiendo
+    os.kill(first_worker, signal.SIGKILL)
+    deadline = time.monotonic() + 20
+    workers = set()
+    while len(workers - {first_worker}) < 2:
+        assert time.monotonic() < deadline, "el worker no se reinició"
+        try:
+            with Client("127.0.0.1", port, use_tls=False, resume=False, reconnect_attempts=0) as client:
+                workers.add(worker_of(client))
+        except OSError:
+            time.sleep(0.2)
+
+def test_ip_limit_applies_to_the_whole_server(start_server):
+    _, port = start_server(SERVER_WORKERS="2", MAX_CONNECTIONS_PER_IP="2")
+    time.sleep(0.5)  # El sondeo de arranque libera su lugar
+    opened = []
+    try:
+        for _ in range(10):
+            try:
+                opened.append(open_connection("127.0.0.1", port, use_tls=False)[0])
+            except ConnectionError:
+                pass
+        # Cada worker admite una: nunca más de dos en total
+        assert 1 <= len(opened) <= 2
+    finally:
+        for conn in opened:
+            conn.close()
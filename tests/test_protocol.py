@@ -0,0 +1,56 @@
+# tests/test_protocol.py
+"""Framing: cabeceras, frames partidos y límites"""
+import socket
+import pytest
+from core import protocol
+from core.protocol import (FramedSocket, ProtocolError, HEADER, PROTOCOL_VERSION, FRAME_COMMAND,
+                           FRAME_RESPONSE, encode_frame)
+
+@pytest.fixture
+def pair():
+    left, right = socket.socketpair()
+    yield FramedSocket(left), FramedSocket(right)
+    left.close()
+    right.close()
+
+def test_frame_round_trip(pair):
+    client, server = pair
+    client.send(FRAME_COMMAND, "hola", request_id=7)
+    frame = server.recv()
+    assert (frame.type, frame.request_id, frame.text) == (FRAME_COMMAND, 7, "hola")
+    
+    # La respuesta repite el request_id recibido
+    server.send(FRAME_RESPONSE, "chau")
+    assert client.recv().request_id == 7
+
+def test_frame_split_across_reads(pair):
+    client, server = pair
+    data = encode_frame(FRAME_COMMAND, "x" * 1000, 1) + encode_frame(FRAME_COMMAND, "y", 2)
+    for start in range(0, len(data), 7):
+        client.sock.sendall(data[start:start + 7])
+    assert server.recv().text == "x" * 1000
+    assert server.recv().text == "y"
+
+def test_closed_mid_frame(pair):
+    client, server = pair
+    client.sock.sendall(encode_frame(FRAME_COMMAND, "incompleto")[:-3])
+    client.sock.shutdown(socket.SHUT_WR)
+    with pytest.raises(ProtocolError):
+        server.recv()
+
+def test_unsupported_version(pair):
+    client, server = pair
+    client.sock.sendall(HEADER.pack(PROTOCOL_VERSION + 1, FRAME_COMMAND, 0, 1, 0))
+    with pytest.raises(ProtocolError):
+        server.recv()
+
+def test_oversized_frame_rejected(pair, monkeypatch):
+    monkeypatch.setattr(protocol, "MAX_FRAME_SIZE", 1024)
+    with pytest.raises(ProtocolError):
+        encode_frame(FRAME_COMMAND, b"x" * 1025)
+    
+    # Se rechaza por la cabecera, sin esperar el payload
+    client, server = pair
+    client.sock.sendall(HEADER.pack(PROTOCOL_VERSION, FRAME_COMMAND, 0, 1, 1025))
+    with pytest.raises(ProtocolError):
+        server.recv()
@@ -0,0 +1,58 @@
+# tests/test_response_cache.py
+"""Cache de respuestas IA: clave, reutilización y aislamiento entre clientes"""
+import uuid
+import pytest
+import server
+from core.session import ChatSession
+from helpers.memory_manage import save_message
+from helpers.response_cache import make_key, history_digest
+from database.writer import db_writer
+
+PROMPT = "sockets tcp protocolo"
+
+@pytest.fixture
+def open_session():
+    opened = []
+    
+    def open_session():
+        client_id = uuid.uuid4().hex
+        server.clients_connected[client_id] = {"selected_model": "gemini-2.0-flash"}
+        server.chat_sessions[client_id] = ChatSession(client_id)
+        opened.append(client_id)
+        return client_id
+    
+    yield open_session
+    for client_id in opened:
+        server.clients_connected.pop(client_id, None)
+        server.chat_sessions.pop(client_id, None)
+
+def cache_entries():
+    return server.response_cache.stats()["entries"]
+
+def test_key_depends_on_model_history_and_prompt():
+    digest = history_digest("", "user", "hola")
+    key = make_key("gemini-2.0-flash", digest, "hola")
+    assert key == make_key("gemini-2.0-flash", digest, "  hola ")
+    assert key != make_key("gemini-2.5-flash", digest, "hola")
+    assert key != make_key("gemini-2.0-flash", "", "hola")
+    assert key != make_key("gemini-2.0-flash", digest, "chau")
+
+def test_same_history_and_prompt_share_the_reply(open_session):
+    a, b = open_session(), open_session()
+    before = cache_entries()
+    reply = server.process_ia_message(a, "una pregunta sin historial")
+    assert server.process_ia_message(b, "una pregunta sin historial") == reply
+    assert cache_entries() == before + 1
+
+def test_retrieved_context_is_not_shared(open_session):
+    a, b = open_session(), open_session()
+    # Historial guardado de `a` que la búsqueda agrega a su prompt
+    for i in range(4):
+        save_message(a, "user", f"hablemos de sockets tcp y el protocolo numero {i}")
+    db_writer.flush()
+    
+    # Mismo historial en memoria (vacío) y mismo texto, pero prompts finales distintos
+    before = cache_entries()
+    server.process_ia_message(a, PROMPT)
+    server.process_ia_message(b, PROMPT)
+    assert cache_entries() == before + 2
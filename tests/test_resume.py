@@ -0,0 +1,55 @@
+# tests/test_resume.py
+"""Tokens de reanudación y RESUME contra el servidor"""
+import time
+from ai_bridge import Client, connect
+from core.resume import SessionParking, issue_token, verify_token
+
+def test_token_round_trip():
+    token = issue_token("abc123")
+    assert verify_token(token) == "abc123"
+    assert verify_token(f"  {token}\n") == "abc123"
+
+def test_token_rejected_when_tampered_or_expired():
+    session_id, expires, signature = issue_token("abc123").split(".")
+    assert verify_token(f"otro.{expires}.{signature}") is None
+    assert verify_token(f"{session_id}.{int(expires) + 1}.{signature}") is None
+    assert verify_token(issue_token("abc123", ttl=-1)) is None
+    assert verify_token("basura") is None
+    assert verify_token("a.b.c") is None
+
+def test_parking_claim_and_expire():
+    parking = SessionParking(grace=0.05)
+    parking.park("a", {"n": 1})
+    parking.park("b", {"n": 2})
+    assert parking.claim("a") == {"n": 1}
+    assert parking.claim("a") is None
+    
+    time.sleep(0.1)
+    assert parking.expired() == [("b", {"n": 2})]
+    assert len(parking) == 0
+    assert parking.snapshot() == {"parked": 2, "resumed": 1, "expired": 1, "waiting": 0}
+
+def test_resume_warm_over_the_wire(server_address):
+    host, port = server_address
+    first = connect(host, port, use_tls=False, resume=False)
+    first.ask("recordá: mi color es azul")
+    client_id, token = first.client_id, first.token
+    first.close()
+    
+    time.sleep(0.3)
+    second = Client(host, port, use_tls=False, token=token).connect()
+    try:
+        assert second.resumed == "warm"
+        assert second.client_id == client_id
+        assert second.ask("¿qué color?")
+    finally:
+        second.close()
+
+def test_invalid_token_opens_a_new_session(server_address):
+    host, port = server_address
+    client = Client(host, port, use_tls=False, token="x.1.y").connect()
+    try:
+        assert client.resumed is None
+        assert client.client_id
+    finally:
+        client.close()
@@ -0,0 +1,98 @@
+# tests/test_retention.py
+"""Purga del registro de sesiones y del historial que ya no se puede reanudar"""
+import uuid
+import datetime
+from database.database import get_connection
+from database.writer import db_writer
+from database.retention import purge_sessions, purge_orphaned_history, purge_orphaned_spill
+from core.session import Message
+from database.sessions import (register_session, close_session, discard_session, mark_summary_pending,
+                               spill_messages, load_spilled)
+
+def registered(client_id):
+    db_writer.flush()
+    with get_connection() as conn:
+        return conn.execute("SELECT 1 FROM sessions WHERE client_id = ?", (client_id,)).fetchone() is not None
+
+def test_purge_only_removes_disconnected_sessions_without_pending_summary():
+    closed, connected, summarizing = (uuid.uuid4().hex for _ in range(3))
+    for client_id in (closed, connected, summarizing):
+        register_session(client_id, "127.0.0.1", 1234)
+    close_session(closed)
+    close_session(summarizing)
+    mark_summary_pending(summarizing)
+    db_writer.flush()
+    
+    assert purge_sessions(max_age=0) >= 1
+    assert not registered(closed)
+    assert registered(connected)
+    assert registered(summarizing)
+
+def test_recent_disconnection_is_kept_for_resume():
+    client_id = uuid.uuid4().hex
+    register_session(client_id, "127.0.0.1", 1234)
+    close_session(client_id)
+    db_writer.flush()
+    purge_sessions()
+    assert registered(client_id)
+    
+    # Reconectar la vuelve a marcar como conectada
+    register_session(client_id, "127.0.0.1", 1235)
+    db_writer.flush()
+    purge_sessions(max_age=0)
+    assert registered(client_id)
+    
+    discard_session(client_id)
+    assert not registered(client_id)
+
+def save_old_history(client_id, days):
+    when = datetime.datetime.now() - datetime.timedelta(days=days)
+    db_writer.submit(
+        "INSERT INTO messages (client_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+        (client_id, "user", "hola", when)
+    )
+    db_writer.submit(
+        "INSERT INTO summaries (client_id, summary_text, created_at) VALUES (?, ?, ?)",
+        (client_id, "resumen", when)
+    )
+
+def history(client_id):
+    db_writer.flush()
+    with get_connection() as conn:
+        return tuple(
+            conn.execute(f"SELECT COUNT(*) FROM {table} WHERE client_id = ?", (client_id,)).fetchone()[0]
+            for table in ("messages", "summaries", "messages_archive")
+        )
+
+def test_history_without_a_resumable_session_is_archived():
+    # `legacy` imita un ID derivado de la IP: tiene historial pero ninguna fila en el registro
+    legacy, registered_id, recent = uuid.uuid4().hex, uuid.uuid4().hex, uuid.uuid4().hex
+    save_old_history(legacy, days=30)
+    save_old_history(registered_id, days=30)
+    register_session(registered_id, "127.0.0.1", 1234)
+    save_old_history(recent, days=0)
+    db_writer.flush()
+    
+    assert purge_orphaned_history(max_age=86400, mode="archive") >= 1
+    assert history(legacy) == (0, 0, 1)
+    assert history(registered_id) == (1, 1, 0)
+    assert history(recent) == (1, 1, 0)
+
+def test_spill_without_a_session_in_memory_is_removed():
+    orphan, connected, parked, dead = (uuid.uuid4().hex for _ in range(4))
+    for client_id in (connected, parked, dead):
+        register_session(client_id, "127.0.0.1", 1234)
+    close_session(parked)
+    # El worker de `dead` murió hace rato: release_worker anotó la desconexión
+    db_writer.submit(
+        "UPDATE sessions SET disconnected_at = ? WHERE client_id = ?",
+        (datetime.datetime.now() - datetime.timedelta(hours=1), dead)
+    )
+    for client_id in (orphan, connected, parked, dead):
+        spill_messages(client_id, [Message("user", "volcado")])
+    db_writer.flush()
+    
+    assert purge_orphaned_spill(grace=60) >= 2
+    assert load_spilled(orphan) == [] and load_spilled(dead) == []
+    assert len(load_spilled(connected)) == 1
+    assert len(load_spilled(parked)) == 1
@@ -0,0 +1,89 @@
+# tests/test_scheduler.py
+"""Scheduler de Gemini: cola justa, token buckets y backoff ante 429"""
+import time
+import threading
+import pytest
+from core import scheduler
+from core.scheduler import GeminiScheduler, TokenBucket, parse_rate_limits
+
+class RateLimited(Exception):
+    code = 429
+
+def failing(error):
+    def call():
+        raise error
+    return call
+
+def wait_queued(sched, count):
+    deadline = time.monotonic() + 5
+    while sched.queued() < count:
+        assert time.monotonic() < deadline, "la petición no llegó a la cola"
+        time.sleep(0.005)
+
+def test_clients_take_turns():
+    sched = GeminiScheduler(max_inflight=1)
+    sched.acquire("ocupado", "m")
+    admitted = []
+    
+    def turn(client_id):
+        sched.acquire(client_id, "m")
+        admitted.append(client_id)
+        sched.release()
+    
+    # `a` encola tres peticiones antes que la única de `b`
+    threads = []
+    for queued, client_id in enumerate("aaab", 1):
+        thread = threading.Thread(target=turn, args=(client_id,))
+        thread.start()
+        threads.append(thread)
+        wait_queued(sched, queued)
+    
+    sched.release()
+    for thread in threads:
+        thread.join(5)
+    assert admitted == ["a", "b", "a", "a"]
+    assert sched.stats()["inflight"] == 0
+
+def test_token_bucket_refills_over_time():
+    bucket = TokenBucket(60)  # una unidad por segundo
+    now = time.monotonic()
+    assert bucket.wait_time(1, now) == 0
+    bucket.consume(60, now)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1) == pytest.approx(0.0, abs=1e-6)
+    
+    # Una pausa (tras un 429) se respeta aunque haya capacidad
+    bucket.pause(5, now + 1)
+    assert bucket.wait_time(1, now + 2) == pytest.approx(4.0)
+    assert TokenBucket(0).wait_time(1000, now) == 0
+
+def test_rate_limited_calls_back_off_and_retry(monkeypatch):
+    monkeypatch.setattr(scheduler, "GEMINI_BACKOFF_BASE", 0.01)
+    sched = GeminiScheduler(max_inflight=1)
+    failures = [RateLimited("429 RESOURCE_EXHAUSTED")] * 2
+    statuses = []
+    
+    def call():
+        if failures:
+            raise failures.pop()
+        return "ok"
+    
+    assert sched.call("a", "m", call, on_status=statuses.append) == "ok"
+    stats = sched.stats()
+    assert (stats["retries"], stats["rate_limited"], stats["inflight"]) == (2, 2, 0)
+    assert sum("reintento" in status for status in statuses) == 2
+
+def test_other_errors_and_cancelled_retries_are_raised():
+    sched = GeminiScheduler(max_inflight=1)
+    with pytest.raises(ValueError):
+        sched.call("a", "m", failing(ValueError("otro")))
+    with pytest.raises(RateLimited):
+        sched.call("a", "m", failing(RateLimited()), retry=lambda: False)
+    assert sched.stats()["retries"] == 0
+    assert sched.stats()["inflight"] == 0
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("gemini-2.0-flash=15:1000000, gemma=30,,roto=x") == {
+        "gemini-2.0-flash": (15.0, 1000000.0),
+        "gemma": (30.0, 0.0),
+    }
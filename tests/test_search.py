@@ -0,0 +1,61 @@
+# tests/test_search.py
+"""Búsqueda FTS5 en el historial: SEARCH y contexto recuperado para el modo IA"""
+import time
+import uuid
+import datetime
+from ai_bridge import Client
+from database.search import search_history, retrieve_context, with_retrieved_context
+from database.writer import db_writer
+from helpers.memory_manage import save_message
+
+def save_summary(client_id, text):
+    db_writer.submit(
+        "INSERT INTO summaries (client_id, summary_text, created_at, message_count) VALUES (?, ?, ?, ?)",
+        (client_id, text, datetime.datetime.now(), 2)
+    )
+
+def test_search_requires_every_term_and_stays_in_the_client():
+    client_id, other = uuid.uuid4().hex, uuid.uuid4().hex
+    save_message(client_id, "user", "como configuro el socket con TLS")
+    save_message(client_id, "model", "el socket se envuelve con un contexto ssl")
+    save_summary(client_id, "hablamos de sockets y del handshake TLS")
+    save_message(other, "user", "otro cliente tambien usa socket TLS")
+    
+    results = search_history(client_id, "socket tls")
+    assert [(kind, role) for kind, role, _, _ in results] == [("message", "user")]
+    assert "[socket]" in results[0][2] and "[TLS]" in results[0][2]
+    assert {kind for kind, _, _, _ in search_history(client_id, "handshake")} == {"summary"}
+    # Las comillas y operadores del usuario no rompen la expresión MATCH
+    assert search_history(client_id, 'socket" OR "*') == []
+    assert search_history(client_id, "...") == []
+
+def test_retrieval_skips_the_window_and_the_pinned_summary():
+    client_id = uuid.uuid4().hex
+    save_message(client_id, "user", "el puerto del servidor es el 8888")
+    save_summary(client_id, "resumen viejo: el servidor escucha en el puerto 8888")
+    save_summary(client_id, "resumen actual: el servidor escucha en el puerto 8888")
+    db_writer.flush()
+    since = time.time()
+    time.sleep(0.01)
+    save_message(client_id, "user", "el servidor cambia de puerto")
+    db_writer.flush()
+    
+    snippets = retrieve_context(client_id, "¿en qué puerto escucha el servidor?", k=5, since=since)
+    assert any(snippet.startswith("user: el puerto del servidor") for snippet in snippets)
+    assert any("resumen viejo" in snippet for snippet in snippets)
+    assert not any("resumen actual" in snippet or "cambia" in snippet for snippet in snippets)
+    assert retrieve_context(client_id, "puerto", k=0) == []
+    
+    prompt = with_retrieved_context(["user: hola"], "pregunta")
+    assert prompt == "[HISTORIAL RELEVANTE]\n- user: hola\n\npregunta"
+    assert with_retrieved_context([], "pregunta") == "pregunta"
+
+def test_search_command_finds_the_ia_turns(server_address):
+    host, port = server_address
+    with Client(host, port, use_tls=False, resume=False) as client:
+        assert client.search("").startswith("Uso: SEARCH")
+        assert client.search("murcielago").startswith("Sin resultados")
+        client.ask("hablemos del murcielago")
+        result = client.search("murcielago")
+    assert "=== RESULTADOS (1) ===" in result
+    assert "Tú: hablemos del [murcielago]" in result
@@ -0,0 +1,67 @@
+# tests/test_security.py
+"""Handshakes TLS fuera del bucle de accept: timeout y reanudación de sesión"""
+import shutil
+import socket
+import threading
+import subprocess
+import pytest
+from core import security
+from core.security import create_ssl_context, server_handshake, get_tls_stats
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as patch:
+        yield patch
+
+@pytest.fixture(scope="module")
+def ssl_context(tmp_path_factory, monkeypatch_module):
+    if not shutil.which("openssl"):
+        pytest.skip("openssl no está disponible para generar el certificado")
+    folder = tmp_path_factory.mktemp("tls")
+    certfile, keyfile = str(folder / "server.crt"), str(folder / "server.key")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-keyout", keyfile, "-out", certfile],
+        check=True, capture_output=True
+    )
+    monkeypatch_module.setenv("SSL_CERTFILE", certfile)
+    monkeypatch_module.setenv("SSL_KEYFILE", keyfile)
+    return create_ssl_context()
+
+def handshake_pair(ssl_context):
+    """Handshake completo por un socketpair; retorna el socket TLS del cliente"""
+    client_sock, server_sock = socket.socketpair()
+    accepted = []
+    
+    def serve():
+        tls_conn = server_handshake(server_sock, ssl_context, timeout=5)
+        # Con TLS 1.3 el ticket de sesión viaja junto con los primeros datos
+        tls_conn.sendall(b"ok")
+        accepted.append(tls_conn)
+    
+    thread = threading.Thread(target=serve)
+    thread.start()
+    tls_client = security.wrap_client_socket(client_sock, "localhost")
+    assert tls_client.recv(2) == b"ok"
+    security.save_client_session(tls_client)
+    thread.join()
+    accepted[0].close()
+    return tls_client
+
+def test_silent_client_times_out(ssl_context):
+    client_sock, server_sock = socket.socketpair()
+    before = get_tls_stats()["timeouts"]
+    with pytest.raises(TimeoutError):
+        server_handshake(server_sock, ssl_context, timeout=0.2)
+    assert get_tls_stats()["timeouts"] == before + 1
+    client_sock.close()
+    server_sock.close()
+
+def test_second_connection_resumes_the_session(ssl_context):
+    handshake_pair(ssl_context).close()
+    resumed = get_tls_stats()["resumed"]
+    
+    second = handshake_pair(ssl_context)
+    assert second.session_reused
+    assert get_tls_stats()["resumed"] == resumed + 1
+    second.close()
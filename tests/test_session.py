@@ -0,0 +1,104 @@
+# tests/test_session.py
+"""ChatSession: buffer circular, volcado a SQLite, drain y ventana de contexto"""
+import uuid
+from core import session as session_module
+from core.session import (ChatSession, CONTEXT_PREFIX, CONTEXT_MAX_TOKENS, CONTEXT_LIMIT_RATIO, CONTEXT_REFILL_RATIO,
+                          get_context_budget)
+from database.database import get_connection
+from database.writer import db_writer
+
+def spilled_rows(client_id):
+    db_writer.flush()
+    with get_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM session_spill WHERE client_id = ?", (client_id,)).fetchone()[0]
+
+def test_ring_spills_oldest_messages():
+    session = ChatSession(uuid.uuid4().hex, ring_size=4)
+    for i in range(5):
+        session.add_turn(f"pregunta {i}", f"respuesta {i}")
+    
+    assert len(session.messages) == 4
+    assert session.spilled == 6
+    assert len(session) == 10
+    assert spilled_rows(session.client_id) == 6
+    assert session.messages[0].content == "pregunta 3"
+
+def test_drain_returns_everything_in_order_and_clears_the_spill():
+    session = ChatSession(uuid.uuid4().hex, ring_size=4)
+    session.add_context("resumen anterior")
+    for i in range(5):
+        session.add_turn(f"pregunta {i}", f"respuesta {i}")
+    tokens = session.tokens_used
+    
+    messages = session.drain()
+    expected = [text for i in range(5) for text in (f"pregunta {i}", f"respuesta {i}")]
+    # El contexto no vuelve: ya es el último resumen
+    assert [message.content for message in messages] == expected
+    assert not any(message.content.startswith(CONTEXT_PREFIX) for message in messages)
+    assert tokens > 0
+    
+    assert len(session) == 0
+    assert (session.spilled, session.tokens_used, session.bytes_used, session.digest) == (0, 0, 0, "")
+    assert spilled_rows(session.client_id) == 0
+
+def test_digest_follows_the_history():
+    first, second = ChatSession(uuid.uuid4().hex), ChatSession(uuid.uuid4().hex)
+    first.add_turn("hola", "buenas")
+    second.add_turn("hola", "buenas")
+    assert first.digest == second.digest
+    
+    second.add_context("otro resumen")
+    assert first.digest != second.digest
+
+def test_chat_tokens_count_the_prompt_sent():
+    session = ChatSession(uuid.uuid4().hex)
+    session.add_turn("corta", "respuesta", prompt="[HISTORIAL RELEVANTE]\n- " + "x" * 400 + "\n\ncorta")
+    assert session.chat_tokens > 100
+    assert session.tokens_used < 20
+
+class FakeChats:
+    def __init__(self):
+        self.histories = []
+        self.chats = self
+    
+    def create(self, model, history):
+        self.histories.append(history)
+        return object()
+
+def test_window_pins_the_summary_and_keeps_whole_recent_turns():
+    session = ChatSession(uuid.uuid4().hex)
+    session.add_context("resumen")
+    for i in range(10):
+        session.add_turn(f"pregunta {i} " + "x" * 36, f"respuesta {i} " + "y" * 36)
+    
+    turn = session.messages[0].tokens + session.messages[1].tokens
+    window = session.context_window(session.context.tokens + 3 * turn + turn // 2)
+    assert window[0] is session.context
+    # Tres turnos completos: el cuarto no entra entero y se descarta
+    assert [message.content.split()[1] for message in window[1:]] == ["7", "7", "8", "8", "9", "9"]
+    assert [message.role for message in window[1:]] == ["user", "model"] * 3
+
+def test_context_budget_follows_the_model_limit(monkeypatch):
+    assert get_context_budget(10000) == int(10000 * CONTEXT_LIMIT_RATIO)
+    assert get_context_budget(10 ** 7) == CONTEXT_MAX_TOKENS
+    monkeypatch.setattr(session_module, "CONTEXT_MAX_TOKENS", 0)
+    assert get_context_budget(10 ** 7) == int(10 ** 7 * CONTEXT_LIMIT_RATIO)
+
+def test_chat_is_rebuilt_only_past_the_budget():
+    client = FakeChats()
+    session = ChatSession(uuid.uuid4().hex)
+    for i in range(20):
+        session.add_turn(f"pregunta {i}", "r" * 400)
+    budget = 1000
+    
+    session.get_chat(client, "gemini-2.0-flash", budget)
+    assert session.chat_tokens <= budget
+    session.get_chat(client, "gemini-2.0-flash", budget)
+    assert len(client.histories) == 1
+    
+    # Superado el presupuesto se rearma con margen (CONTEXT_REFILL_RATIO)
+    while session.chat_tokens <= budget:
+        session.add_turn("otra", "r" * 400)
+    session.get_chat(client, "gemini-2.0-flash", budget)
+    assert len(client.histories) == 2
+    assert session.chat_tokens <= budget * CONTEXT_REFILL_RATIO
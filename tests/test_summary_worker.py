@@ -0,0 +1,80 @@
+# tests/test_summary_worker.py
+"""Resúmenes en segundo plano (esperados con wait_idle, sin sleeps)"""
+import time
+import uuid
+from types import SimpleNamespace
+from core.backends import create_backend
+from core.session import Message
+from database.database import get_connection
+from database.writer import db_writer
+from helpers.memory_manage import get_summary_head, ai_self_summarize
+from helpers.summary_worker import SummaryWorker, PRIORITY_COMPACTION, PRIORITY_DEACTIVATE
+
+MODEL = "gemini-2.0-flash"
+
+def conversation(n):
+    return [Message("user" if i % 2 == 0 else "model", f"mensaje {i}") for i in range(n)]
+
+def test_summary_is_saved_with_its_lineage():
+    worker = SummaryWorker(workers=1)
+    backend = create_backend()
+    client_id = uuid.uuid4().hex
+    
+    worker.submit(client_id, conversation(4), backend, MODEL)
+    assert worker.wait_idle(10)
+    db_writer.flush()
+    first = get_summary_head(client_id)
+    assert first is not None and first[2] == 4
+    
+    worker.submit(client_id, conversation(2), backend, MODEL)
+    assert worker.wait_idle(10)
+    db_writer.flush()
+    second = get_summary_head(client_id)
+    assert second[0] != first[0] and second[2] == 6
+    worker.shutdown(5)
+
+def test_queued_jobs_for_a_client_are_merged():
+    worker = SummaryWorker(workers=0)
+    client_id = uuid.uuid4().hex
+    job = worker.submit(client_id, conversation(2), None, MODEL, PRIORITY_COMPACTION)
+    assert worker.submit(client_id, conversation(3), None, MODEL, PRIORITY_DEACTIVATE) is job
+    assert len(job.messages) == 5
+    assert job.priority == PRIORITY_DEACTIVATE
+    assert worker.pending_count() == 1
+
+def test_empty_summary_does_not_replace_the_head():
+    client_id = uuid.uuid4().hex
+    ai_self_summarize(client_id, conversation(4), create_backend(), MODEL)
+    db_writer.flush()
+    head = get_summary_head(client_id)
+    
+    for text in (None, "", "   "):
+        empty = SimpleNamespace(models=SimpleNamespace(generate_content=lambda **kwargs: SimpleNamespace(text=text)))
+        assert ai_self_summarize(client_id, conversation(2), empty, MODEL) is None
+        db_writer.flush()
+        assert get_summary_head(client_id) == head
+
+def test_jobs_for_a_client_never_overlap():
+    worker = SummaryWorker(workers=2)
+    client_id = uuid.uuid4().hex
+    
+    def slow_generate(**kwargs):
+        time.sleep(0.3)
+        return SimpleNamespace(text="resumen")
+    slow = SimpleNamespace(models=SimpleNamespace(generate_content=slow_generate))
+    
+    first = worker.submit(client_id, conversation(2), slow, MODEL)
+    while not first.started:
+        time.sleep(0.01)
+    # Llega mientras el primero está en curso: espera aunque haya un hilo libre
+    worker.submit(client_id, conversation(2), slow, MODEL)
+    assert worker.wait_idle(10)
+    db_writer.flush()
+    
+    with get_connection() as conn:
+        lineage = conn.execute(
+            "SELECT id, parent_id, message_count FROM summaries WHERE client_id = ? ORDER BY id", (client_id,)
+        ).fetchall()
+    assert [row[2] for row in lineage] == [2, 4]
+    assert lineage[1][1] == lineage[0][0]
+    worker.shutdown(5)
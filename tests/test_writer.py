@@ -0,0 +1,38 @@
+# tests/test_writer.py
+"""Escritor write-behind: lotes y fallas"""
+import pytest
+from database.database import get_connection
+from database.writer import DatabaseWriter, DURABILITY_COMMIT
+
+@pytest.fixture
+def writer():
+    writer = DatabaseWriter(batch_interval=0.2)
+    writer.submit("CREATE TABLE IF NOT EXISTS writer_test (id INTEGER PRIMARY KEY)", (), DURABILITY_COMMIT)
+    writer.submit("DELETE FROM writer_test", (), DURABILITY_COMMIT)
+    yield writer
+    writer.close(5)
+
+def stored_ids():
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT id FROM writer_test ORDER BY id")]
+
+def test_batch_is_committed(writer):
+    ops = [writer.submit("INSERT INTO writer_test (id) VALUES (?)", (i,)) for i in range(50)]
+    assert writer.flush(5)
+    assert all(op.error is None for op in ops)
+    assert stored_ids() == list(range(50))
+
+def test_failed_batch_only_drops_the_bad_write(writer):
+    ops = [writer.submit("INSERT INTO writer_test (id) VALUES (?)", (i,)) for i in (1, 2, 2, 3)]
+    assert writer.flush(5)
+    
+    assert [op.error is not None for op in ops] == [False, False, True, False]
+    assert stored_ids() == [1, 2, 3]
+    assert writer.stats["dropped"] == 1
+    assert writer.stats["failed_batches"] == 1
+
+def test_commit_durability_raises_the_error(writer):
+    writer.submit("INSERT INTO writer_test (id) VALUES (?)", (1,), DURABILITY_COMMIT)
+    with pytest.raises(Exception):
+        writer.submit("INSERT INTO writer_test (id) VALUES (?)", (1,), DURABILITY_COMMIT)
+    assert stored_ids() == [1]